@@ -87,6 +87,25 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/5.1/topics/cache/
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    }
+}
+
+# Cache used for serialized applications and payments, see core/cache.py.
+CORE_CACHE_ALIAS = "default"
+CORE_CACHE_TIMEOUT = 300
+CORE_SUMMARY_TIMEOUT = 30
+# Lifetime of the per-user data versions behind the ETags. With a
+# per-process cache it bounds how long another process may answer 304
+# after a change.
+CORE_VERSION_TIMEOUT = 30
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
 
@@ -136,6 +155,35 @@ INTERNAL_IPS = [
 
 REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": (
-        "rest_framework_simplejwt.authentication.JWTAuthentication",
+        "core.authentication.CachedJWTAuthentication",
     )
 }
+
+SIMPLE_JWT = {
+    "TOKEN_OBTAIN_SERIALIZER": (
+        "core.authentication.RolesTokenObtainPairSerializer"
+    ),
+    "TOKEN_REFRESH_SERIALIZER": (
+        "core.authentication.RolesTokenRefreshSerializer"
+    ),
+}
+
+# Verified tokens kept per process, see core/authentication.py. The
+# timeout bounds how long another process may still accept a token of a
+# deactivated user.
+CORE_AUTH_CACHE_SIZE = 10000
+CORE_AUTH_CACHE_TIMEOUT = 60
+
+# Payment schedule formula used on approval, "simple" or "annuity".
+# See core/amortization.py.
+LOAN_AMORTIZATION_MODE = "simple"
+
+# Background jobs run by `manage.py worker`, see core/jobs.py. Eager mode
+# runs them inline instead, without a worker.
+CORE_JOBS_EAGER = False
+CORE_JOBS_VISIBILITY_TIMEOUT = 300
+CORE_JOBS_RETRY_DELAY = 10
+
+# Closed transactions that ended this many days ago have their payments
+# and cash flows moved to the archive tables by `manage.py archive`.
+CORE_ARCHIVE_AFTER_DAYS = 365
@@ -0,0 +1,40 @@
+"""Stand-alone performance scripts, run from the repository root with
+``python -m benchmarks.<name>``. Each script works on a throwaway test
+database so it never touches ``db.sqlite3``."""
+
+import os
+from contextlib import contextmanager
+
+
+def setup():
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "bank_loan.settings")
+
+    import django
+    from django.conf import settings
+
+    django.setup()
+    settings.DEBUG = False
+    # No worker runs next to the scripts, approvals write their schedule
+    # inline.
+    settings.CORE_JOBS_EAGER = True
+
+
+@contextmanager
+def test_database():
+    from django.db import connection
+
+    old_name = connection.settings_dict["NAME"]
+    connection.creation.create_test_db(verbosity=0, autoclobber=True)
+    try:
+        yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+def seed_groups():
+    from django.contrib.auth.models import Group
+
+    return {
+        name: Group.objects.get_or_create(name=name)[0]
+        for name in ("Borrower", "Provider", "Bank Personnel")
+    }
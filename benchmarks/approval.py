@@ -0,0 +1,71 @@
+"""Approval latency of ``handle_application_approval`` by loan duration.
+
+    python -m benchmarks.approval [--repeat N]
+"""
+
+import argparse
+import statistics
+import time
+
+from . import seed_groups, setup, test_database
+
+DURATIONS = (12, 24, 60, 120, 240, 360, 480, 600)
+
+
+def run(repeat):
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+
+    from core.models import Application, User
+
+    groups = seed_groups()
+    borrower = User.objects.create_user(username="bench_borrower")
+    borrower.groups.add(groups["Borrower"])
+    provider = User.objects.create_user(username="bench_provider")
+    provider.groups.add(groups["Provider"])
+
+    fund = Application.objects.create(
+        user=provider,
+        application_type="deposit",
+        amount=10**9,
+        duration_months=12,
+        interest_rate=5,
+    )
+    fund.status = "approved"
+    fund.save()
+
+    print(f"{'months':>8} {'median ms':>10} {'min ms':>8} {'queries':>8}")
+    for months in DURATIONS:
+        timings = []
+        for _ in range(repeat):
+            application = Application.objects.create(
+                user=borrower,
+                application_type="loan",
+                amount=1000,
+                duration_months=months,
+                interest_rate=10,
+            )
+            application.status = "approved"
+            with CaptureQueriesContext(connection) as queries:
+                started = time.perf_counter()
+                application.save()
+                timings.append((time.perf_counter() - started) * 1000)
+
+        print(
+            f"{months:>8} {statistics.median(timings):>10.2f} "
+            f"{min(timings):>8.2f} {len(queries):>8}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    setup()
+    with test_database():
+        run(args.repeat)
+
+
+if __name__ == "__main__":
+    main()
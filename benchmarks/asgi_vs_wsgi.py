@@ -0,0 +1,136 @@
+"""Concurrent-request throughput of the sync views on a WSGI worker pool
+against the async views on the ASGI handler.
+
+    python -m benchmarks.asgi_vs_wsgi [--requests N] [--concurrency C ...]
+
+Both sides run in process through Django's WSGI and ASGI request handlers
+(no network). The WSGI side gets one thread per concurrent request, the
+way a threaded WSGI server would.
+"""
+
+import argparse
+import asyncio
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from . import seed_groups, setup, test_database
+
+ENDPOINTS = (
+    ("applications", "list_create_applications"),
+    ("payments", "list_payments"),
+)
+
+
+def seed():
+    from rest_framework_simplejwt.tokens import AccessToken
+
+    from core.models import Application, CashFlow, User
+
+    groups = seed_groups()
+    borrower = User.objects.create_user(username="bench_borrower")
+    borrower.groups.add(groups["Borrower"])
+    CashFlow.objects.create(transaction_type="deposit_received", amount=10**9)
+
+    for _ in range(100):
+        Application.objects.create(
+            user=borrower,
+            application_type="loan",
+            amount=1000,
+            duration_months=12,
+            interest_rate=10,
+        )
+    for application in Application.objects.all()[:10]:
+        application.status = "approved"
+        application.save()
+
+    return f"Bearer {AccessToken.for_user(borrower)}"
+
+
+def run_wsgi(url, token, requests, concurrency):
+    from django.test import Client
+
+    local = threading.local()
+
+    def call(_):
+        if not hasattr(local, "client"):
+            local.client = Client()
+        started = time.perf_counter()
+        response = local.client.get(url, HTTP_AUTHORIZATION=token)
+        assert response.status_code == 200, response.status_code
+        return time.perf_counter() - started
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        latencies = list(pool.map(call, range(requests)))
+    return time.perf_counter() - started, latencies
+
+
+def run_asgi(url, token, requests, concurrency):
+    from django.test import AsyncClient
+
+    async def main():
+        client = AsyncClient()
+        gate = asyncio.Semaphore(concurrency)
+
+        async def call():
+            async with gate:
+                started = time.perf_counter()
+                response = await client.get(
+                    url, headers={"Authorization": token}
+                )
+                assert response.status_code == 200, response.status_code
+                return time.perf_counter() - started
+
+        started = time.perf_counter()
+        latencies = await asyncio.gather(*(call() for _ in range(requests)))
+        return time.perf_counter() - started, latencies
+
+    return asyncio.run(main())
+
+
+def report(label, elapsed, latencies, requests):
+    print(
+        f"{label:<28} {requests / elapsed:>10.1f} "
+        f"{statistics.median(latencies) * 1000:>10.2f} "
+        f"{max(latencies) * 1000:>10.2f}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument(
+        "--concurrency", type=int, nargs="+", default=[1, 8, 32]
+    )
+    args = parser.parse_args()
+
+    setup()
+    from django.conf import settings
+    from django.urls import reverse
+
+    settings.ALLOWED_HOSTS = ["*"]
+    with test_database():
+        token = seed()
+        for concurrency in args.concurrency:
+            print(f"\nconcurrency {concurrency}, {args.requests} requests")
+            print(f"{'':<28} {'req/s':>10} {'p50 ms':>10} {'max ms':>10}")
+            for label, name in ENDPOINTS:
+                for server, runner, url in (
+                    ("wsgi", run_wsgi, reverse(name)),
+                    ("asgi", run_asgi, reverse(f"async_{name}")),
+                ):
+                    elapsed, latencies = runner(
+                        url, token, args.requests, concurrency
+                    )
+                    report(
+                        f"{label} ({server})",
+                        elapsed,
+                        latencies,
+                        args.requests,
+                    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,250 @@
+"""HTTP load test of a running server, following the flows of the Bruno
+collection in ``Bank_API_Bruno/``.
+
+    python manage.py data --users 1000 --applications 100000 --seed 1
+    python manage.py runserver --noreload   # or any WSGI/ASGI server
+    python -m benchmarks.loadtest [--url URL] [--processes P] [--duration S]
+                                  [--user NAME ...] [--output FILE]
+
+Every worker process logs in as one of the given users, then keeps picking
+a flow (list/create applications, list/patch payments, refresh the token)
+until the time is up. Latency percentiles and requests per second are
+printed per endpoint and written to a JSON file, so runs of different
+releases can be compared. Unlike the other scripts this one only speaks
+HTTP and needs nothing but the standard library.
+"""
+
+import argparse
+import http.client
+import json
+import multiprocessing
+import platform
+import random
+import time
+from datetime import datetime, timezone
+from urllib.parse import urlencode, urlsplit
+
+PREFIX = "/api/v1"
+
+# Relative weight of each flow once logged in.
+FLOWS = {
+    "list_applications": 30,
+    "create_application": 10,
+    "list_payments": 40,
+    "patch_payment": 15,
+    "refresh": 5,
+}
+
+
+class Client:
+    """One keep-alive connection with the worker's tokens."""
+
+    def __init__(self, url, timeout):
+        parts = urlsplit(url)
+        connection = (
+            http.client.HTTPSConnection
+            if parts.scheme == "https"
+            else http.client.HTTPConnection
+        )
+        self.connection = connection(parts.netloc, timeout=timeout)
+        self.access = self.refresh_token = None
+        self.samples = []
+
+    def call(self, endpoint, method, path, form=None, body=None):
+        headers = {"Accept": "application/json"}
+        if self.access:
+            headers["Authorization"] = f"Bearer {self.access}"
+        if form is not None:
+            body = urlencode(form)
+            headers["Content-Type"] = "application/x-www-form-urlencoded"
+        elif body is not None:
+            body = json.dumps(body)
+            headers["Content-Type"] = "application/json"
+
+        started = time.perf_counter()
+        try:
+            self.connection.request(method, PREFIX + path, body, headers)
+            response = self.connection.getresponse()
+            payload = response.read()
+            status = response.status
+        except (OSError, http.client.HTTPException):
+            self.connection.close()
+            payload, status = b"", 0
+        self.samples.append(
+            (endpoint, time.perf_counter() - started, status)
+        )
+
+        if not 200 <= status < 300:
+            return None
+        return json.loads(payload) if payload else None
+
+    def login(self, username, password):
+        tokens = self.call(
+            "login",
+            "POST",
+            "/login/",
+            form={"username": username, "password": password},
+        )
+        if tokens is None:
+            raise SystemExit(f"Could not log in as {username}")
+        self.access, self.refresh_token = tokens["access"], tokens["refresh"]
+
+    def refresh(self):
+        tokens = self.call(
+            "refresh",
+            "POST",
+            "/refresh/",
+            body={"refresh": self.refresh_token},
+        )
+        if tokens is not None:
+            self.access = tokens["access"]
+            self.refresh_token = tokens.get("refresh", self.refresh_token)
+
+
+def worker(url, username, password, duration, timeout, seed):
+    rng = random.Random(seed)
+    client = Client(url, timeout)
+    client.login(username, password)
+
+    payment_ids = []
+    flows, weights = zip(*FLOWS.items())
+    deadline = time.perf_counter() + duration
+    while time.perf_counter() < deadline:
+        flow = rng.choices(flows, weights)[0]
+        if flow == "patch_payment" and not payment_ids:
+            flow = "list_payments"
+
+        if flow == "list_applications":
+            client.call(flow, "GET", "/applications/")
+        elif flow == "create_application":
+            client.call(
+                flow,
+                "POST",
+                "/applications/",
+                form={
+                    "amount": rng.randrange(1000, 100000, 100),
+                    "duration_months": rng.choice((6, 12, 24, 36)),
+                },
+            )
+        elif flow == "list_payments":
+            page = client.call(flow, "GET", "/payments/?status=scheduled")
+            if page is not None:
+                payment_ids = [row["id"] for row in page["results"]]
+        elif flow == "patch_payment":
+            client.call(
+                flow,
+                "PATCH",
+                f"/payments/{payment_ids.pop()}/",
+                body={"status": rng.choice(("paid", "paid", "failed"))},
+            )
+        else:
+            client.refresh()
+
+    return client.samples
+
+
+def percentile(ordered, fraction):
+    """Nearest-rank percentile of an already sorted list."""
+    index = max(0, min(len(ordered) - 1, round(fraction * len(ordered)) - 1))
+    return ordered[index]
+
+
+def summarize(samples, elapsed):
+    endpoints = {}
+    for endpoint, latency, status in samples:
+        entry = endpoints.setdefault(endpoint, {"latency": [], "errors": 0})
+        entry["latency"].append(latency * 1000)
+        entry["errors"] += not 200 <= status < 300
+
+    summary = {}
+    for endpoint, entry in sorted(endpoints.items()):
+        latency = sorted(entry["latency"])
+        summary[endpoint] = {
+            "requests": len(latency),
+            "errors": entry["errors"],
+            "rps": round(len(latency) / elapsed, 2),
+            "mean_ms": round(sum(latency) / len(latency), 3),
+            "p50_ms": round(percentile(latency, 0.50), 3),
+            "p95_ms": round(percentile(latency, 0.95), 3),
+            "p99_ms": round(percentile(latency, 0.99), 3),
+            "max_ms": round(latency[-1], 3),
+        }
+    return summary
+
+
+def report(summary, elapsed):
+    columns = ("requests", "errors", "rps", "p50_ms", "p95_ms", "p99_ms")
+    print(f"\n{elapsed:.1f}s")
+    print(f"{'':<20}" + "".join(f"{column:>10}" for column in columns))
+    for endpoint, row in summary.items():
+        print(
+            f"{endpoint:<20}"
+            + "".join(f"{row[column]:>10}" for column in columns)
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--processes", type=int, default=4)
+    parser.add_argument(
+        "--duration", type=float, default=30, help="Seconds per worker."
+    )
+    parser.add_argument(
+        "--user",
+        action="append",
+        dest="users",
+        help="Account to log in with, repeat for more; workers take turns. "
+        "Defaults to the demo borrowers of the data command.",
+    )
+    parser.add_argument("--password", default="@dmin123")
+    parser.add_argument("--timeout", type=float, default=30)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="loadtest.json")
+    args = parser.parse_args()
+    users = args.users or ["borrower_1", "borrower_2", "borrower_3"]
+
+    jobs = [
+        (
+            args.url,
+            users[index % len(users)],
+            args.password,
+            args.duration,
+            args.timeout,
+            args.seed + index,
+        )
+        for index in range(args.processes)
+    ]
+    started = time.perf_counter()
+    with multiprocessing.Pool(args.processes) as pool:
+        results = pool.starmap(worker, jobs)
+    elapsed = time.perf_counter() - started
+
+    summary = summarize(
+        [sample for samples in results for sample in samples], elapsed
+    )
+    report(summary, elapsed)
+
+    with open(args.output, "w") as output:
+        json.dump(
+            {
+                "finished_at": datetime.now(timezone.utc).isoformat(),
+                "url": args.url,
+                "processes": args.processes,
+                "duration": args.duration,
+                "users": users,
+                "elapsed": round(elapsed, 3),
+                "python": platform.python_version(),
+                "endpoints": summary,
+            },
+            output,
+            indent=2,
+        )
+    print(f"\nResults written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""Rows per second of the DRF serializers against the values_list() fast
+path used by the list endpoints, including the query and JSON rendering.
+
+    python -m benchmarks.serializers [--rows N ...] [--repeat N]
+"""
+
+import argparse
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+
+from . import seed_groups, setup, test_database
+
+
+def seed(rows):
+    from core.models import Application, Payment, Transactions, User
+
+    groups = seed_groups()
+    borrower = User.objects.create_user(username="bench_borrower")
+    borrower.groups.add(groups["Borrower"])
+
+    Application.objects.bulk_create(
+        [
+            Application(
+                user=borrower,
+                application_type="loan",
+                amount=Decimal(1000 + index % 900),
+                duration_months=12,
+                interest_rate=Decimal("9.75") if index % 3 else None,
+                status=("approved", "pending", "rejected")[index % 3],
+            )
+            for index in range(rows)
+        ],
+        batch_size=1000,
+    )
+    transaction = Transactions.objects.create(
+        user=borrower,
+        application=Application.objects.first(),
+        start_date=date(2025, 1, 1),
+        end_date=date(2025, 12, 1),
+        monthly_payment=100,
+        total_amount=1200,
+    )
+    Payment.objects.bulk_create(
+        [
+            Payment(
+                payment_type="loan",
+                amount=Decimal("91.67"),
+                due_date=date(2025, 1, 1) + timedelta(days=index % 3650),
+                status=("scheduled", "paid", "failed")[index % 3],
+                transaction=transaction,
+            )
+            for index in range(rows)
+        ],
+        batch_size=1000,
+    )
+
+
+def measure(serialize, repeat):
+    from rest_framework.renderers import JSONRenderer
+
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        JSONRenderer().render(serialize())
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--rows", type=int, nargs="+", default=[10_000, 100_000]
+    )
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    setup()
+    from core.models import Application, Payment
+    from core.serializer import (
+        ApplicationSerializer,
+        PaymentSerializer,
+        application_rows,
+        payment_rows,
+    )
+
+    cases = (
+        ("applications", Application, ApplicationSerializer, application_rows),
+        ("payments", Payment, PaymentSerializer, payment_rows),
+    )
+    print(
+        f"{'':<14} {'rows':>8} {'serializer/s':>14} {'values/s':>14} "
+        f"{'speedup':>8}"
+    )
+    for rows in args.rows:
+        with test_database():
+            seed(rows)
+            for label, model, serializer_class, fast in cases:
+                queryset = model.objects.order_by("id")[:rows]
+                slow = measure(
+                    lambda: serializer_class(queryset.all(), many=True).data,
+                    args.repeat,
+                )
+                quick = measure(
+                    lambda: fast.to_representation(
+                        fast.values_list(queryset.all())
+                    ),
+                    args.repeat,
+                )
+                print(
+                    f"{label:<14} {rows:>8} {rows / slow:>14,.0f} "
+                    f"{rows / quick:>14,.0f} {slow / quick:>7.1f}x"
+                )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,25 +1,111 @@
+from functools import cached_property
 from typing import override
+from django.conf import settings
 from django.contrib import admin
-from django.db.models import Q
-
-from .models import User, Application, CashFlow, Payment, Transactions
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils import timezone
+
+from .amortization import amortize, from_cents
+from .models import (
+    User,
+    Application,
+    ArchivedCashFlow,
+    ArchivedPayment,
+    CashFlow,
+    Job,
+    Payment,
+    Transactions,
+)
 
 from .forms import CustomerApplicationForm, ProviderApplicationForm, ApplicationAdminForm
 # Register your models here.
 
 
+def estimated_count(model, using="default"):
+    """Row count of ``model``'s table as last estimated by the database,
+    None when it keeps no estimate (e.g. before the first ANALYZE)."""
+    connection = connections[using]
+    table = model._meta.db_table
+    with connection.cursor() as cursor:
+        if connection.vendor == "postgresql":
+            cursor.execute(
+                "SELECT reltuples::bigint FROM pg_class "
+                "WHERE oid = to_regclass(%s)",
+                [connection.ops.quote_name(table)],
+            )
+            row = cursor.fetchone()
+        elif connection.vendor == "mysql":
+            cursor.execute(
+                "SELECT table_rows FROM information_schema.tables "
+                "WHERE table_schema = DATABASE() AND table_name = %s",
+                [table],
+            )
+            row = cursor.fetchone()
+        elif connection.vendor == "sqlite":
+            cursor.execute(
+                "SELECT 1 FROM sqlite_master WHERE name = 'sqlite_stat1'"
+            )
+            if cursor.fetchone() is None:
+                return None
+            # One row per index, each starting with the rows it covers.
+            cursor.execute(
+                "SELECT stat FROM sqlite_stat1 WHERE tbl = %s", [table]
+            )
+            counts = [int(stat.split()[0]) for stat, in cursor.fetchall()]
+            row = (max(counts),) if counts else None
+        else:
+            return None
+
+    if row is None or row[0] is None or row[0] < 0:
+        return None
+    return int(row[0])
+
+
+class EstimatedCountPaginator(Paginator):
+    """Takes the database's row estimate instead of a COUNT(*) for an
+    unfiltered changelist of a large table. The page count may be off by
+    the estimate's error; filtered lists are still counted exactly."""
+
+    threshold = 10000
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not queryset.query.where:
+            estimate = estimated_count(queryset.model, queryset.db)
+            if estimate is not None and estimate >= self.threshold:
+                return estimate
+        return super().count
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    """Changelist settings for tables with millions of rows: no exact
+    total next to the filter results, no facet counts, and the
+    estimate-based paginator."""
+
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    show_facets = admin.ShowFacets.NEVER
+
+
 @admin.register(User)
-class UserAdmin(admin.ModelAdmin):
+class UserAdmin(LargeTableAdmin):
     list_display = ["username", "email", "is_staff"]
+    ordering = ["username"]
+    # Case-sensitive prefix, answered from the username's unique index.
+    search_fields = ["username__startswith"]
 
 
 @admin.register(CashFlow)
-class CashFlowAdmin(admin.ModelAdmin):
+class CashFlowAdmin(LargeTableAdmin):
     list_display = ["transaction_type", "amount", "date", "transaction"]
+    list_select_related = ["transaction__application__user"]
+    raw_id_fields = ["transaction"]
 
 
 @admin.register(Transactions)
-class TransactionsAdmin(admin.ModelAdmin):
+class TransactionsAdmin(LargeTableAdmin):
     list_display = [
         "user",
         "application",
@@ -27,42 +113,59 @@ class TransactionsAdmin(admin.ModelAdmin):
         "start_date",
         "end_date",
         "application__interest_rate",
+        "remaining_amount",
+        "next_due_date",
+        "overdue_count",
+        "is_active",
+    ]
+    list_select_related = ["user", "application__user"]
+    raw_id_fields = ["user", "application"]
+    # Recounted from the payments, see Transactions.refresh_counters().
+    readonly_fields = [
+        "is_active",
+        "paid_amount",
+        "remaining_amount",
+        "paid_count",
+        "failed_count",
+        "scheduled_count",
+        "overdue_count",
+        "overdue_since",
+        "next_due_date",
     ]
-    show_facets = True
 
-    
+
 @admin.register(Application)
-class ApplicationAdmin(admin.ModelAdmin):
+class ApplicationAdmin(LargeTableAdmin):
     list_display = [
         "user",
         "application_type",
         "amount",
         "interest_rate",
         "status",
+        "schedule_status",
         "created_at",
     ]
     list_filter = ["application_type", "status"]
+    list_select_related = ["user"]
+    # Bank personnel pick the applicant, the other forms hide the field.
+    autocomplete_fields = ["user"]
 
     def get_queryset(self, request):
-        qs = super().get_queryset(request)
-        if request.user.is_superuser:
-            return qs
-
-        return qs.filter(user=request.user)
+        return super().get_queryset(request).for_user(request.user)
 
     def get_form(self, request, obj=None, **kwargs):
         user = request.user
         form = None  
 
-        if user.groups.filter(name='Bank Personnel').exists():
+        if user.is_bank_personnel:
             self.form = ApplicationAdminForm
             form = super().get_form(request, obj, **kwargs)
             form.base_fields['reviewed_by'].initial = user
             return form
 
-        elif user.groups.filter(name='Borrower').exists():
+        elif user.is_borrower:
             self.form = CustomerApplicationForm
-        elif user.groups.filter(name='Provider').exists():
+        elif user.is_provider:
             self.form = ProviderApplicationForm
 
         if form is None:
@@ -74,17 +177,78 @@ class ApplicationAdmin(admin.ModelAdmin):
         self.readonly_fields = ('status', 'interest_rate')
         return form
 
+    def get_readonly_fields(self, request, obj=None):
+        return (
+            *super().get_readonly_fields(request, obj),
+            "schedule_preview",
+        )
+
+    @admin.display(description="Payment schedule")
+    def schedule_preview(self, obj):
+        if obj is None or obj.pk is None or obj.interest_rate is None:
+            return "-"
+
+        schedule = amortize(
+            obj.amount,
+            obj.interest_rate,
+            obj.duration_months,
+            timezone.localdate(),
+            mode=settings.LOAN_AMORTIZATION_MODE,
+        )
+        *_, (_, last_date, last_amount) = schedule.installments(0)
+        return (
+            f"{obj.duration_months} payments of "
+            f"{from_cents(schedule.installment[0])}, last {last_amount} "
+            f"on {last_date}, total {from_cents(schedule.total[0])}"
+        )
+
 @admin.register(Payment)
-class PaymentAdmin(admin.ModelAdmin):
+class PaymentAdmin(LargeTableAdmin):
     list_display = ["payment_type", "amount", "status", "transaction"]
     list_filter = ["payment_type", "status"]
     list_display_links = []
+    list_select_related = ["transaction__application__user"]
+    raw_id_fields = ["transaction"]
 
     def get_queryset(self, request):
-        qs = super().get_queryset(request)
-        if request.user.is_superuser:
-            return qs
+        # transaction__user, through the transaction's user index.
+        return super().get_queryset(request).for_user(request.user)
 
-        return qs.filter(
-            Q(loan__user=request.user) | Q(deposit__user=request.user)
-        )
+
+class ArchiveAdmin(LargeTableAdmin):
+    """Archived rows are history, only ``manage.py archive`` writes them."""
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(ArchivedPayment)
+class ArchivedPaymentAdmin(ArchiveAdmin):
+    list_display = [
+        "payment_type",
+        "amount",
+        "status",
+        "due_date",
+        "transaction",
+    ]
+    list_filter = ["payment_type", "status"]
+    list_select_related = ["transaction__application__user"]
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).for_user(request.user)
+
+
+@admin.register(ArchivedCashFlow)
+class ArchivedCashFlowAdmin(ArchiveAdmin):
+    list_display = ["transaction_type", "amount", "date", "transaction"]
+    list_select_related = ["transaction__application__user"]
+
+
+@admin.register(Job)
+class JobAdmin(LargeTableAdmin):
+    list_display = ["name", "status", "attempts", "run_after", "updated_at"]
+    list_filter = ["status", "name"]
+    readonly_fields = ["last_error"]
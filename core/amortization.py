@@ -0,0 +1,176 @@
+"""Payment schedules for many loans at once.
+
+Money is handled as integer cents in NumPy arrays, so a schedule is exact to
+the cent: every installment is the regular amount except the last one,
+which absorbs whatever rounding remainder is left.
+"""
+
+from dataclasses import dataclass
+from decimal import ROUND_HALF_UP, Decimal
+
+import numpy as np
+
+SIMPLE = "simple"
+ANNUITY = "annuity"
+MODES = (SIMPLE, ANNUITY)
+
+
+@dataclass(frozen=True)
+class Schedule:
+    # One entry per loan.
+    months: np.ndarray
+    offset: np.ndarray
+    installment: np.ndarray
+    total: np.ndarray
+    # One entry per installment, grouped by loan in input order.
+    loan: np.ndarray
+    number: np.ndarray
+    due_date: np.ndarray
+    amount: np.ndarray
+
+    def __len__(self):
+        return len(self.months)
+
+    def installments(self, index):
+        """(number, due date, amount) rows of a single loan."""
+        rows = slice(
+            self.offset[index], self.offset[index] + self.months[index]
+        )
+        return zip(
+            self.number[rows].tolist(),
+            self.due_date[rows].astype(object),
+            map(from_cents, self.amount[rows].tolist()),
+        )
+
+    def end_date(self, index):
+        last = self.offset[index] + self.months[index] - 1
+        return self.due_date[last].astype(object)
+
+
+def to_cents(values) -> np.ndarray:
+    return np.fromiter(
+        (
+            int(
+                (Decimal(str(value)) * 100).quantize(1, rounding=ROUND_HALF_UP)
+            )
+            for value in np.ravel(np.asarray(values, dtype=object))
+        ),
+        dtype=np.int64,
+    )
+
+
+def from_cents(cents) -> Decimal:
+    return Decimal(int(cents)).scaleb(-2)
+
+
+def _round(values):
+    return np.floor(values + 0.5).astype(np.int64)
+
+
+def _regular_installment(total, months):
+    """Nearest-cent share of ``total``, never so large that the last
+    installment would go negative."""
+    nearest = _round(total / months)
+    floor = total // months
+    return np.where(nearest * (months - 1) > total, floor, nearest)
+
+
+def amortize(principal, rate, months, start, mode=SIMPLE) -> Schedule:
+    """Schedules for every loan described by the (broadcast) arguments.
+
+    ``rate`` is a percentage. In ``simple`` mode it is the flat interest
+    charged over the whole loan, in ``annuity`` mode it is the nominal
+    yearly rate charged monthly on the declining balance.
+    """
+    if mode not in MODES:
+        raise ValueError(f"Unknown amortization mode {mode!r}")
+
+    principal = np.atleast_1d(principal)
+    rate = np.atleast_1d(np.asarray(rate, dtype=np.float64))
+    months = np.atleast_1d(np.asarray(months, dtype=np.int64))
+    start = np.atleast_1d(np.asarray(start, dtype="datetime64[D]"))
+    count = np.broadcast_shapes(
+        principal.shape, rate.shape, months.shape, start.shape
+    )
+    try:
+        principal = np.broadcast_to(to_cents(principal), count)
+    except (ArithmeticError, ValueError):
+        # None, NaN and infinities have no amount in cents.
+        raise ValueError("Every loan needs a finite principal") from None
+    rate, months, start = (
+        np.broadcast_to(values, count) for values in (rate, months, start)
+    )
+    if (principal < 0).any():
+        raise ValueError("A principal can't be negative")
+    # None turns into NaN as a float.
+    if not np.isfinite(rate).all() or (rate < 0).any():
+        raise ValueError("Every loan needs a finite, non-negative rate")
+    if (months < 1).any():
+        raise ValueError("Every loan needs at least one installment")
+
+    offset = np.cumsum(months) - months
+    loan = np.repeat(np.arange(len(months)), months)
+    number = np.arange(len(loan)) - offset[loan] + 1
+    last = offset + months - 1
+
+    if mode == SIMPLE:
+        total = principal + _round(principal * rate / 100)
+        installment = _regular_installment(total, months)
+        amount = installment[loan]
+        amount[last] = total - installment * (months - 1)
+    else:
+        amount, installment = _annuity(principal, rate / 1200, months, offset)
+        total = np.zeros(len(months), dtype=np.int64)
+        np.add.at(total, loan, amount)
+
+    return Schedule(
+        months=months,
+        offset=offset,
+        installment=installment,
+        total=total,
+        loan=loan,
+        number=number,
+        due_date=_due_dates(start, loan, number),
+        amount=amount,
+    )
+
+
+def _annuity(principal, monthly_rate, months, offset):
+    with np.errstate(divide="ignore", invalid="ignore"):
+        payment = np.where(
+            monthly_rate > 0,
+            principal
+            * monthly_rate
+            / (1 - (1 + monthly_rate) ** -months.astype(np.float64)),
+            principal / months,
+        )
+    installment = _round(payment)
+
+    amount = np.empty(months.sum(), dtype=np.int64)
+    balance = principal.copy()
+    for month in range(months.max()):
+        active = np.flatnonzero(months > month)
+        interest = _round(balance[active] * monthly_rate[active])
+        due = np.where(
+            months[active] == month + 1,
+            balance[active] + interest,
+            installment[active],
+        )
+        amount[offset[active] + month] = due
+        balance[active] += interest - due
+
+    return amount, installment
+
+
+def _due_dates(start, loan, number):
+    """Same day of the month ``number`` months after the start date,
+    clamped to the last day of shorter months."""
+    first_month = start.astype("datetime64[M]")
+    day = (start - first_month.astype("datetime64[D]")).astype(np.int64)
+
+    month = first_month[loan] + number.astype("timedelta64[M]")
+    month_start = month.astype("datetime64[D]")
+    month_length = (
+        (month + 1).astype("datetime64[D]") - month_start
+    ).astype(np.int64)
+    return month_start + np.minimum(day[loan], month_length - 1)
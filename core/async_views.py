@@ -0,0 +1,238 @@
+"""Native async versions of the core API views, served under
+``/api/v1/async/`` when the project runs on ASGI.
+
+They answer with the same payloads as ``views.py`` but wait on the
+database with the async ORM, so an in-flight request does not hold a
+worker thread. DRF views are synchronous, so these are plain Django views
+with their own JWT authentication.
+"""
+
+import json
+
+from asgiref.sync import sync_to_async
+from django.db.transaction import atomic
+from django.http import JsonResponse
+from django.utils.decorators import method_decorator
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework import status
+from rest_framework.exceptions import (
+    APIException,
+    AuthenticationFailed,
+    NotAuthenticated,
+    NotFound,
+    PermissionDenied,
+    ValidationError,
+)
+
+from .authentication import CachedJWTAuthentication, verified_tokens
+from .models import Application, Payment
+from .pagination import ApplicationPagination, PaymentPagination
+from .serializer import (
+    ApplicationSerializer,
+    PaymentSerializer,
+    application_rows,
+    payment_rows,
+)
+
+
+class AsyncJWTAuthentication(CachedJWTAuthentication):
+    """The same checks and token cache, with the account looked up through
+    the async ORM."""
+
+    async def authenticate(self, request):
+        header = self.get_header(request)
+        if header is None:
+            raise NotAuthenticated()
+
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            raise NotAuthenticated()
+
+        cached = verified_tokens.get(raw_token)
+        if cached is not None:
+            return cached[0]
+
+        validated_token = self.get_validated_token(raw_token)
+        user = await self.aget_user(validated_token)
+        verified_tokens.set(raw_token, user, validated_token)
+        return user
+
+    async def aget_user(self, validated_token):
+        return self.token_user(
+            validated_token,
+            [row async for row in self.account(validated_token)],
+        )
+
+
+@method_decorator(csrf_exempt, name="dispatch")
+class AsyncAPIView(View):
+    authentication = AsyncJWTAuthentication()
+
+    async def dispatch(self, request, *args, **kwargs):
+        try:
+            request.user = await self.authentication.authenticate(request)
+            return await super().dispatch(request, *args, **kwargs)
+        except (NotAuthenticated, AuthenticationFailed) as error:
+            challenge = self.authentication.authenticate_header(request)
+            return JsonResponse(
+                (
+                    error.detail
+                    if isinstance(error.detail, dict)
+                    else {"detail": error.detail}
+                ),
+                status=status.HTTP_401_UNAUTHORIZED,
+                headers={"WWW-Authenticate": challenge},
+            )
+        except APIException as error:
+            return JsonResponse(
+                (
+                    error.detail
+                    if isinstance(error.detail, dict)
+                    else {"detail": error.detail}
+                ),
+                status=error.status_code,
+            )
+
+    @staticmethod
+    def data(request):
+        if request.content_type != "application/json":
+            return request.POST
+
+        try:
+            data = json.loads(request.body or b"{}")
+        except ValueError:
+            raise ValidationError({"detail": "Malformed JSON"})
+        if not isinstance(data, dict):
+            raise ValidationError({"detail": "Expected a JSON object"})
+        return data
+
+
+class AsyncApplicationsView(AsyncAPIView):
+    async def get(self, request):
+        paginator = ApplicationPagination()
+        page = await paginator.apaginate_queryset(
+            application_rows.values_list(
+                Application.objects.for_user(request.user),
+                *paginator.fields,
+            ),
+            request,
+        )
+        return JsonResponse(
+            paginator.get_paginated_data(
+                application_rows.to_representation(page)
+            )
+        )
+
+    async def post(self, request):
+        user = request.user
+        data = self.data(request)
+        serializer = ApplicationSerializer(
+            data={
+                "user": (
+                    user.id if not user.is_superuser else data.get("user")
+                ),
+                "amount": data.get("amount"),
+                "duration_months": data.get("duration_months"),
+                "application_type": (
+                    "deposit" if user.is_provider else "loan"
+                ),
+            },
+        )
+
+        # DRF validation may look related rows up synchronously.
+        if not await sync_to_async(serializer.is_valid)():
+            return JsonResponse(
+                serializer.errors, status=status.HTTP_400_BAD_REQUEST
+            )
+
+        await sync_to_async(serializer.save)()
+        return JsonResponse(serializer.data, status=status.HTTP_201_CREATED)
+
+
+class AsyncSingleApplicationView(AsyncAPIView):
+    async def get(self, request, id):
+        user = request.user
+        try:
+            application = await Application.objects.aget(id=id)
+        except Application.DoesNotExist:
+            raise NotFound()
+
+        if not (user.is_superuser or user.id == application.user_id):
+            raise PermissionDenied()
+
+        return JsonResponse(ApplicationSerializer(application).data)
+
+
+class AsyncPaymentsView(AsyncAPIView):
+    filterset_fields = ("payment_type", "status")
+
+    async def get(self, request):
+        queryset = Payment.objects.for_user(request.user)
+        for field in self.filterset_fields:
+            value = request.GET.get(field)
+            if not value:
+                continue
+
+            choices = dict(Payment._meta.get_field(field).choices)
+            if value not in choices:
+                raise ValidationError(
+                    {
+                        field: [
+                            f"Select a valid choice. {value} is not one of "
+                            "the available choices."
+                        ]
+                    }
+                )
+            queryset = queryset.filter(**{field: value})
+
+        paginator = PaymentPagination()
+        page = await paginator.apaginate_queryset(
+            payment_rows.values_list(queryset, *paginator.fields), request
+        )
+        return JsonResponse(
+            paginator.get_paginated_data(payment_rows.to_representation(page))
+        )
+
+
+class AsyncSinglePayment(AsyncAPIView):
+    async def get_payment(self, request, id):
+        try:
+            payment = await Payment.objects.select_related("transaction").aget(
+                pk=id
+            )
+        except Payment.DoesNotExist:
+            raise NotFound()
+
+        user = request.user
+        owner = payment.transaction.user_id if payment.transaction else None
+        if not (user.is_superuser or owner == user.id):
+            raise PermissionDenied()
+        return payment
+
+    async def get(self, request, id):
+        payment = await self.get_payment(request, id)
+        return JsonResponse(PaymentSerializer(payment).data)
+
+    async def patch(self, request, id):
+        payment = await self.get_payment(request, id)
+
+        patch_status = self.data(request).get("status", None)
+        if not patch_status in ("paid", "failed"):
+            return JsonResponse(
+                {"error": "'status' isn't valid"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        changes = Payment.status_change(patch_status)
+        for field, value in changes.items():
+            setattr(payment, field, value)
+        await sync_to_async(self.save)(payment, list(changes))
+        return JsonResponse(PaymentSerializer(payment).data)
+
+    @staticmethod
+    def save(payment, fields):
+        # Like SinglePayment.patch, the post_save receiver recounts the
+        # transaction's counters in the same database transaction.
+        with atomic():
+            payment.save(update_fields=fields)
@@ -0,0 +1,187 @@
+"""Stateless JWT authentication with a cache of verified tokens.
+
+Tokens carry the user's ``roles`` (group names) and flags as claims, for
+clients. The first request with a token checks its signature, the account
+(exists, active, password unchanged) and reads the current groups with one
+query, then keeps a ``TokenUser`` with those roles in a bounded LRU until
+the token expires or ``CORE_AUTH_CACHE_TIMEOUT`` seconds pass. Later
+requests with the same token skip both the signature and the database.
+
+Saving, deleting or regrouping a user, from either side of the relation,
+drops their cached tokens in this process (see ``signals.py``); other
+processes pick the change up within the timeout.
+"""
+
+import time
+from collections import OrderedDict
+from threading import Lock
+
+from django.conf import settings
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import (
+    AuthenticationFailed,
+    InvalidToken,
+)
+from rest_framework_simplejwt.models import TokenUser
+from rest_framework_simplejwt.serializers import (
+    TokenObtainPairSerializer,
+    TokenRefreshSerializer,
+)
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+from .cache import stats
+from .models import RoleChecks, User
+
+ROLES_CLAIM = "roles"
+
+
+def set_claims(token, user):
+    token["username"] = user.username
+    token["is_staff"] = user.is_staff
+    token["is_superuser"] = user.is_superuser
+    token[ROLES_CLAIM] = sorted(user.roles)
+    return token
+
+
+class RolesTokenUser(RoleChecks, TokenUser):
+    """User backed by a verified token, with the flags and groups read by
+    the account check."""
+
+    def __init__(self, token, is_staff, is_superuser, roles):
+        super().__init__(token)
+        self.is_staff = is_staff
+        self.is_superuser = is_superuser
+        self.roles = roles
+
+
+class VerifiedTokens:
+    """Bounded LRU of ``(user, token)`` by raw token, each entry kept until
+    the token expires or ``CORE_AUTH_CACHE_TIMEOUT`` seconds pass."""
+
+    def __init__(self):
+        self._lock = Lock()
+        self._entries = OrderedDict()
+
+    def get(self, raw_token):
+        with self._lock:
+            entry = self._entries.get(raw_token)
+            if entry is not None and entry[0] <= time.time():
+                del self._entries[raw_token]
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(raw_token)
+
+        stats.record("token", hit=entry is not None)
+        return None if entry is None else entry[1]
+
+    def set(self, raw_token, user, validated_token):
+        expires = min(
+            time.time() + settings.CORE_AUTH_CACHE_TIMEOUT,
+            validated_token["exp"],
+        )
+        with self._lock:
+            self._entries[raw_token] = (expires, (user, validated_token))
+            self._entries.move_to_end(raw_token)
+            while len(self._entries) > settings.CORE_AUTH_CACHE_SIZE:
+                self._entries.popitem(last=False)
+
+    def revoke(self, *user_ids):
+        user_ids = set(user_ids)
+        with self._lock:
+            for raw_token, (_, (user, _)) in list(self._entries.items()):
+                if user.id in user_ids:
+                    del self._entries[raw_token]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+verified_tokens = VerifiedTokens()
+
+
+class RolesTokenObtainPairSerializer(TokenObtainPairSerializer):
+    @classmethod
+    def get_token(cls, user):
+        return set_claims(super().get_token(user), user)
+
+
+class RolesTokenRefreshSerializer(TokenRefreshSerializer):
+    """Refreshes with the user's current roles and flags instead of the
+    ones copied from the refresh token."""
+
+    def validate(self, attrs):
+        data = super().validate(attrs)
+        access = AccessToken(data["access"])
+        user = User.objects.get(
+            **{api_settings.USER_ID_FIELD: access[api_settings.USER_ID_CLAIM]}
+        )
+
+        data["access"] = str(set_claims(access, user))
+        if "refresh" in data:
+            data["refresh"] = str(
+                set_claims(RefreshToken(data["refresh"]), user)
+            )
+        return data
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    def authenticate(self, request):
+        header = self.get_header(request)
+        if header is None:
+            return None
+
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+
+        cached = verified_tokens.get(raw_token)
+        if cached is not None:
+            return cached
+
+        validated_token = self.get_validated_token(raw_token)
+        user = self.get_user(validated_token)
+        verified_tokens.set(raw_token, user, validated_token)
+        return user, validated_token
+
+    def account(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(
+                "Token contained no recognizable user identification"
+            )
+
+        # One row per group, a single one with no name without groups.
+        return User.objects.filter(
+            **{api_settings.USER_ID_FIELD: user_id}
+        ).values_list(
+            "is_active", "password", "is_staff", "is_superuser", "groups__name"
+        )
+
+    def token_user(self, validated_token, rows):
+        if not rows:
+            raise AuthenticationFailed("User not found", code="user_not_found")
+
+        is_active, password, is_staff, is_superuser, _ = rows[0]
+        if api_settings.CHECK_USER_IS_ACTIVE and not is_active:
+            raise AuthenticationFailed(
+                "User is inactive", code="user_inactive"
+            )
+        if api_settings.CHECK_REVOKE_TOKEN and validated_token.get(
+            api_settings.REVOKE_TOKEN_CLAIM
+        ) != get_md5_hash_password(password):
+            raise AuthenticationFailed(
+                "The user's password has been changed.",
+                code="password_changed",
+            )
+        # The claim may predate a group change, the database can't.
+        roles = frozenset(row[-1] for row in rows if row[-1] is not None)
+        return RolesTokenUser(validated_token, is_staff, is_superuser, roles)
+
+    def get_user(self, validated_token):
+        return self.token_user(
+            validated_token, list(self.account(validated_token))
+        )
@@ -0,0 +1,251 @@
+"""Read-through cache of serialized applications and payments, and the
+per-user data versions behind the API's ETags.
+
+Entries hold the serialized representation together with the owner's id,
+so the per-user permission check runs without touching the database.
+They are dropped by the post_save/post_delete receivers in ``signals.py``
+whenever the underlying row changes, which also bump the owner's data
+version. The backend is the Django cache named by ``CORE_CACHE_ALIAS``.
+
+Account summaries are keyed by the user's data version instead, so any
+change to their rows moves them to a fresh key, and ``CORE_SUMMARY_TIMEOUT``
+bounds how long one is served.
+"""
+
+from collections import Counter
+from functools import wraps
+from hashlib import sha1
+from threading import Lock
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models import F, Subquery
+from django.utils.http import parse_etags
+from rest_framework import status
+from rest_framework.response import Response
+
+from .models import Application, ArchivedPayment, Payment, Transactions
+from .serializer import (
+    ApplicationSerializer,
+    PaymentSerializer,
+    TransactionsSummarySerializer,
+)
+
+
+class CacheStats:
+    """Hit/miss counters of this process, keyed by entry kind."""
+
+    def __init__(self):
+        self._lock = Lock()
+        self._counts = Counter()
+
+    def record(self, kind, hit):
+        with self._lock:
+            self._counts[kind, "hits" if hit else "misses"] += 1
+
+    def snapshot(self):
+        with self._lock:
+            counts = dict(self._counts)
+
+        kinds = sorted({kind for kind, _ in counts})
+        return {
+            kind: {
+                "hits": counts.get((kind, "hits"), 0),
+                "misses": counts.get((kind, "misses"), 0),
+            }
+            for kind in kinds
+        }
+
+    def reset(self):
+        with self._lock:
+            self._counts.clear()
+
+
+stats = CacheStats()
+
+
+def get_cache():
+    return caches[settings.CORE_CACHE_ALIAS]
+
+
+def cache_key(kind, pk):
+    return f"core:{kind}:{pk}"
+
+
+def read_through(kind, pk, load):
+    cache = get_cache()
+    key = cache_key(kind, pk)
+
+    entry = cache.get(key)
+    stats.record(kind, hit=entry is not None)
+    if entry is None:
+        entry = load(pk)
+        if entry is not None:
+            cache.set(key, entry, settings.CORE_CACHE_TIMEOUT)
+    return entry
+
+
+def invalidate(kind, *pks):
+    # Again on commit, in case a concurrent reader re-cached the row
+    # between the write and the end of its transaction.
+    keys = [cache_key(kind, pk) for pk in pks]
+    get_cache().delete_many(keys)
+    transaction.on_commit(lambda: get_cache().delete_many(keys))
+
+
+# Version of everything, what superusers see.
+ALL_USERS = "all"
+
+
+def version_key(scope):
+    return f"core:version:{scope}"
+
+
+def data_version(user):
+    """Opaque token that changes whenever any application or payment
+    visible to ``user`` changes.
+
+    A bump only reaches the processes sharing the cache, versions expire
+    after ``CORE_VERSION_TIMEOUT`` seconds so the others catch up too."""
+    cache = get_cache()
+    key = version_key(ALL_USERS if user.is_superuser else user.id)
+
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, uuid4().hex, settings.CORE_VERSION_TIMEOUT)
+        version = cache.get(key)
+    return version
+
+
+def bump_versions(*user_ids):
+    """Forget the versions of these users (and of superusers) so the next
+    read starts a new one."""
+    keys = [version_key(ALL_USERS)]
+    keys += [version_key(user_id) for user_id in user_ids if user_id]
+    get_cache().delete_many(keys)
+    transaction.on_commit(lambda: get_cache().delete_many(keys))
+
+
+def data_etag(request):
+    user = request.user
+    parts = (
+        str(user.id),
+        data_version(user),
+        request.get_full_path(),
+        request.headers.get("Accept", ""),
+    )
+    return f'"{sha1("|".join(parts).encode()).hexdigest()}"'
+
+
+def conditional_get(view_method):
+    """Answer a GET with 304 when the client's If-None-Match still
+    matches the user's data version, before the view runs any query."""
+
+    @wraps(view_method)
+    def wrapper(view, request, *args, **kwargs):
+        if not request.user.is_authenticated:
+            return view_method(view, request, *args, **kwargs)
+
+        etag = data_etag(request)
+        if etag in parse_etags(request.headers.get("If-None-Match", "")):
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            response = view_method(view, request, *args, **kwargs)
+
+        if response.status_code in (
+            status.HTTP_200_OK,
+            status.HTTP_304_NOT_MODIFIED,
+        ):
+            response["ETag"] = etag
+        return response
+
+    return wrapper
+
+
+def _load_application(pk):
+    application = Application.objects.filter(pk=pk).first()
+    if application is None:
+        return None
+    return {
+        "owner": application.user_id,
+        "data": dict(ApplicationSerializer(application).data),
+    }
+
+
+def _load_payment(pk):
+    payment = (
+        Payment.objects.annotate(owner=F("transaction__user"))
+        .filter(pk=pk)
+        .first()
+    )
+    if payment is None:
+        return None
+    return {
+        "owner": payment.owner,
+        "data": dict(PaymentSerializer(payment).data),
+    }
+
+
+def cached_application(pk):
+    """``{"owner": user id, "data": serialized}`` or None if missing."""
+    return read_through("application", pk, _load_application)
+
+
+def cached_payment(pk):
+    return read_through("payment", pk, _load_payment)
+
+
+def _load_archived_payment(pk):
+    payment = (
+        ArchivedPayment.objects.annotate(owner=F("transaction__user"))
+        .filter(pk=pk)
+        .first()
+    )
+    if payment is None:
+        return None
+    return {
+        "owner": payment.owner,
+        "data": dict(PaymentSerializer(payment).data),
+    }
+
+
+def cached_archived_payment(pk):
+    return read_through("archived_payment", pk, _load_archived_payment)
+
+
+def _load_summary(user):
+    transactions = Transactions.objects.for_user(user)
+    summary = transactions.summary()
+    upcoming = transactions.filter(next_due_date__isnull=False).order_by(
+        "next_due_date", "pk"
+    )[:1]
+    payment = (
+        Payment.objects.filter(
+            transaction=Subquery(upcoming.values("pk")),
+            due_date=Subquery(upcoming.values("next_due_date")),
+            status__in=("scheduled", "overdue"),
+        )
+        .order_by("pk")
+        .first()
+    )
+    summary["next_payment"] = (
+        None if payment is None else dict(PaymentSerializer(payment).data)
+    )
+    return dict(TransactionsSummarySerializer(summary).data)
+
+
+def cached_summary(user):
+    """Totals of ``user``'s transactions (everyone's for superusers) and
+    their next due payment, from the transaction counters."""
+    cache = get_cache()
+    scope = ALL_USERS if user.is_superuser else user.id
+    key = f"core:summary:{scope}:{data_version(user)}"
+
+    summary = cache.get(key)
+    stats.record("summary", hit=summary is not None)
+    if summary is None:
+        summary = _load_summary(user)
+        cache.set(key, summary, settings.CORE_SUMMARY_TIMEOUT)
+    return summary
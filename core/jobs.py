@@ -0,0 +1,137 @@
+"""Database-backed background jobs, no broker needed.
+
+Handlers are registered with ``@job("name")`` and queued with
+``enqueue("name", **payload)``, in the same transaction as the change that
+needs them, so a job exists exactly when that change was committed.
+``manage.py worker`` claims due jobs and runs them. A job stays claimed
+for ``CORE_JOBS_VISIBILITY_TIMEOUT`` seconds; if its worker dies it is
+claimed again after that, so handlers must be idempotent. Failures are
+retried with exponential backoff up to the job's ``max_attempts``; a
+handler registered with ``@on_failure("name")`` then runs once with the
+same payload, so the change that queued the job can be marked as such.
+
+With ``CORE_JOBS_EAGER`` jobs run inline at ``enqueue`` time instead.
+"""
+
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import F, Q
+from django.db.transaction import atomic
+from django.utils import timezone
+
+from .models import Job
+
+handlers = {}
+failure_handlers = {}
+
+
+def job(name):
+    def register(handler):
+        handlers[name] = handler
+        return handler
+
+    return register
+
+
+def on_failure(name):
+    def register(handler):
+        failure_handlers[name] = handler
+        return handler
+
+    return register
+
+
+def enqueue(name, **payload):
+    if name not in handlers:
+        raise KeyError(f"No job handler named {name!r}")
+
+    if settings.CORE_JOBS_EAGER:
+        handlers[name](**payload)
+        return None
+    return Job.objects.create(name=name, payload=payload)
+
+
+def due(now):
+    """Queued jobs whose time has come and running ones whose visibility
+    timeout expired."""
+    return Q(status="queued", run_after__lte=now) | Q(
+        status="running", locked_until__lt=now
+    )
+
+
+def claim(limit):
+    """Marks up to ``limit`` due jobs as running for this worker.
+
+    Each job is taken with a conditional UPDATE, so when several workers
+    race for the same row only one of them gets it.
+    """
+    now = timezone.now()
+    candidates = Job.objects.filter(due(now)).order_by("run_after", "id")
+    claimed = []
+    for pk in candidates.values_list("pk", flat=True)[:limit]:
+        taken = Job.objects.filter(due(now), pk=pk).update(
+            status="running",
+            attempts=F("attempts") + 1,
+            locked_until=now
+            + timedelta(seconds=settings.CORE_JOBS_VISIBILITY_TIMEOUT),
+        )
+        if taken:
+            claimed.append(pk)
+    return list(Job.objects.filter(pk__in=claimed).order_by("run_after", "id"))
+
+
+def run(claimed):
+    """Runs a claimed job, returns whether it succeeded."""
+    handler = handlers.get(claimed.name)
+    try:
+        if handler is None:
+            raise KeyError(f"No job handler named {claimed.name!r}")
+        with atomic():
+            handler(**claimed.payload)
+    except Exception:
+        claimed.last_error = traceback.format_exc()
+        if claimed.attempts >= claimed.max_attempts:
+            claimed.status = "failed"
+            give_up(claimed)
+        else:
+            claimed.status = "queued"
+            claimed.run_after = timezone.now() + timedelta(
+                seconds=settings.CORE_JOBS_RETRY_DELAY
+                * 2 ** (claimed.attempts - 1)
+            )
+        succeeded = False
+    else:
+        claimed.status = "done"
+        succeeded = True
+
+    claimed.locked_until = None
+    claimed.save(
+        update_fields=[
+            "status",
+            "run_after",
+            "locked_until",
+            "last_error",
+            "updated_at",
+        ]
+    )
+    return succeeded
+
+
+def give_up(claimed):
+    """Runs the failure handler of a job that won't be retried."""
+    handler = failure_handlers.get(claimed.name)
+    if handler is None:
+        return
+    try:
+        with atomic():
+            handler(**claimed.payload)
+    except Exception:
+        claimed.last_error += "\n" + traceback.format_exc()
+
+
+def run_pending(limit=100):
+    """Claims and runs one round of due jobs, returns (succeeded, failed)."""
+    results = [run(claimed) for claimed in claim(limit)]
+    return results.count(True), results.count(False)
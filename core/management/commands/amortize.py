@@ -0,0 +1,41 @@
+from datetime import date
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from core.amortization import MODES, amortize, from_cents
+
+
+class Command(BaseCommand):
+    help = "Print the payment schedule a loan would get if approved."
+
+    def add_arguments(self, parser):
+        parser.add_argument("amount", help="Principal, e.g. 1000.00")
+        parser.add_argument("rate", help="Interest rate in percent")
+        parser.add_argument("months", type=int)
+        parser.add_argument(
+            "--mode", choices=MODES, default=settings.LOAN_AMORTIZATION_MODE
+        )
+        parser.add_argument(
+            "--start",
+            type=date.fromisoformat,
+            default=date.today(),
+            help="Start date (YYYY-MM-DD), defaults to today.",
+        )
+
+    def handle(self, **options):
+        try:
+            schedule = amortize(
+                options["amount"],
+                options["rate"],
+                options["months"],
+                options["start"],
+                mode=options["mode"],
+            )
+        except (ArithmeticError, ValueError) as error:
+            raise CommandError(error)
+
+        for number, due_date, amount in schedule.installments(0):
+            self.stdout.write(f"{number:>5}  {due_date}  {amount:>15}")
+
+        self.stdout.write(f">>> Total : {from_cents(schedule.total[0])}")
@@ -0,0 +1,154 @@
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.transaction import atomic
+from django.utils import timezone
+
+from core.cache import bump_versions, invalidate
+from core.models import (
+    ArchivedCashFlow,
+    ArchivedPayment,
+    CashFlow,
+    Payment,
+    Transactions,
+)
+
+BATCH_SIZE = 1000
+
+PAYMENT_FIELDS = (
+    "id",
+    "payment_type",
+    "amount",
+    "due_date",
+    "status",
+    "paid_date",
+    "transaction_id",
+    "updated_at",
+)
+CASH_FLOW_FIELDS = (
+    "id",
+    "transaction_type",
+    "amount",
+    "date",
+    "transaction_id",
+    "created_at",
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Move the payments and cash flows of closed transactions that "
+        "ended before the horizon to the archive tables."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--days",
+            type=int,
+            default=None,
+            help="Archive transactions that ended more than this many days "
+            "ago, defaults to CORE_ARCHIVE_AFTER_DAYS.",
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=500,
+            help="Transactions moved and committed at a time.",
+        )
+
+    def handle(self, **options):
+        days = options["days"]
+        if days is None:
+            days = settings.CORE_ARCHIVE_AFTER_DAYS
+        if days < 0:
+            raise CommandError("--days can't be negative")
+        if options["chunk_size"] < 1:
+            raise CommandError("--chunk-size must be at least 1")
+
+        before = timezone.localdate() - timedelta(days=days)
+        started = time.perf_counter()
+        counts = dict.fromkeys((Transactions, Payment, CashFlow), 0)
+        # Every chunk commits on its own and archived transactions drop out
+        # of archivable(), an interrupted run picks up where it stopped.
+        while True:
+            with atomic():
+                rows = list(
+                    Transactions.archivable(before)
+                    .select_for_update()
+                    .order_by("pk")
+                    .values_list("pk", "user_id")[: options["chunk_size"]]
+                )
+                if not rows:
+                    break
+                pks = [row[0] for row in rows]
+                payments, cash_flows = self.move(pks)
+
+            invalidate("payment", *payments)
+            bump_versions(*{row[1] for row in rows})
+            counts[Transactions] += len(pks)
+            counts[Payment] += len(payments)
+            counts[CashFlow] += cash_flows
+            self.stdout.write(f">>>>> {counts[Transactions]} transactions")
+
+        self.stdout.write(
+            f">>> Archived {counts[Payment]} payments and {counts[CashFlow]} "
+            f"cash flows of {counts[Transactions]} transactions that ended "
+            f"before {before} in {time.perf_counter() - started:.2f}s"
+        )
+
+    def move(self, pks):
+        """Copies the rows of transactions ``pks`` to the archive and
+        deletes them, returning the payment ids and the cash flow count."""
+        archived_at = timezone.now()
+        Transactions.objects.filter(pk__in=pks).update(
+            archived_at=archived_at
+        )
+
+        payments = Payment.objects.filter(transaction__in=pks)
+        rows = list(payments.values_list(*PAYMENT_FIELDS))
+        ArchivedPayment.objects.bulk_create(
+            [
+                ArchivedPayment(
+                    **dict(zip(PAYMENT_FIELDS, row)), archived_at=archived_at
+                )
+                for row in rows
+            ],
+            batch_size=BATCH_SIZE,
+        )
+
+        cash_flows = CashFlow.objects.filter(transaction__in=pks)
+        cash_flow_rows = list(cash_flows.values_list(*CASH_FLOW_FIELDS))
+        ArchivedCashFlow.objects.bulk_create(
+            [
+                ArchivedCashFlow(
+                    **dict(zip(CASH_FLOW_FIELDS, row)),
+                    archived_at=archived_at,
+                )
+                for row in cash_flow_rows
+            ],
+            batch_size=BATCH_SIZE,
+        )
+
+        payment_ids = [row[0] for row in rows]
+        self.delete(Payment, payment_ids)
+        self.delete(CashFlow, [row[0] for row in cash_flow_rows])
+        return payment_ids, len(cash_flow_rows)
+
+    def delete(self, model, ids):
+        """Plain DELETEs of the moved rows, skipping the signals and the
+        collector. The Payment receivers would recount counters and drop
+        cache entries row by row, and the CashFlow ones would take the
+        rows out of the cash position, which archived cash flows are
+        still part of. Nothing references either table."""
+        table = connection.ops.quote_name(model._meta.db_table)
+        with connection.cursor() as cursor:
+            for start in range(0, len(ids), BATCH_SIZE):
+                chunk = ids[start : start + BATCH_SIZE]
+                placeholders = ", ".join(["%s"] * len(chunk))
+                cursor.execute(
+                    f"DELETE FROM {table} WHERE id IN ({placeholders})",
+                    chunk,
+                )
@@ -0,0 +1,73 @@
+from bisect import bisect_right
+from operator import itemgetter
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.models import CashBalance, CashCheckpoint, CashFlow
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuild the materialized cash balance and daily checkpoints from "
+        "the CashFlow ledger and verify they agree."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--check",
+            action="store_true",
+            help="Only verify the balance, fail if it drifted.",
+        )
+
+    def handle(self, **options):
+        problems = self.verify()
+        if not problems:
+            self.stdout.write(">>> Cash balance and checkpoints are in sync")
+            return
+
+        for problem in problems:
+            self.stderr.write(f">>>>> {problem}")
+
+        if options["check"]:
+            raise CommandError(
+                f"Cash position drifted from the ledger ({len(problems)} "
+                "problems)"
+            )
+
+        self.stdout.write(">>> Rebuilding cash balance and checkpoints ....")
+        CashBalance.rebuild()
+        CashCheckpoint.rebuild()
+        if self.verify():
+            raise CommandError("Cash position still differs after rebuild")
+
+        self.stdout.write(">>> Cash position rebuilt and verified")
+
+    def verify(self):
+        problems = []
+
+        ledger = CashFlow.aggregate_cash()
+        stored = (
+            CashBalance.objects.filter(pk=CashBalance.SINGLETON_ID)
+            .values_list("amount", flat=True)
+            .first()
+        )
+        self.stdout.write(f">>> Ledger total : {ledger}")
+        self.stdout.write(f">>> Stored balance : {stored}")
+        if stored != ledger:
+            problems.append(f"Balance is {stored}, ledger says {ledger}")
+
+        expected = [
+            (checkpoint.date, checkpoint.balance)
+            for checkpoint in CashCheckpoint.from_ledger()
+        ]
+        stored = dict(CashCheckpoint.objects.values_list("date", "balance"))
+        for date in sorted({date for date, _ in expected} | stored.keys()):
+            position = bisect_right(expected, date, key=itemgetter(0))
+            balance = expected[position - 1][1] if position else 0
+            if stored.get(date) != balance:
+                problems.append(
+                    f"Checkpoint {date} is {stored.get(date)}, "
+                    f"ledger says {balance}"
+                )
+
+        return problems
@@ -1,13 +1,81 @@
-from django.core.management.base import BaseCommand
+import time
+
+import numpy as np
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
 from django.contrib.auth.hashers import make_password
 from django.contrib.auth.models import Group, Permission
+from django.db.transaction import atomic
+from django.utils import timezone
+
+from core.amortization import amortize, from_cents
+from core.cache import bump_versions
+from core.models import (
+    User,
+    Application,
+    CashBalance,
+    CashCheckpoint,
+    CashFlow,
+    Payment,
+    Transactions,
+)
 
-from core.models import User, Application
+BATCH_SIZE = 1000
+
+# Share of generated users / applications / past installments.
+PROVIDER_SHARE = 0.2
+STATUS_SHARES = {"approved": 0.6, "rejected": 0.15, "pending": 0.25}
+FAILED_SHARE = 0.05
 
 
 class Command(BaseCommand):
+    help = (
+        "Create the user groups and demo users, optionally followed by "
+        "synthetic users, applications, payment schedules and cash flows."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--users",
+            type=int,
+            default=0,
+            help="Synthetic borrowers and providers to add.",
+        )
+        parser.add_argument(
+            "--applications",
+            type=int,
+            default=0,
+            help="Synthetic applications to spread over all borrowers and "
+            "providers; approved ones get a schedule and cash flows.",
+        )
+        parser.add_argument(
+            "--months",
+            type=int,
+            default=36,
+            help="Longest loan term; approvals start up to this long ago.",
+        )
+        parser.add_argument("--seed", type=int, default=None)
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=10000,
+            help="Applications generated and committed at a time.",
+        )
+
     def handle(self, **options):
-                
+        if options["months"] < 1:
+            raise CommandError("--months must be at least 1")
+        if options["chunk_size"] < 1:
+            raise CommandError("--chunk-size must be at least 1")
+
+        # One hash for every generated account, hashing per row would
+        # dominate the run.
+        self.password = make_password("@dmin123")
+        self.rng = np.random.default_rng(options["seed"])
+        self.created = dict.fromkeys(
+            (User, Application, Transactions, Payment, CashFlow), 0
+        )
+
         groups = {
             "Provider": [
                 "add_application",
@@ -24,14 +92,16 @@ class Command(BaseCommand):
                 "view_application",
                 "change_payment",
                 "view_payment",
+                # Picking the applicant in the admin's autocomplete.
+                "view_user",
             ],
         }
         for group_name, perms in groups.items():
             group, _ = Group.objects.get_or_create(name=group_name)
-            if _ : 
+            if _ :
                 self.stdout.write(f">>> Creating group {group_name}")
 
-            for perm in perms: 
+            for perm in perms:
                 try:
                     group.permissions.add(Permission.objects.get(codename=perm))
                     self.stdout.write(f">>>>> Adding Permission : {perm}")
@@ -43,78 +113,309 @@ class Command(BaseCommand):
             [
                 "admin",
                 "admin@admin.com",
-                "@dmin123",
                 True,
                 "Bank Personnel",
             ],
             [
                 "borrower_1",
                 "customer_1@admin.com",
-                "@dmin123",
                 True,
                 "Borrower",
             ],
             [
                 "borrower_2",
                 "customer_2@admin.com",
-                "@dmin123",
                 True,
                 "Borrower",
             ],
             [
                 "borrower_3",
                 "customer_3@admin.com",
-                "@dmin123",
                 True,
                 "Borrower",
             ],
             [
                 "provider_1",
                 "provider_1@admin.com",
-                "@dmin123",
                 True,
                 "Provider",
             ],
             [
                 "provider_2",
                 "provider_2@admin.com",
-                "@dmin123",
                 True,
                 "Provider",
             ],
             [
                 "provider_3",
                 "provider_3@admin.com",
-                "@dmin123",
                 True,
                 "Provider",
             ],
         ]
+        existing = set(
+            User.objects.filter(
+                username__in=[user[0] for user in user_list]
+            ).values_list("username", flat=True)
+        )
+        user_list = [user for user in user_list if user[0] not in existing]
 
         users = [
             User(
                 username=user[0],
                 email=user[1],
-                password=make_password(user[2]),
+                password=self.password,
                 is_active=True,
                 is_superuser= True if user[0] == "admin" else False,
-                is_staff=user[3],
+                is_staff=user[2],
             )
             for user in user_list
         ]
-        User.objects.bulk_create(users)
-
-        pro = Group.objects.get(name="Provider")
-        bor = Group.objects.get(name="Borrower")
-        ban = Group.objects.get(name="Bank Personnel")
-
-        for user, item in zip(users, user_list):
-            if "Borrower" in item[-1]:
-                bor.user_set.add(user)
-            elif "Provider" in item[-1]:
-                pro.user_set.add(user)
-            elif "Bank" in item[-1]:
-                ban.user_set.add(user)
+        self.add_users(users, [user[-1] for user in user_list])
+
+        started = time.perf_counter()
+        self.generate_users(options["users"])
+        self.generate_applications(
+            options["applications"], options["months"], options["chunk_size"]
+        )
+        elapsed = time.perf_counter() - started
+
+        self.stdout.write(">>> Rebuilding cash balance and checkpoints ....")
+        CashBalance.rebuild()
+        CashCheckpoint.rebuild()
+        self.report(elapsed)
         self.stdout.write(
             "============= Finished Database Filling ============="
         )
+
+    def add_users(self, users, roles):
+        User.objects.bulk_create(users, batch_size=BATCH_SIZE)
+        groups = dict(Group.objects.values_list("name", "pk"))
+        User.groups.through.objects.bulk_create(
+            [
+                User.groups.through(user_id=user.pk, group_id=groups[role])
+                for user, role in zip(users, roles)
+            ],
+            batch_size=BATCH_SIZE,
+        )
+        self.created[User] += len(users)
+
+    def generate_users(self, count):
+        if count < 1:
+            return
+
+        self.stdout.write(f">>> Generating {count} users ....")
+        first = User.objects.count()
+        roles = np.where(
+            self.rng.random(count) < PROVIDER_SHARE, "Provider", "Borrower"
+        )
+        for start in range(0, count, BATCH_SIZE):
+            numbers = range(
+                first + start, first + min(count, start + BATCH_SIZE)
+            )
+            with atomic():
+                self.add_users(
+                    [
+                        User(
+                            username=f"user_{number}",
+                            email=f"user_{number}@example.com",
+                            password=self.password,
+                        )
+                        for number in numbers
+                    ],
+                    roles[start : start + len(numbers)],
+                )
+
+    def generate_applications(self, count, months, chunk_size):
+        if count < 1:
+            return
+
+        owners = np.array(
+            User.objects.filter(
+                groups__name__in=("Borrower", "Provider")
+            ).values_list("pk", "groups__name"),
+            dtype=object,
+        )
+        if not len(owners):
+            raise CommandError("No borrowers or providers to apply for")
+
+        self.stdout.write(f">>> Generating {count} applications ....")
+        self.first_day = None
+        self.outflow = 0
+        for start in range(0, count, chunk_size):
+            size = min(chunk_size, count - start)
+            with atomic():
+                self.generate_chunk(owners, size, months)
+            self.stdout.write(f">>>>> {start + size} / {count}")
+
+        if self.outflow:
+            # Opening capital, so cash never goes negative on any day.
+            CashFlow.objects.create(
+                transaction_type="deposit_received",
+                amount=from_cents(self.outflow),
+                date=self.first_day,
+            )
+            self.created[CashFlow] += 1
+        bump_versions(*owners[:, 0].tolist())
+
+    def generate_chunk(self, owners, size, months):
+        rng = self.rng
+        today = np.datetime64(timezone.localdate(), "D")
+
+        owner = owners[rng.integers(len(owners), size=size)]
+        kind = np.where(owner[:, 1] == "Provider", "deposit", "loan")
+        status = rng.choice(
+            list(STATUS_SHARES), size=size, p=list(STATUS_SHARES.values())
+        )
+        # Cents: 1,000.00 to 100,000.00 in steps of 100.00, and 5 to 20 %.
+        amount = rng.integers(10, 1001, size=size) * 10000
+        rate = rng.integers(500, 2001, size=size)
+        duration = rng.integers(1, months + 1, size=size)
+
+        applications = [
+            Application(
+                user_id=owner[index, 0],
+                application_type=kind[index],
+                amount=from_cents(amount[index]),
+                duration_months=duration[index],
+                interest_rate=(
+                    from_cents(rate[index])
+                    if status[index] != "pending"
+                    else None
+                ),
+                status=status[index],
+                schedule_status=(
+                    "ready" if status[index] == "approved" else None
+                ),
+            )
+            for index in range(size)
+        ]
+        Application.objects.bulk_create(applications, batch_size=BATCH_SIZE)
+        self.created[Application] += size
+
+        approved = np.flatnonzero(status == "approved")
+        if not len(approved):
+            return
+
+        start = today - rng.integers(0, months * 30 + 1, size=len(approved))
+        schedule = amortize(
+            amount[approved] / 100,
+            rate[approved] / 100,
+            duration[approved],
+            start,
+            mode=settings.LOAN_AMORTIZATION_MODE,
+        )
+        past = schedule.due_date < today
+        paid = past & (rng.random(len(past)) >= FAILED_SHARE)
+        counts = {
+            name: np.bincount(schedule.loan[rows], minlength=len(approved))
+            for name, rows in (
+                ("paid", paid),
+                ("failed", past & ~paid),
+                ("scheduled", ~past),
+            )
+        }
+        paid_cents = np.bincount(
+            schedule.loan[paid],
+            weights=schedule.amount[paid],
+            minlength=len(approved),
+        ).astype(np.int64)
+        # Installments are in due date order per loan, the first one not
+        # yet due is the next.
+        upcoming = np.flatnonzero(~past)
+        loans, first = np.unique(schedule.loan[upcoming], return_index=True)
+        next_due = dict(
+            zip(
+                loans.tolist(),
+                schedule.due_date[upcoming[first]].astype(object),
+            )
+        )
+
+        transactions = [
+            Transactions(
+                user_id=owner[index, 0],
+                application=applications[index],
+                start_date=start[loan].astype(object),
+                end_date=schedule.end_date(loan),
+                monthly_payment=from_cents(schedule.installment[loan]),
+                total_amount=from_cents(schedule.total[loan]),
+                is_active=bool(paid_cents[loan] < schedule.total[loan]),
+                paid_amount=from_cents(paid_cents[loan]),
+                remaining_amount=from_cents(
+                    schedule.total[loan] - paid_cents[loan]
+                ),
+                paid_count=counts["paid"][loan],
+                failed_count=counts["failed"][loan],
+                scheduled_count=counts["scheduled"][loan],
+                next_due_date=next_due.get(loan),
+            )
+            for loan, index in enumerate(approved)
+        ]
+        Transactions.objects.bulk_create(transactions, batch_size=BATCH_SIZE)
+        self.created[Transactions] += len(transactions)
+
+        due_dates = schedule.due_date.astype(object)
+        amounts = list(map(from_cents, schedule.amount.tolist()))
+        payment_kind = kind[approved][schedule.loan]
+        payments = [
+            Payment(
+                payment_type=payment_kind[row],
+                amount=amounts[row],
+                due_date=due_dates[row],
+                status=(
+                    "paid"
+                    if paid[row]
+                    else "failed" if past[row] else "scheduled"
+                ),
+                paid_date=due_dates[row] if paid[row] else None,
+                transaction=transactions[schedule.loan[row]],
+            )
+            for row in range(len(amounts))
+        ]
+        Payment.objects.bulk_create(payments, batch_size=BATCH_SIZE)
+        self.created[Payment] += len(payments)
+
+        is_deposit = kind[approved] == "deposit"
+        cash_flows = [
+            CashFlow(
+                transaction_type=(
+                    "deposit_received" if is_deposit[loan] else "loan_issued"
+                ),
+                amount=applications[index].amount,
+                date=transactions[loan].start_date,
+                transaction=transactions[loan],
+            )
+            for loan, index in enumerate(approved)
+        ] + [
+            CashFlow(
+                transaction_type=(
+                    "deposit_payment"
+                    if is_deposit[schedule.loan[row]]
+                    else "loan_payment"
+                ),
+                amount=amounts[row],
+                date=due_dates[row],
+                transaction=transactions[schedule.loan[row]],
+            )
+            for row in np.flatnonzero(paid)
+        ]
+        CashFlow.objects.bulk_create(cash_flows, batch_size=BATCH_SIZE)
+        self.created[CashFlow] += len(cash_flows)
+
+        self.outflow += int(amount[approved][~is_deposit].sum()) + int(
+            schedule.amount[paid & is_deposit[schedule.loan]].sum()
+        )
+        first_day = start.min().astype(object)
+        if self.first_day is None or first_day < self.first_day:
+            self.first_day = first_day
+
+    def report(self, elapsed):
+        total = sum(self.created.values())
+        for model, count in self.created.items():
+            self.stdout.write(
+                f">>> {model.__name__} : {count}"
+            )
+        self.stdout.write(
+            f">>> {total} rows in {elapsed:.2f}s "
+            f"({total / max(elapsed, 1e-9):,.0f} rows/s)"
+        )
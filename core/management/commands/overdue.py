@@ -0,0 +1,82 @@
+import time
+from datetime import date
+
+from django.core.management.base import BaseCommand
+from django.db.transaction import atomic
+from django.utils import timezone
+
+from core.cache import bump_versions, invalidate
+from core.models import Payment, Transactions
+
+
+class Command(BaseCommand):
+    help = (
+        "Mark scheduled payments past their due date as overdue and "
+        "refresh the counters of their transactions."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--as-of",
+            type=date.fromisoformat,
+            default=None,
+            help="Payments due before this day (YYYY-MM-DD) are overdue, "
+            "defaults to today.",
+        )
+        parser.add_argument("--chunk-size", type=int, default=10000)
+
+    def handle(self, **options):
+        as_of = options["as_of"] or timezone.localdate()
+        chunk_size = options["chunk_size"]
+        started = time.perf_counter()
+
+        marked = 0
+        while True:
+            # The partial index on scheduled payments keeps every round as
+            # cheap as the first, rows flipped earlier drop out of it.
+            with atomic():
+                rows = list(
+                    Payment.objects.filter(
+                        status="scheduled", due_date__lt=as_of
+                    )
+                    .order_by("due_date", "id")
+                    .values_list("id", "transaction", "transaction__user")[
+                        :chunk_size
+                    ]
+                )
+                if not rows:
+                    break
+
+                ids = [row[0] for row in rows]
+                # Re-checked in the UPDATE, a concurrent run may have
+                # flipped some of them since.
+                marked += Payment.objects.filter(
+                    pk__in=ids, status="scheduled"
+                ).update(status="overdue", updated_at=timezone.now())
+                Transactions.refresh_counters(
+                    {row[1] for row in rows if row[1] is not None}
+                )
+
+            invalidate("payment", *ids)
+            bump_versions(*{row[2] for row in rows if row[2] is not None})
+
+        # Overdue payments settled since the last run.
+        refreshed = 0
+        stale = Transactions.objects.filter(overdue_count__gt=0).order_by("pk")
+        last = 0
+        while True:
+            pks = list(
+                stale.filter(pk__gt=last).values_list("pk", flat=True)[
+                    :chunk_size
+                ]
+            )
+            if not pks:
+                break
+            refreshed += Transactions.refresh_counters(pks)
+            last = pks[-1]
+
+        self.stdout.write(
+            f">>> Marked {marked} payments due before {as_of} overdue, "
+            f"refreshed {refreshed} delinquent transactions in "
+            f"{time.perf_counter() - started:.2f}s"
+        )
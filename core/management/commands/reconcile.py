@@ -0,0 +1,86 @@
+import csv
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.reconciliation import CSV, FIXED, FORMATS, PARSERS, StatementImport
+
+
+class Command(BaseCommand):
+    help = (
+        "Mark the payments settled by a bank statement as paid and record "
+        "their cash flows. Unmatched lines are reported as CSV."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("statement", help="Statement file, - for stdin.")
+        parser.add_argument(
+            "--format",
+            choices=FORMATS,
+            default=None,
+            help="Defaults to csv for .csv files, fixed otherwise.",
+        )
+        parser.add_argument(
+            "--window-days",
+            type=int,
+            default=15,
+            help="How far the booking date may be from the due date.",
+        )
+        parser.add_argument("--chunk-size", type=int, default=5000)
+        parser.add_argument(
+            "--report",
+            default=None,
+            help="Where to write unmatched lines, defaults to stderr.",
+        )
+
+    def handle(self, **options):
+        path = options["statement"]
+        statement_format = options["format"] or (
+            CSV if path.lower().endswith(".csv") else FIXED
+        )
+        importer = StatementImport(
+            window_days=options["window_days"],
+            chunk_size=options["chunk_size"],
+        )
+        started = time.perf_counter()
+
+        try:
+            statement = (
+                sys.stdin
+                if path == "-"
+                else open(path, encoding="utf-8", newline="")
+            )
+        except OSError as error:
+            raise CommandError(error)
+        try:
+            report = (
+                open(options["report"], "w", newline="")
+                if options["report"]
+                else self.stderr
+            )
+        except OSError as error:
+            if statement is not sys.stdin:
+                statement.close()
+            raise CommandError(error)
+        unmatched = 0
+        try:
+            writer = csv.writer(report)
+            writer.writerow(["line", "reason", "content"])
+            lines = PARSERS[statement_format](statement)
+            for row in importer.run(lines):
+                writer.writerow(row)
+                unmatched += 1
+        except ValueError as error:
+            raise CommandError(error)
+        finally:
+            if statement is not sys.stdin:
+                statement.close()
+            if options["report"]:
+                report.close()
+
+        self.stdout.write(
+            f">>> {importer.lines} lines, {importer.matched} payments "
+            f"({importer.total}) marked paid, {unmatched} unmatched in "
+            f"{time.perf_counter() - started:.2f}s"
+        )
@@ -0,0 +1,98 @@
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.models import CENTS, Transactions
+
+COUNTERS = [
+    "paid_amount",
+    "remaining_amount",
+    "paid_count",
+    "failed_count",
+    "scheduled_count",
+    "overdue_count",
+    "overdue_since",
+    "next_due_date",
+    "is_active",
+]
+
+
+def expected_value(value):
+    # SQLite computes decimal expressions as floats and only columns are
+    # read back rounded to their decimal places.
+    if isinstance(value, Decimal):
+        return value.quantize(CENTS)
+    return value
+
+
+class Command(BaseCommand):
+    help = (
+        "Check the counters of every transaction against its payment rows "
+        "and recount the ones that drifted."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--check",
+            action="store_true",
+            help="Only verify the counters, fail if any drifted.",
+        )
+        parser.add_argument("--chunk-size", type=int, default=10000)
+
+    def handle(self, **options):
+        drifted = []
+        checked = 0
+        for count, pks in self.drifted(options["chunk_size"]):
+            checked += count
+            drifted += pks
+
+        self.stdout.write(
+            f">>> Checked {checked} transactions, {len(drifted)} drifted"
+        )
+        if not drifted:
+            return
+
+        for pk in drifted[:20]:
+            self.stderr.write(f">>>>> Transaction {pk}")
+        if options["check"]:
+            raise CommandError(
+                f"Counters of {len(drifted)} transactions drifted from "
+                "their payments"
+            )
+
+        for start in range(0, len(drifted), options["chunk_size"]):
+            Transactions.refresh_counters(
+                drifted[start : start + options["chunk_size"]]
+            )
+        self.stdout.write(f">>> Recounted {len(drifted)} transactions")
+
+    def drifted(self, chunk_size):
+        """Yields (checked, drifted pks) per chunk of transactions, with
+        the stored and the recounted values read side by side."""
+        expected = {
+            f"expected_{name}": expression
+            for name, expression in Transactions.counters().items()
+        }
+        last = 0
+        while True:
+            rows = list(
+                # Archived transactions have no payment rows left to count.
+                Transactions.objects.filter(
+                    pk__gt=last, archived_at__isnull=True
+                )
+                .order_by("pk")
+                .annotate(**expected)
+                .values("pk", *COUNTERS, *expected)[:chunk_size]
+            )
+            if not rows:
+                return
+
+            yield len(rows), [
+                row["pk"]
+                for row in rows
+                if any(
+                    row[name] != expected_value(row[f"expected_{name}"])
+                    for name in COUNTERS
+                )
+            ]
+            last = rows[-1]["pk"]
@@ -0,0 +1,47 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.jobs import run_pending
+
+
+class Command(BaseCommand):
+    help = "Run queued background jobs, see core/jobs.py."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Exit once no job is due instead of waiting for more.",
+        )
+        parser.add_argument(
+            "--batch",
+            type=int,
+            default=100,
+            help="Jobs claimed at a time.",
+        )
+        parser.add_argument(
+            "--sleep",
+            type=float,
+            default=1.0,
+            help="Seconds to wait when no job is due.",
+        )
+
+    def handle(self, **options):
+        self.stdout.write(">>> Worker started")
+        try:
+            while True:
+                succeeded, failed = run_pending(options["batch"])
+                if succeeded or failed:
+                    self.stdout.write(
+                        f">>>>> Ran {succeeded + failed} jobs, "
+                        f"{failed} failed"
+                    )
+                    continue
+
+                if options["once"]:
+                    break
+                time.sleep(options["sleep"])
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write(">>> Worker stopped")
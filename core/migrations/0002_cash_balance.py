@@ -0,0 +1,67 @@
+# Generated by Django 5.1.6 on 2026-10-18 12:37
+
+from django.db import migrations, models
+from django.db.models import Sum
+
+
+def seed_cash_balance(apps, schema_editor):
+    CashFlow = apps.get_model("core", "CashFlow")
+    CashBalance = apps.get_model("core", "CashBalance")
+
+    totals = dict(
+        CashFlow.objects.values("transaction_type")
+        .annotate(total=Sum("amount"))
+        .values_list("transaction_type", "total")
+    )
+    amount = (
+        totals.get("deposit_received", 0)
+        + totals.get("loan_payment", 0)
+        - totals.get("loan_issued", 0)
+        - totals.get("deposit_payment", 0)
+    )
+    CashBalance.objects.create(pk=1, amount=amount)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="CashBalance",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "amount",
+                    models.DecimalField(
+                        decimal_places=2, default=0, max_digits=17
+                    ),
+                ),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AlterField(
+            model_name="application",
+            name="status",
+            field=models.CharField(
+                choices=[
+                    ("pending", "Pending"),
+                    ("approved", "Approved by Bank"),
+                    ("rejected", "Rejected by Bank"),
+                ],
+                default="pending",
+                max_length=20,
+            ),
+        ),
+        migrations.RunPython(seed_cash_balance, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,70 @@
+# Generated by Django 5.1.6 on 2026-10-18 12:38
+
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models import Case, F, Sum, When
+
+
+def seed_cash_checkpoints(apps, schema_editor):
+    CashFlow = apps.get_model("core", "CashFlow")
+    CashCheckpoint = apps.get_model("core", "CashCheckpoint")
+
+    daily = (
+        CashFlow.objects.values("date")
+        .annotate(
+            total=Sum(
+                Case(
+                    When(
+                        transaction_type__in=(
+                            "deposit_received",
+                            "loan_payment",
+                        ),
+                        then=F("amount"),
+                    ),
+                    default=-F("amount"),
+                    output_field=models.DecimalField(
+                        max_digits=17, decimal_places=2
+                    ),
+                )
+            )
+        )
+        .order_by("date")
+        .values_list("date", "total")
+    )
+    balance = Decimal(0)
+    checkpoints = []
+    for date, total in daily:
+        balance += total
+        checkpoints.append(CashCheckpoint(date=date, balance=balance))
+    CashCheckpoint.objects.bulk_create(checkpoints, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0002_cash_balance"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="CashCheckpoint",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("date", models.DateField(unique=True)),
+                (
+                    "balance",
+                    models.DecimalField(decimal_places=2, max_digits=17),
+                ),
+            ],
+        ),
+        migrations.RunPython(seed_cash_checkpoints, migrations.RunPython.noop),
+    ]
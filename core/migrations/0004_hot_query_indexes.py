@@ -0,0 +1,65 @@
+# Generated by Django 5.1.6 on 2026-10-18 12:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0003_cash_checkpoints"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="application",
+            index=models.Index(
+                fields=["user", "status", "created_at"],
+                name="application_user_status_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="application",
+            index=models.Index(
+                fields=["user", "created_at", "id"],
+                name="application_user_created_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="application",
+            index=models.Index(
+                fields=["created_at", "id"], name="application_created_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="cashflow",
+            index=models.Index(
+                fields=["transaction_type", "date"],
+                name="cashflow_type_date_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="cashflow",
+            index=models.Index(fields=["date"], name="cashflow_date_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="payment",
+            index=models.Index(
+                fields=["transaction", "status", "payment_type"],
+                name="payment_trx_status_type_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="payment",
+            index=models.Index(
+                fields=["due_date", "id"], name="payment_due_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="payment",
+            index=models.Index(
+                condition=models.Q(("status", "scheduled")),
+                fields=["due_date"],
+                name="payment_scheduled_due_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.1.6 on 2026-10-18 12:55
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0004_hot_query_indexes"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="cashflow",
+            name="date",
+            field=models.DateField(
+                default=django.utils.timezone.localdate, editable=False
+            ),
+        ),
+    ]
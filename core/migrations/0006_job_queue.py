@@ -0,0 +1,85 @@
+# Generated by Django 5.1.6 on 2026-10-18 13:00
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def mark_existing_schedules_ready(apps, schema_editor):
+    Application = apps.get_model("core", "Application")
+    Application.objects.filter(
+        status="approved", transactions__isnull=False
+    ).update(schedule_status="ready")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0005_cashflow_date_default"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="application",
+            name="schedule_status",
+            field=models.CharField(
+                blank=True,
+                choices=[
+                    ("pending", "Schedule pending"),
+                    ("ready", "Schedule ready"),
+                ],
+                editable=False,
+                max_length=20,
+                null=True,
+            ),
+        ),
+        migrations.CreateModel(
+            name="Job",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("name", models.CharField(max_length=100)),
+                ("payload", models.JSONField(default=dict)),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("queued", "Queued"),
+                            ("running", "Running"),
+                            ("done", "Done"),
+                            ("failed", "Failed"),
+                        ],
+                        default="queued",
+                        max_length=20,
+                    ),
+                ),
+                ("attempts", models.PositiveIntegerField(default=0)),
+                ("max_attempts", models.PositiveIntegerField(default=5)),
+                (
+                    "run_after",
+                    models.DateTimeField(default=django.utils.timezone.now),
+                ),
+                ("locked_until", models.DateTimeField(blank=True, null=True)),
+                ("last_error", models.TextField(blank=True)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["status", "run_after"],
+                        name="job_status_run_after_idx",
+                    )
+                ],
+            },
+        ),
+        migrations.RunPython(
+            mark_existing_schedules_ready, migrations.RunPython.noop
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.1.6 on 2026-10-18 13:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0006_job_queue"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="transactions",
+            name="overdue_count",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="transactions",
+            name="overdue_since",
+            field=models.DateField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name="payment",
+            name="status",
+            field=models.CharField(
+                choices=[
+                    ("scheduled", "Scheduled"),
+                    ("overdue", "Overdue"),
+                    ("paid", "Paid"),
+                    ("failed", "Failed"),
+                ],
+                default="scheduled",
+                max_length=20,
+            ),
+        ),
+    ]
@@ -0,0 +1,111 @@
+# Generated by Django 5.1.6 on 2026-10-18 13:37
+
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models import (
+    Case,
+    Count,
+    ExpressionWrapper,
+    F,
+    OuterRef,
+    Subquery,
+    Sum,
+    When,
+)
+from django.db.models.functions import Coalesce, Round
+
+
+def count_existing_payments(apps, schema_editor):
+    # Same counters as Transactions.counters(), spelled out so later model
+    # changes do not alter this migration.
+    Payment = apps.get_model("core", "Payment")
+    Transactions = apps.get_model("core", "Transactions")
+    payments = (
+        Payment.objects.filter(transaction=OuterRef("pk"))
+        .order_by()
+        .values("transaction")
+    )
+
+    def count(status):
+        return Coalesce(
+            Subquery(
+                payments.filter(status=status)
+                .annotate(count=Count("pk"))
+                .values("count")
+            ),
+            0,
+        )
+
+    paid = Coalesce(
+        Subquery(
+            payments.filter(status="paid")
+            # SQLite sums as floats, keep it comparable to the total.
+            .annotate(total=Round(Sum("amount"), 2)).values("total")
+        ),
+        Decimal(0),
+        output_field=models.DecimalField(max_digits=15, decimal_places=2),
+    )
+    Transactions.objects.update(
+        paid_amount=paid,
+        remaining_amount=ExpressionWrapper(
+            F("total_amount") - paid,
+            output_field=models.DecimalField(max_digits=15, decimal_places=2),
+        ),
+        paid_count=count("paid"),
+        failed_count=count("failed"),
+        scheduled_count=count("scheduled"),
+        next_due_date=Subquery(
+            payments.filter(status__in=("scheduled", "overdue"))
+            .order_by("due_date")
+            .values("due_date")[:1]
+        ),
+        is_active=Case(When(total_amount__lte=paid, then=False), default=True),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0007_overdue_payments"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="transactions",
+            name="failed_count",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="transactions",
+            name="next_due_date",
+            field=models.DateField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="transactions",
+            name="paid_amount",
+            field=models.DecimalField(
+                decimal_places=2, default=0, max_digits=15
+            ),
+        ),
+        migrations.AddField(
+            model_name="transactions",
+            name="paid_count",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="transactions",
+            name="remaining_amount",
+            field=models.DecimalField(
+                decimal_places=2, default=0, max_digits=15
+            ),
+        ),
+        migrations.AddField(
+            model_name="transactions",
+            name="scheduled_count",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(
+            count_existing_payments, migrations.RunPython.noop
+        ),
+    ]
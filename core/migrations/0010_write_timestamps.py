@@ -0,0 +1,62 @@
+# Generated by Django 5.1.6 on 2026-10-18 14:23
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0009_archive"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="archivedcashflow",
+            name="created_at",
+            field=models.DateTimeField(default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name="archivedpayment",
+            name="updated_at",
+            field=models.DateTimeField(default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name="cashflow",
+            name="created_at",
+            field=models.DateTimeField(
+                default=django.utils.timezone.now, editable=False
+            ),
+        ),
+        migrations.AddField(
+            model_name="payment",
+            name="updated_at",
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddIndex(
+            model_name="archivedcashflow",
+            index=models.Index(
+                fields=["created_at"], name="archived_cashflow_created_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="archivedpayment",
+            index=models.Index(
+                fields=["updated_at"], name="archived_payment_updated_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="cashflow",
+            index=models.Index(
+                fields=["created_at"], name="cashflow_created_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="payment",
+            index=models.Index(
+                fields=["updated_at"], name="payment_updated_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.1.6 on 2026-10-18 14:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0010_write_timestamps"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="application",
+            name="schedule_status",
+            field=models.CharField(
+                blank=True,
+                choices=[
+                    ("pending", "Schedule pending"),
+                    ("ready", "Schedule ready"),
+                    ("failed", "Schedule failed"),
+                ],
+                editable=False,
+                max_length=20,
+                null=True,
+            ),
+        ),
+    ]
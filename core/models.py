@@ -1,15 +1,108 @@
+from bisect import bisect_left
+from functools import cached_property
+
 from django.contrib.auth.models import AbstractUser
 from django.core.exceptions import ValidationError
+from datetime import timedelta
+from decimal import Decimal
+
 from django.db import models
-from django.db.models import Sum
+from django.db.models import (
+    Case,
+    Count,
+    ExpressionWrapper,
+    F,
+    OuterRef,
+    Subquery,
+    Sum,
+    When,
+)
+from django.db.models.functions import Coalesce, Round
+from django.db.transaction import atomic
+from django.utils import timezone
 
 from .utils import PERCENTAGE_VALIDATOR
 
 # Create your models here.
 
 
-class User(AbstractUser):
-    pass
+class RoleChecks:
+    """Role shortcuts over a ``roles`` set of group names, shared by
+    ``User`` and the stateless token users of ``authentication.py``."""
+
+    BORROWER = "Borrower"
+    PROVIDER = "Provider"
+    BANK_PERSONNEL = "Bank Personnel"
+
+    @property
+    def is_borrower(self):
+        return self.BORROWER in self.roles
+
+    @property
+    def is_provider(self):
+        return self.PROVIDER in self.roles
+
+    @property
+    def is_bank_personnel(self):
+        return self.BANK_PERSONNEL in self.roles
+
+
+class User(RoleChecks, AbstractUser):
+    @cached_property
+    def roles(self):
+        """Names of the user's groups, loaded once per instance, using a
+        ``prefetch_related("groups")`` when there is one."""
+        if self.pk is None:
+            return frozenset()
+        return frozenset(group.name for group in self.groups.all())
+
+
+class OwnedQuerySet(models.QuerySet):
+    """Rows a user may see: everything for superusers, otherwise only
+    what belongs to them through ``owner_field``."""
+
+    owner_field = "user"
+
+    def for_user(self, user):
+        if user.is_superuser:
+            return self
+        return self.filter(**{self.owner_field: user.pk})
+
+
+class TransactionOwnedQuerySet(OwnedQuerySet):
+    owner_field = "transaction__user"
+
+
+class TransactionsQuerySet(OwnedQuerySet):
+    def summary(self):
+        """Totals of these transactions, read from their counters in one
+        query: active ones, what is left to repay on loans, overdue
+        installments, deposited principal and the interest share of the
+        deposit payments received so far."""
+        deposits = models.Q(application__application_type="deposit")
+        totals = self.aggregate(
+            active_transactions=Count("pk", filter=models.Q(is_active=True)),
+            outstanding_balance=Sum(
+                "remaining_amount",
+                filter=models.Q(
+                    is_active=True, application__application_type="loan"
+                ),
+            ),
+            overdue_count=Sum("overdue_count"),
+            total_deposited=Sum("application__amount", filter=deposits),
+            total_earned=Sum(
+                F("paid_amount")
+                * (F("total_amount") - F("application__amount"))
+                / F("total_amount"),
+                filter=deposits,
+                output_field=models.DecimalField(),
+            ),
+        )
+        for name in ("active_transactions", "overdue_count"):
+            totals[name] = totals[name] or 0
+        for name in ("outstanding_balance", "total_deposited", "total_earned"):
+            totals[name] = Decimal(totals[name] or 0).quantize(CENTS)
+        return totals
 
 
 class Application(models.Model):
@@ -24,6 +117,12 @@ class Application(models.Model):
         ("rejected", "Rejected by Bank"),
     ]
 
+    SCHEDULE_STATUS_CHOICES = [
+        ("pending", "Schedule pending"),
+        ("ready", "Schedule ready"),
+        ("failed", "Schedule failed"),
+    ]
+
     user = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
@@ -45,6 +144,15 @@ class Application(models.Model):
     status = models.CharField(
         max_length=20, choices=STATUS_CHOICES, default="pending"
     )
+    # Set on approval, "ready" once the payment schedule job has run,
+    # "failed" if it gave up.
+    schedule_status = models.CharField(
+        max_length=20,
+        choices=SCHEDULE_STATUS_CHOICES,
+        null=True,
+        blank=True,
+        editable=False,
+    )
     created_at = models.DateTimeField(auto_now_add=True)
     reviewed_at = models.DateTimeField(auto_now=True)
     reviewed_by = models.ForeignKey(
@@ -56,17 +164,35 @@ class Application(models.Model):
         related_name="reviewed_applications",
     )
 
+    objects = OwnedQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["user", "status", "created_at"],
+                name="application_user_status_idx",
+            ),
+            # Keyset pagination, per user and for superusers.
+            models.Index(
+                fields=["user", "created_at", "id"],
+                name="application_user_created_idx",
+            ),
+            models.Index(
+                fields=["created_at", "id"], name="application_created_idx"
+            ),
+        ]
+
     def __str__(self):
         return f"{self.application_type} of {self.amount} by {self.user.username}"
 
     def clean(self):
         if self.application_type == "deposit":
-            if not self.user.groups.filter(name="Provider").exists():
+            if not self.user.is_provider:
                 raise ValidationError(
                     "Only providers can submit deposits", code="invalid"
                 )
         elif self.application_type == "loan":
-            if not self.user.groups.filter(name="Borrower").exists():
+            if not self.user.is_borrower:
                 raise ValidationError(
                     "Only borrowers can submit loans", code="invalid"
                 )
@@ -87,10 +213,113 @@ class Transactions(models.Model):
     monthly_payment = models.DecimalField(max_digits=15, decimal_places=2)
     total_amount = models.DecimalField(max_digits=15, decimal_places=2)
     is_active = models.BooleanField(default=True)
+    # Recounted from the payments by refresh_counters(), on every payment
+    # change. `manage.py verify_counters` checks them against the rows.
+    paid_amount = models.DecimalField(
+        max_digits=15, decimal_places=2, default=0
+    )
+    remaining_amount = models.DecimalField(
+        max_digits=15, decimal_places=2, default=0
+    )
+    paid_count = models.PositiveIntegerField(default=0)
+    failed_count = models.PositiveIntegerField(default=0)
+    scheduled_count = models.PositiveIntegerField(default=0)
+    overdue_count = models.PositiveIntegerField(default=0)
+    overdue_since = models.DateField(null=True, blank=True)
+    next_due_date = models.DateField(null=True, blank=True)
+    # Set once `manage.py archive` moved the payments and cash flows of
+    # the closed transaction to ArchivedPayment/ArchivedCashFlow.
+    archived_at = models.DateTimeField(null=True, blank=True)
+
+    objects = TransactionsQuerySet.as_manager()
 
     def __str__(self):
         return f"Trx of {self.application}"
 
+    @staticmethod
+    def counters():
+        """The counter columns as expressions over the payment rows of
+        the outer transaction, for UPDATEs and annotations alike.
+
+        Installments add up to ``total_amount`` to the cent, so what is
+        left is the total minus what was paid, right even before a queued
+        schedule is written. A transaction stays active until then.
+        """
+        payments = (
+            Payment.objects.filter(transaction=OuterRef("pk"))
+            .order_by()
+            .values("transaction")
+        )
+
+        def count(status):
+            return Coalesce(
+                Subquery(
+                    payments.filter(status=status)
+                    .annotate(count=Count("pk"))
+                    .values("count")
+                ),
+                0,
+            )
+
+        def first_due(*statuses):
+            return Subquery(
+                payments.filter(status__in=statuses)
+                .order_by("due_date")
+                .values("due_date")[:1]
+            )
+
+        paid = Coalesce(
+            Subquery(
+                payments.filter(status="paid")
+                # SQLite sums as floats, keep it comparable to the total.
+                .annotate(total=Round(Sum("amount"), 2))
+                .values("total")
+            ),
+            Decimal(0),
+            output_field=models.DecimalField(
+                max_digits=15, decimal_places=2
+            ),
+        )
+        return {
+            "paid_amount": paid,
+            "remaining_amount": ExpressionWrapper(
+                F("total_amount") - paid,
+                output_field=models.DecimalField(
+                    max_digits=15, decimal_places=2
+                ),
+            ),
+            "paid_count": count("paid"),
+            "failed_count": count("failed"),
+            "scheduled_count": count("scheduled"),
+            "overdue_count": count("overdue"),
+            "overdue_since": first_due("overdue"),
+            "next_due_date": first_due("scheduled", "overdue"),
+            "is_active": Case(
+                When(total_amount__lte=paid, then=False), default=True
+            ),
+        }
+
+    @classmethod
+    def refresh_counters(cls, pks):
+        """Recounts the counters of the given transactions from the
+        payment rows, so concurrent callers converge on the truth.
+        Archived transactions keep the counters they closed with."""
+        return cls.objects.filter(
+            pk__in=pks, archived_at__isnull=True
+        ).update(**cls.counters())
+
+    @classmethod
+    def archivable(cls, before):
+        """Closed transactions that ended before ``before``, with no open
+        installment left and not archived yet."""
+        return cls.objects.filter(
+            is_active=False,
+            scheduled_count=0,
+            overdue_count=0,
+            end_date__lt=before,
+            archived_at__isnull=True,
+        )
+
 
 class Payment(models.Model):
     PAYMENT_TYPE_CHOICES = [
@@ -99,6 +328,7 @@ class Payment(models.Model):
     ]
     STATUS_CHOICES = [
         ("scheduled", "Scheduled"),
+        ("overdue", "Overdue"),
         ("paid", "Paid"),
         ("failed", "Failed"),
     ]
@@ -115,10 +345,81 @@ class Payment(models.Model):
     transaction = models.ForeignKey(
         Transactions, null=True, blank=True, on_delete=models.CASCADE
     )
+    # Bulk updates set it themselves, see status_change().
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = TransactionOwnedQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["transaction", "status", "payment_type"],
+                name="payment_trx_status_type_idx",
+            ),
+            # Incremental exports, ?since=.
+            models.Index(fields=["updated_at"], name="payment_updated_idx"),
+            models.Index(fields=["due_date", "id"], name="payment_due_idx"),
+            models.Index(
+                fields=["due_date"],
+                condition=models.Q(status="scheduled"),
+                name="payment_scheduled_due_idx",
+            ),
+        ]
 
     def __str__(self):
         return f"Payment of date {self.due_date}"
 
+    @staticmethod
+    def status_change(new_status):
+        """Columns to write when the API sets ``new_status``, paid rows
+        carry the day they were paid."""
+        return {
+            "status": new_status,
+            "paid_date": (
+                timezone.localdate() if new_status == "paid" else None
+            ),
+            "updated_at": timezone.now(),
+        }
+
+
+class ArchivedPayment(models.Model):
+    """A payment of a closed transaction, moved out of ``Payment`` by
+    ``manage.py archive`` with its id and columns unchanged."""
+
+    id = models.BigIntegerField(primary_key=True)
+    payment_type = models.CharField(
+        max_length=20, choices=Payment.PAYMENT_TYPE_CHOICES
+    )
+    amount = models.DecimalField(max_digits=15, decimal_places=2)
+    due_date = models.DateField()
+    status = models.CharField(max_length=20, choices=Payment.STATUS_CHOICES)
+    paid_date = models.DateField(null=True, blank=True)
+    transaction = models.ForeignKey(
+        Transactions, null=True, blank=True, on_delete=models.CASCADE
+    )
+    updated_at = models.DateTimeField()
+    archived_at = models.DateTimeField(default=timezone.now)
+
+    objects = TransactionOwnedQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["due_date", "id"], name="archived_payment_due_idx"
+            ),
+            models.Index(
+                fields=["updated_at"], name="archived_payment_updated_idx"
+            ),
+        ]
+
+    def __str__(self):
+        return f"Archived payment of date {self.due_date}"
+
+
+CASH_INFLOW_TYPES = ("deposit_received", "loan_payment")
+# SQLite sums decimals as floats, large ledgers pick up sub-cent noise.
+CENTS = Decimal("0.01")
+
 
 class CashFlow(models.Model):
     TRANSACTION_TYPE_CHOICES = [
@@ -132,46 +433,297 @@ class CashFlow(models.Model):
         max_length=20, choices=TRANSACTION_TYPE_CHOICES
     )
     amount = models.DecimalField(max_digits=15, decimal_places=2)
-    date = models.DateField(auto_now_add=True)
+    date = models.DateField(default=timezone.localdate, editable=False)
     transaction = models.ForeignKey(
         Transactions, null=True, blank=True, on_delete=models.SET_NULL
     )
+    # When the row was written, ``date`` may be an earlier booking day.
+    created_at = models.DateTimeField(default=timezone.now, editable=False)
+
+    objects = TransactionOwnedQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["created_at"], name="cashflow_created_idx"),
+            models.Index(
+                fields=["transaction_type", "date"],
+                name="cashflow_type_date_idx",
+            ),
+            # Delta rows after a CashCheckpoint.
+            models.Index(fields=["date"], name="cashflow_date_idx"),
+        ]
 
     def __str__(self):
         return f"Cash Flow of {self.transaction}"
 
+    @property
+    def signed_amount(self):
+        if self.transaction_type in CASH_INFLOW_TYPES:
+            return self.amount
+        return -self.amount
+
+    def save(self, *args, **kwargs):
+        # The receivers in signals.py move the cash position, in the same
+        # transaction as the row. Deletes, queryset ones included, run in
+        # one already.
+        with atomic():
+            super().save(*args, **kwargs)
+
+    def _record(self, delta):
+        CashBalance.apply(delta)
+        CashCheckpoint.apply(self.date, delta)
+
+    @staticmethod
+    def signed_sum():
+        return Sum(
+            Case(
+                When(
+                    transaction_type__in=CASH_INFLOW_TYPES,
+                    then=F("amount"),
+                ),
+                default=-F("amount"),
+                output_field=models.DecimalField(
+                    max_digits=17, decimal_places=2
+                ),
+            )
+        )
+
+    @classmethod
+    def aggregate_cash(cls, queryset=None) -> Decimal:
+        """Full-ledger total, archived rows included; the slow path
+        CashBalance is checked against."""
+        if queryset is None:
+            return sum(
+                (
+                    cls.aggregate_cash(model.objects.all())
+                    for model in (cls, ArchivedCashFlow)
+                ),
+                Decimal(0),
+            )
+
+        total = queryset.aggregate(total=cls.signed_sum())["total"]
+        return (total or Decimal(0)).quantize(CENTS)
+
     @classmethod
-    def get_cash(self) -> int:
-        all_transactions = CashFlow.objects.all()
-
-        total_deposits = (
-            all_transactions.filter(
-                transaction_type="deposit_received"
-            ).aggregate(Sum("amount"))["amount__sum"]
-            or 0
+    def get_cash(cls, as_of=None) -> Decimal:
+        if as_of is None:
+            return CashBalance.current()
+        return CashCheckpoint.balance_at(as_of)
+
+
+class ArchivedCashFlow(models.Model):
+    """A cash flow of a closed transaction, moved out of ``CashFlow`` by
+    ``manage.py archive``. It still counts towards the cash position."""
+
+    id = models.BigIntegerField(primary_key=True)
+    transaction_type = models.CharField(
+        max_length=20, choices=CashFlow.TRANSACTION_TYPE_CHOICES
+    )
+    amount = models.DecimalField(max_digits=15, decimal_places=2)
+    date = models.DateField()
+    transaction = models.ForeignKey(
+        Transactions, null=True, blank=True, on_delete=models.SET_NULL
+    )
+    created_at = models.DateTimeField()
+    archived_at = models.DateTimeField(default=timezone.now)
+
+    objects = TransactionOwnedQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["date"], name="archived_cashflow_date_idx"),
+            models.Index(
+                fields=["created_at"], name="archived_cashflow_created_idx"
+            ),
+        ]
+
+    def __str__(self):
+        return f"Archived cash flow of {self.transaction}"
+
+
+class CashBalance(models.Model):
+    """Running total of CashFlow, updated in the same transaction as
+    every CashFlow insert so reading the available cash is O(1)."""
+
+    SINGLETON_ID = 1
+
+    amount = models.DecimalField(max_digits=17, decimal_places=2, default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Cash balance of {self.amount}"
+
+    @classmethod
+    def apply(cls, delta):
+        updated = cls.objects.filter(pk=cls.SINGLETON_ID).update(
+            amount=F("amount") + delta, updated_at=timezone.now()
         )
+        if not updated:
+            cls.rebuild()
 
-        total_loan_payments = (
-            all_transactions.filter(
-                transaction_type="loan_payment"
-            ).aggregate(Sum("amount"))["amount__sum"]
-            or 0
+    @classmethod
+    def current(cls) -> Decimal:
+        amount = (
+            cls.objects.filter(pk=cls.SINGLETON_ID)
+            .values_list("amount", flat=True)
+            .first()
         )
+        if amount is None:
+            return cls.rebuild()
+        return amount
+
+    @classmethod
+    def rebuild(cls) -> Decimal:
+        with atomic():
+            amount = CashFlow.aggregate_cash()
+            cls.objects.update_or_create(
+                pk=cls.SINGLETON_ID, defaults={"amount": amount}
+            )
+        return amount
+
 
-        total_loans = (
-            all_transactions.filter(
-                transaction_type="loan_issued"
-            ).aggregate(Sum("amount"))["amount__sum"]
-            or 0
+class CashCheckpoint(models.Model):
+    """Closing cash position of a day that has CashFlow rows, so the
+    position on any date is one checkpoint plus the rows after it."""
+
+    date = models.DateField(unique=True)
+    balance = models.DecimalField(max_digits=17, decimal_places=2)
+
+    def __str__(self):
+        return f"Cash checkpoint of {self.date}"
+
+    @classmethod
+    def apply(cls, date, delta):
+        # The day's row first, opening where the day before closed, then
+        # one update for it and every later day. Writers racing on a new
+        # day insert the same row, whichever loses still adds its delta.
+        if not cls.objects.filter(date=date).exists():
+            cls.objects.bulk_create(
+                [
+                    cls(
+                        date=date,
+                        balance=cls.balance_at(date - timedelta(days=1)),
+                    )
+                ],
+                ignore_conflicts=True,
+            )
+        cls.objects.filter(date__gte=date).update(
+            balance=F("balance") + delta
         )
 
-        total_loan_payments = (
-            all_transactions.filter(
-                transaction_type="deposit_payment"
-            ).aggregate(Sum("amount"))["amount__sum"]
-            or 0
+    @classmethod
+    def apply_many(cls, deltas):
+        """``apply`` for a ``{date: delta}`` batch of rows, touching every
+        later checkpoint once instead of once per day in the batch."""
+        if not deltas:
+            return
+
+        dates = sorted(deltas)
+        stored = dict(
+            cls.objects.filter(date__gte=dates[0])
+            .order_by("date")
+            .values_list("date", "balance")
         )
+        stored_dates = list(stored)
+        opening = cls.balance_at(dates[0] - timedelta(days=1))
+
+        missing, shift = [], Decimal(0)
+        for date, until in zip(dates, [*dates[1:], None]):
+            shift += deltas[date]
+            later = cls.objects.filter(date__gte=date)
+            if until is not None:
+                later = later.filter(date__lt=until)
+            later.update(balance=F("balance") + shift)
 
-        return (total_deposits + total_loan_payments) - (
-            total_loans + total_loan_payments
+            if date not in stored:
+                # A day without a checkpoint had no rows before the batch,
+                # it closed where the last checkpoint before it did.
+                position = bisect_left(stored_dates, date)
+                before = (
+                    stored[stored_dates[position - 1]] if position else opening
+                )
+                missing.append(cls(date=date, balance=before + shift))
+        cls.objects.bulk_create(missing, batch_size=1000)
+
+    @classmethod
+    def balance_at(cls, as_of) -> Decimal:
+        checkpoint = (
+            cls.objects.filter(date__lte=as_of)
+            .order_by("-date")
+            .values_list("date", "balance")
+            .first()
         )
+        # Every day with archived rows has had a checkpoint since the rows
+        # were first written, only the hot table can hold rows after one.
+        rows = CashFlow.objects.filter(date__lte=as_of)
+        if checkpoint is None:
+            return CashFlow.aggregate_cash(rows)
+
+        date, balance = checkpoint
+        return balance + CashFlow.aggregate_cash(rows.filter(date__gt=date))
+
+    @classmethod
+    def from_ledger(cls):
+        """Checkpoints recomputed from the full CashFlow ledger, archived
+        rows included."""
+        daily = {}
+        for model in (CashFlow, ArchivedCashFlow):
+            for date, total in (
+                model.objects.values("date")
+                .annotate(total=CashFlow.signed_sum())
+                .order_by()
+                .values_list("date", "total")
+            ):
+                daily[date] = daily.get(date, 0) + total.quantize(CENTS)
+
+        balance = Decimal(0)
+        checkpoints = []
+        for date in sorted(daily):
+            balance += daily[date]
+            checkpoints.append(cls(date=date, balance=balance))
+        return checkpoints
+
+    @classmethod
+    def rebuild(cls):
+        with atomic():
+            cls.objects.all().delete()
+            cls.objects.bulk_create(cls.from_ledger(), batch_size=1000)
+
+
+class Job(models.Model):
+    """A unit of background work, run by ``manage.py worker``.
+
+    Claiming a job marks it running until ``locked_until``; a job whose
+    worker died is claimed again once that visibility timeout passes, so
+    handlers must be idempotent. See core/jobs.py.
+    """
+
+    STATUS_CHOICES = [
+        ("queued", "Queued"),
+        ("running", "Running"),
+        ("done", "Done"),
+        ("failed", "Failed"),
+    ]
+
+    name = models.CharField(max_length=100)
+    payload = models.JSONField(default=dict)
+    status = models.CharField(
+        max_length=20, choices=STATUS_CHOICES, default="queued"
+    )
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=5)
+    run_after = models.DateTimeField(default=timezone.now)
+    locked_until = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["status", "run_after"], name="job_status_run_after_idx"
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.name} job {self.pk} ({self.status})"
@@ -0,0 +1,188 @@
+import heapq
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from binascii import Error as BinasciiError
+
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """Cursor pagination on a unique composite key such as
+    ``(created_at, id)``.
+
+    Pages are fetched with ``WHERE key > cursor ORDER BY key LIMIT n``
+    instead of an OFFSET, so every page costs the same however deep it is,
+    and rows inserted while paging never shift or repeat earlier ones.
+    """
+
+    # All fields must share the same direction, the last one unique.
+    ordering = ("id",)
+    page_size = 100
+    page_size_query_param = "page_size"
+    max_page_size = 1000
+    cursor_query_param = "cursor"
+    invalid_cursor_message = "Invalid cursor"
+
+    def paginate_queryset(self, queryset, request, view=None):
+        queryset = self.page_queryset(queryset, request)
+        try:
+            rows = list(queryset)
+        except (DjangoValidationError, TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        return self.finish_page(rows)
+
+    def paginate_querysets(self, querysets, request):
+        """``paginate_queryset`` over several querysets sharing the key, as
+        if they were one: a page query each, merged in key order."""
+        pages = [
+            self.page_queryset(queryset, request) for queryset in querysets
+        ]
+        try:
+            pages = [list(page) for page in pages]
+        except (DjangoValidationError, TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+
+        descending = self.ordering[0].startswith("-") != self.reverse
+        rows = heapq.merge(*pages, key=self.position_of, reverse=descending)
+        return self.finish_page(list(rows))
+
+    async def apaginate_queryset(self, queryset, request):
+        queryset = self.page_queryset(queryset, request)
+        try:
+            rows = [row async for row in queryset]
+        except (DjangoValidationError, TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        return self.finish_page(rows)
+
+    def page_queryset(self, queryset, request):
+        """The lazy query for the requested page plus one look-ahead row."""
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        self.position, self.reverse = self.decode_cursor(request)
+
+        ordering = self.ordering
+        if self.reverse:
+            ordering = [self._invert(field) for field in ordering]
+        queryset = queryset.order_by(*ordering)
+        if self.position is not None:
+            try:
+                queryset = queryset.filter(
+                    self._after(self.position, self.reverse)
+                )
+            except (DjangoValidationError, TypeError, ValueError):
+                raise NotFound(self.invalid_cursor_message)
+        return queryset[: self.page_size + 1]
+
+    def finish_page(self, rows):
+        position, reverse = self.position, self.reverse
+        has_more = len(rows) > self.page_size
+        rows = rows[: self.page_size]
+        if reverse:
+            rows.reverse()
+
+        self.has_next = has_more if not reverse else position is not None
+        self.has_previous = has_more if reverse else position is not None
+        self.first = self.position_of(rows[0]) if rows else position
+        self.last = self.position_of(rows[-1]) if rows else position
+        return rows
+
+    def get_paginated_data(self, data):
+        return {
+            "next": self.get_next_link(),
+            "previous": self.get_previous_link(),
+            "results": data,
+        }
+
+    def get_paginated_response(self, data):
+        return Response(self.get_paginated_data(data))
+
+    def get_page_size(self, request):
+        try:
+            size = int(self._params(request)[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return min(max(size, 1), self.max_page_size)
+
+    def get_next_link(self):
+        if not self.has_next or self.last is None:
+            return None
+        return self.encode_cursor(self.last, reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if self.first is None:
+            return remove_query_param(self.base_url, self.cursor_query_param)
+        return self.encode_cursor(self.first, reverse=True)
+
+    @property
+    def fields(self):
+        return [field.lstrip("-") for field in self.ordering]
+
+    def position_of(self, row):
+        # Model instances, named values_list() rows or values() dicts.
+        if isinstance(row, dict):
+            return [row[field] for field in self.fields]
+        return [getattr(row, field) for field in self.fields]
+
+    def encode_cursor(self, position, reverse):
+        payload = {
+            "p": [
+                value.isoformat() if hasattr(value, "isoformat") else value
+                for value in position
+            ],
+            "r": int(reverse),
+        }
+        cursor = urlsafe_b64encode(json.dumps(payload).encode()).decode()
+        return replace_query_param(
+            self.base_url, self.cursor_query_param, cursor
+        )
+
+    def decode_cursor(self, request):
+        cursor = self._params(request).get(self.cursor_query_param)
+        if not cursor:
+            return None, False
+
+        try:
+            payload = json.loads(urlsafe_b64decode(cursor.encode()))
+            values = payload["p"]
+            reverse = bool(payload["r"])
+            if len(values) != len(self.fields):
+                raise ValueError
+        except (BinasciiError, KeyError, TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+
+        return values, reverse
+
+    def _after(self, position, reverse):
+        ascending = not self.ordering[0].startswith("-")
+        lookup = "gt" if ascending != reverse else "lt"
+
+        condition = Q()
+        for index, field in enumerate(self.fields):
+            equal = dict(zip(self.fields[:index], position[:index]))
+            condition |= Q(**equal, **{f"{field}__{lookup}": position[index]})
+        return condition
+
+    @staticmethod
+    def _params(request):
+        # DRF requests and plain (async) Django requests alike.
+        return getattr(request, "query_params", request.GET)
+
+    @staticmethod
+    def _invert(field):
+        return field[1:] if field.startswith("-") else f"-{field}"
+
+
+class ApplicationPagination(KeysetPagination):
+    ordering = ("-created_at", "-id")
+
+
+class PaymentPagination(KeysetPagination):
+    ordering = ("due_date", "id")
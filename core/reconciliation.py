@@ -0,0 +1,229 @@
+"""Bank statement reconciliation.
+
+Statements are read line by line, as CSV with a ``transaction,amount,date``
+header (extra columns are ignored) or as fixed-width records laid out by
+``FIXED_WIDTH``. Every line is matched to an open (scheduled or overdue)
+payment of the same transaction and amount due within ``window_days`` of
+the booking date, preferring the closest due date. Matches are applied
+in chunks: payments become paid, and the matching ``CashFlow`` rows are
+written with the cash balance and checkpoints kept in step. Only one
+chunk of lines and the open payments of its transactions are held in
+memory, whatever the size of the statement.
+"""
+
+import csv
+from dataclasses import dataclass
+from datetime import date, timedelta
+from decimal import Decimal, InvalidOperation
+
+from django.db.transaction import atomic
+from django.utils import timezone
+
+from .cache import bump_versions, invalidate
+from .models import (
+    CashBalance,
+    CashCheckpoint,
+    CashFlow,
+    Payment,
+    Transactions,
+)
+
+CSV = "csv"
+FIXED = "fixed"
+FORMATS = (CSV, FIXED)
+
+# (field, start, end) of a fixed-width record, the rest is a reference.
+FIXED_WIDTH = (
+    ("transaction", 0, 12),
+    ("date", 12, 22),
+    ("amount", 22, 37),
+)
+
+OPEN_STATUSES = ("scheduled", "overdue")
+CASH_FLOW_TYPES = {"loan": "loan_payment", "deposit": "deposit_payment"}
+
+
+@dataclass(frozen=True)
+class Line:
+    number: int
+    raw: str
+    transaction: int = None
+    amount: Decimal = None
+    date: date = None
+    error: str = ""
+
+
+def _line(number, raw, transaction, amount, booked):
+    try:
+        return Line(
+            number,
+            raw,
+            transaction=int(transaction),
+            amount=Decimal(amount.strip()).quantize(Decimal("0.01")),
+            date=date.fromisoformat(booked.strip()),
+        )
+    except (AttributeError, InvalidOperation, TypeError, ValueError):
+        return Line(number, raw, error="malformed line")
+
+
+def parse_csv(stream):
+    reader = csv.reader(stream)
+    header = [column.strip().lower() for column in next(reader, [])]
+    try:
+        columns = [
+            header.index(name) for name in ("transaction", "amount", "date")
+        ]
+    except ValueError:
+        raise ValueError(
+            "CSV statements need transaction, amount and date columns"
+        )
+
+    for number, row in enumerate(reader, start=2):
+        raw = ",".join(row)
+        if not row:
+            continue
+        if len(row) < len(header):
+            yield Line(number, raw, error="malformed line")
+            continue
+        yield _line(number, raw, *(row[column] for column in columns))
+
+
+def parse_fixed_width(stream):
+    for number, raw in enumerate(stream, start=1):
+        raw = raw.rstrip("\r\n")
+        if not raw.strip():
+            continue
+        fields = {name: raw[start:end] for name, start, end in FIXED_WIDTH}
+        yield _line(
+            number,
+            raw,
+            fields["transaction"],
+            fields["amount"],
+            fields["date"],
+        )
+
+
+PARSERS = {CSV: parse_csv, FIXED: parse_fixed_width}
+
+
+class StatementImport:
+    """Matches and applies statement lines, counting as it goes."""
+
+    def __init__(self, window_days=15, chunk_size=5000):
+        self.window = timedelta(days=window_days)
+        self.chunk_size = chunk_size
+        self.lines = 0
+        self.matched = 0
+        self.total = Decimal(0)
+
+    def run(self, lines):
+        """Applies ``lines`` and yields ``(number, reason, raw)`` for every
+        line that could not be."""
+        chunk = []
+        for line in lines:
+            chunk.append(line)
+            if len(chunk) == self.chunk_size:
+                yield from self.apply(chunk)
+                chunk = []
+        if chunk:
+            yield from self.apply(chunk)
+
+    def apply(self, chunk):
+        self.lines += len(chunk)
+        unmatched = [
+            (line.number, line.error, line.raw)
+            for line in chunk
+            if line.error
+        ]
+        lines = [line for line in chunk if not line.error]
+
+        with atomic():
+            index = self.index({line.transaction for line in lines})
+            matches = []
+            for line in lines:
+                payment = self.match(index, line)
+                if payment is None:
+                    unmatched.append(
+                        (line.number, "no open payment matches", line.raw)
+                    )
+                else:
+                    matches.append((line, payment))
+            self.record(matches)
+
+        unmatched.sort()
+        return unmatched
+
+    def index(self, transactions):
+        """Open payments of ``transactions``, by (transaction, amount),
+        locked until the chunk is applied."""
+        index = {}
+        rows = (
+            Payment.objects.select_for_update(of=("self",))
+            .filter(transaction__in=transactions, status__in=OPEN_STATUSES)
+            .order_by("due_date", "id")
+            .values_list(
+                "id",
+                "transaction",
+                "transaction__user",
+                "amount",
+                "due_date",
+                "payment_type",
+            )
+        )
+        for row in rows:
+            index.setdefault((row[1], row[3]), []).append(row)
+        return index
+
+    def match(self, index, line):
+        candidates = index.get((line.transaction, line.amount))
+        if not candidates:
+            return None
+
+        distance, position = min(
+            (abs(row[4] - line.date), position)
+            for position, row in enumerate(candidates)
+        )
+        if distance > self.window:
+            return None
+        return candidates.pop(position)
+
+    def record(self, matches):
+        if not matches:
+            return
+
+        paid_on = {}
+        for line, payment in matches:
+            paid_on.setdefault(line.date, []).append(payment[0])
+        # The rows are locked by index(), no need to re-check the status.
+        for paid_date, ids in paid_on.items():
+            Payment.objects.filter(pk__in=ids).update(
+                status="paid", paid_date=paid_date, updated_at=timezone.now()
+            )
+
+        cash_flows = [
+            CashFlow(
+                transaction_type=CASH_FLOW_TYPES[payment[5]],
+                amount=payment[3],
+                date=line.date,
+                transaction_id=payment[1],
+            )
+            for line, payment in matches
+        ]
+        CashFlow.objects.bulk_create(cash_flows, batch_size=1000)
+        # bulk_create skips CashFlow.save(), keep the position in step here.
+        deltas = {}
+        for cash_flow in cash_flows:
+            deltas[cash_flow.date] = (
+                deltas.get(cash_flow.date, 0) + cash_flow.signed_amount
+            )
+        CashBalance.apply(sum(deltas.values()))
+        CashCheckpoint.apply_many(deltas)
+
+        Transactions.refresh_counters({payment[1] for _, payment in matches})
+        self.matched += len(matches)
+        self.total += sum(payment[3] for _, payment in matches)
+
+        ids = [payment[0] for _, payment in matches]
+        owners = {payment[2] for _, payment in matches}
+        invalidate("payment", *ids)
+        bump_versions(*owners)
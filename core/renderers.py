@@ -0,0 +1,52 @@
+import csv
+from abc import ABC, abstractmethod
+
+from django.core.serializers.json import DjangoJSONEncoder
+from rest_framework.renderers import BaseRenderer
+
+
+class StreamingRenderer(BaseRenderer, ABC):
+    """Renders a header plus an iterator of row tuples one line at a time,
+    for use with ``StreamingHttpResponse``. ``render`` covers the regular
+    (non-streamed) responses such as errors."""
+
+    charset = "utf-8"
+
+    @abstractmethod
+    def stream(self, header, rows):
+        """Yields the encoded ``header`` and ``rows``, a line at a time."""
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+
+        records = data if isinstance(data, list) else [data]
+        header = list(records[0]) if records else []
+        rows = ([record.get(key) for key in header] for record in records)
+        return "".join(self.stream(header, rows)).encode(self.charset)
+
+
+class _Echo:
+    def write(self, value):
+        return value
+
+
+class CSVRenderer(StreamingRenderer):
+    media_type = "text/csv"
+    format = "csv"
+
+    def stream(self, header, rows):
+        writer = csv.writer(_Echo())
+        yield writer.writerow(header)
+        for row in rows:
+            yield writer.writerow(row)
+
+
+class NDJSONRenderer(StreamingRenderer):
+    media_type = "application/x-ndjson"
+    format = "ndjson"
+
+    def stream(self, header, rows):
+        encoder = DjangoJSONEncoder(separators=(",", ":"))
+        for row in rows:
+            yield encoder.encode(dict(zip(header, row))) + "\n"
@@ -1,27 +1,68 @@
+from functools import cached_property
+
 from django.contrib.auth import get_user_model
+from django.db.models import Q
 from rest_framework import serializers
+from rest_framework.relations import PKOnlyObject, RelatedField
 
 from .models import Application, CashFlow, Payment, Transactions
 
 User = get_user_model()
 
 
+def applicants():
+    """Users applications can be made for, as ``Application.user``'s
+    ``limit_choices_to`` allows."""
+    return User.objects.filter(
+        Q(groups__name=User.BORROWER) | Q(groups__name=User.PROVIDER)
+    ).distinct()
+
+
 class UserSerializer(serializers.ModelSerializer):
     class Meta:
         model = User
         fields = ["id", "username", "first_name", "last_name"]
 
 
+class PreloadedUserField(serializers.PrimaryKeyRelatedField):
+    """Resolves users from ``context["users"]`` when the caller already
+    loaded them, instead of one query per serialized item."""
+
+    def to_internal_value(self, data):
+        users = self.context.get("users")
+        if users is None:
+            return super().to_internal_value(data)
+
+        if isinstance(data, bool):
+            self.fail("incorrect_type", data_type=type(data).__name__)
+        try:
+            return users[int(data)]
+        except KeyError:
+            self.fail("does_not_exist", pk_value=data)
+        except (TypeError, ValueError):
+            self.fail("incorrect_type", data_type=type(data).__name__)
+
+
+class ApplicationListSerializer(serializers.ListSerializer):
+    def create(self, validated_data):
+        return Application.objects.bulk_create(
+            [Application(**item) for item in validated_data]
+        )
+
+
 class ApplicationSerializer(serializers.ModelSerializer):
+    user = PreloadedUserField(queryset=applicants())
 
     class Meta:
         model = Application
+        list_serializer_class = ApplicationListSerializer
         fields = [
             "user",
             "duration_months",
             "amount",
             "interest_rate",
             "status",
+            "schedule_status",
             "created_at",
             "application_type",
         ]
@@ -32,4 +73,73 @@ class PaymentSerializer(serializers.ModelSerializer):
         model = Payment
         fields = ['id','payment_type', 'amount', 'due_date', 'status']  
         # optional: exclude fields that shouldn't be serialized
-        # exclude = ['id'] # example
\ No newline at end of file
+        # exclude = ['id'] # example
+
+
+class TransactionsSummarySerializer(serializers.Serializer):
+    active_transactions = serializers.IntegerField()
+    outstanding_balance = serializers.DecimalField(
+        max_digits=15, decimal_places=2
+    )
+    next_payment = serializers.DictField(allow_null=True)
+    overdue_count = serializers.IntegerField()
+    total_deposited = serializers.DecimalField(
+        max_digits=15, decimal_places=2
+    )
+    total_earned = serializers.DecimalField(max_digits=15, decimal_places=2)
+
+
+class ValuesSerializer:
+    """Read-only fast path of a ModelSerializer for list endpoints.
+
+    Rows are fetched with ``values_list()`` and every column goes through
+    the ``to_representation`` of the serializer field it belongs to, so
+    the output is the same as ``serializer_class(many=True).data`` without
+    building model instances or walking the field machinery per row.
+    """
+
+    def __init__(self, serializer_class):
+        self.serializer_class = serializer_class
+
+    @cached_property
+    def compiled(self):
+        names, columns, converters = [], [], []
+        for name, field in self.serializer_class().fields.items():
+            if field.write_only:
+                continue
+            if field.source == "*":
+                raise TypeError(f"{name} has no column to read from")
+
+            names.append(name)
+            columns.append("__".join(field.source_attrs))
+            if isinstance(field, RelatedField):
+                converters.append(
+                    lambda pk, field=field: field.to_representation(
+                        PKOnlyObject(pk)
+                    )
+                )
+            else:
+                converters.append(field.to_representation)
+        return names, columns, converters
+
+    def values_list(self, queryset, *extra):
+        """The columns of the serializer plus ``extra`` ones (such as the
+        pagination key), as rows the pagination can read by name."""
+        _, columns, _ = self.compiled
+        extra = [column for column in extra if column not in columns]
+        return queryset.values_list(*columns, *extra, named=True)
+
+    def to_representation(self, rows):
+        names, _, converters = self.compiled
+        fields = tuple(zip(names, converters))
+        return [
+            {
+                name: None if value is None else convert(value)
+                for (name, convert), value in zip(fields, row)
+            }
+            for row in rows
+        ]
+
+
+application_rows = ValuesSerializer(ApplicationSerializer)
+payment_rows = ValuesSerializer(PaymentSerializer)
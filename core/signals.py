@@ -1,10 +1,28 @@
-from datetime import timedelta
-
-from django.db.models.signals import post_save
+from django.conf import settings
+from django.db.models.signals import (
+    m2m_changed,
+    post_delete,
+    post_save,
+    pre_save,
+)
+from django.db.transaction import atomic
 from django.dispatch import receiver
 from django.utils import timezone
 
-from .models import Application, CashFlow, Payment, Transactions
+from .amortization import amortize, from_cents
+from .authentication import verified_tokens
+from .cache import bump_versions, invalidate
+from .jobs import enqueue, job, on_failure
+from .models import (
+    Application,
+    ArchivedPayment,
+    CashFlow,
+    Payment,
+    Transactions,
+    User,
+)
+
+PAYMENT_BATCH_SIZE = 500
 
 
 @receiver(post_save, sender=Application)
@@ -12,37 +30,196 @@ def handle_application_approval(sender, instance, created, **kwargs):
     if not (instance.status == "approved" and not created):
         return 
         
-    total_amount = instance.amount * (1 + instance.interest_rate / 100)
-    monthly_payment = total_amount / instance.duration_months
-
-    tarx = Transactions.objects.create(
-        user=instance.user,
-        application=instance,
-        start_date=timezone.now().date(),
-        end_date=timezone.now().date()
-        + timedelta(days=30 * instance.duration_months),
-        monthly_payment=monthly_payment,
-        total_amount=total_amount,
-        is_active=True,
+    start_date = timezone.now().date()
+    schedule = amortize(
+        instance.amount,
+        instance.interest_rate,
+        instance.duration_months,
+        start_date,
+        mode=settings.LOAN_AMORTIZATION_MODE,
     )
 
-    CashFlow.objects.create(
-        transaction_type=(
-            "deposit_received"
-            if instance.application_type == "deposit"
-            else "loan_issued"
-        ),
-        amount=instance.amount,
-        date=timezone.now().date(),
-        transaction=tarx,
-    )
+    with atomic():
+        if Transactions.objects.filter(application=instance).exists():
+            return
 
-    for month in range(1, instance.duration_months + 1):
-        Payment.objects.create(
-            payment_type=instance.application_type,
-            amount=monthly_payment,
-            due_date=tarx.start_date + timedelta(days=30 * month),
-            status="scheduled",
+        tarx = Transactions.objects.create(
+            user=instance.user,
+            application=instance,
+            start_date=start_date,
+            end_date=schedule.end_date(0),
+            monthly_payment=from_cents(schedule.installment[0]),
+            total_amount=from_cents(schedule.total[0]),
+            remaining_amount=from_cents(schedule.total[0]),
+            is_active=True,
+        )
+
+        CashFlow.objects.create(
+            transaction_type=(
+                "deposit_received"
+                if instance.application_type == "deposit"
+                else "loan_issued"
+            ),
+            amount=instance.amount,
+            date=start_date,
             transaction=tarx,
         )
 
+        # The payments are the slow part, a worker writes them.
+        Application.objects.filter(pk=instance.pk).update(
+            schedule_status="pending"
+        )
+        queued = enqueue("generate_payment_schedule", transaction_id=tarx.pk)
+        instance.schedule_status = "pending" if queued else "ready"
+
+
+@job("generate_payment_schedule")
+def generate_payment_schedule(transaction_id):
+    tarx = (
+        Transactions.objects.select_for_update()
+        .select_related("application")
+        .filter(pk=transaction_id)
+        .first()
+    )
+    if tarx is None:
+        return
+
+    application = tarx.application
+    # Runs again after a worker died mid-job, the first run may have
+    # committed already.
+    if not Payment.objects.filter(transaction=tarx).exists():
+        schedule = amortize(
+            application.amount,
+            application.interest_rate,
+            application.duration_months,
+            tarx.start_date,
+            mode=settings.LOAN_AMORTIZATION_MODE,
+        )
+        Payment.objects.bulk_create(
+            [
+                Payment(
+                    payment_type=application.application_type,
+                    amount=amount,
+                    due_date=due_date,
+                    status="scheduled",
+                    transaction=tarx,
+                )
+                for _, due_date, amount in schedule.installments(0)
+            ],
+            batch_size=PAYMENT_BATCH_SIZE,
+        )
+        # bulk_create skips the Payment receivers below.
+        Transactions.refresh_counters([tarx.pk])
+
+    Application.objects.filter(pk=application.pk).update(
+        schedule_status="ready"
+    )
+    application.schedule_status = "ready"
+    invalidate("application", application.pk)
+    bump_versions(tarx.user_id)
+
+
+@on_failure("generate_payment_schedule")
+def payment_schedule_failed(transaction_id):
+    tarx = (
+        Transactions.objects.filter(pk=transaction_id)
+        .values("application_id", "user_id")
+        .first()
+    )
+    if tarx is None:
+        return
+
+    Application.objects.filter(
+        pk=tarx["application_id"], schedule_status="pending"
+    ).update(schedule_status="failed")
+    invalidate("application", tarx["application_id"])
+    bump_versions(tarx["user_id"])
+
+
+@receiver(pre_save, sender=CashFlow)
+def lock_previous_cash_flow(sender, instance, raw=False, **kwargs):
+    instance._previous = None
+    if not (raw or instance._state.adding):
+        instance._previous = (
+            CashFlow.objects.select_for_update()
+            .filter(pk=instance.pk)
+            .first()
+        )
+
+
+@receiver(post_save, sender=CashFlow)
+def record_cash_flow(sender, instance, raw=False, **kwargs):
+    # bulk_create skips this, its callers apply the deltas themselves.
+    if raw:
+        return
+    previous = getattr(instance, "_previous", None)
+    if previous is not None:
+        previous._record(-previous.signed_amount)
+    instance._record(instance.signed_amount)
+
+
+@receiver(post_delete, sender=CashFlow)
+def unrecord_cash_flow(sender, instance, **kwargs):
+    # Fires for every row of a queryset delete too, such as the admin's
+    # "delete selected" action.
+    instance._record(-instance.signed_amount)
+
+
+@receiver(post_save, sender=Application)
+@receiver(post_delete, sender=Application)
+def invalidate_cached_application(sender, instance, **kwargs):
+    invalidate("application", instance.pk)
+    bump_versions(instance.user_id)
+
+
+@receiver(post_save, sender=Payment)
+@receiver(post_delete, sender=Payment)
+def refresh_transaction_counters(sender, instance, **kwargs):
+    # Runs in the transaction of the change, SinglePayment and the admin
+    # save atomically. Bulk updates call refresh_counters themselves.
+    if instance.transaction_id is not None:
+        Transactions.refresh_counters([instance.transaction_id])
+
+
+@receiver(post_save, sender=Payment)
+@receiver(post_delete, sender=Payment)
+def invalidate_cached_payment(sender, instance, **kwargs):
+    invalidate("payment", instance.pk)
+    bump_versions(
+        Transactions.objects.filter(pk=instance.transaction_id)
+        .values_list("user_id", flat=True)
+        .first()
+    )
+
+
+@receiver(post_delete, sender=ArchivedPayment)
+def invalidate_cached_archived_payment(sender, instance, **kwargs):
+    # Archived rows never change, they only go with their transaction.
+    invalidate("archived_payment", instance.pk)
+
+
+@receiver(m2m_changed, sender=User.groups.through)
+def reset_cached_roles(sender, instance, action, reverse, pk_set, **kwargs):
+    if not reverse:
+        if action.startswith("post_"):
+            instance.__dict__.pop("roles", None)
+            verified_tokens.revoke(instance.pk)
+        return
+
+    # group.user_set changes, pk_set holds the users except on clear.
+    if action == "pre_clear":
+        instance._cleared_user_ids = list(
+            instance.user_set.values_list("pk", flat=True)
+        )
+    elif action == "post_clear":
+        verified_tokens.revoke(*instance.__dict__.pop("_cleared_user_ids"))
+    elif action in ("post_add", "post_remove"):
+        verified_tokens.revoke(*pk_set)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def revoke_cached_tokens(sender, instance, **kwargs):
+    # A deactivated, deleted or demoted user is checked again on their
+    # next request.
+    verified_tokens.revoke(instance.pk)
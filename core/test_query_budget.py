@@ -0,0 +1,256 @@
+"""Query-count budgets for every API endpoint and admin changelist.
+
+Each check runs the same request against a growing data set and expects the
+number of queries to stay what it was at the smallest scale, so a new N+1
+fails here before it reaches production.
+"""
+
+from asgiref.sync import async_to_sync
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework import status
+
+from .authentication import RolesTokenObtainPairSerializer, verified_tokens
+from .models import Application, CashFlow, Payment, Transactions
+from .tests import BaseTestCase
+
+
+class QueryBudgetTests(BaseTestCase):
+    scales = (1, 4, 12)
+
+    def setUp(self):
+        CashFlow.objects.create(
+            transaction_type="deposit_received", amount=10**7
+        )
+        self.loans = 0
+        self.tokens = {
+            user.pk: RolesTokenObtainPairSerializer.get_token(
+                user
+            ).access_token
+            for user in (self.borrower, self.provider, self.superuser)
+        }
+
+    def seed(self, count):
+        """Grows the data to ``count`` approved loans and as many pending
+        applications and provider deposits."""
+        while self.loans < count:
+            for user, kind in (
+                (self.borrower, "loan"),
+                (self.provider, "deposit"),
+            ):
+                approved = Application.objects.create(
+                    user=user,
+                    amount=1000,
+                    duration_months=3,
+                    interest_rate=10,
+                    application_type=kind,
+                )
+                approved.status = "approved"
+                approved.save()
+            Application.objects.create(
+                user=self.borrower,
+                amount=500,
+                duration_months=6,
+                application_type="loan",
+            )
+            self.loans += 1
+
+    def assertQueryBudget(self, request):
+        """Calls ``request(scale)`` at every scale and checks it runs as
+        many queries as it did at the first one. The rows seeded on the way
+        are rolled back afterwards."""
+        budget, seeded = None, self.loans
+        with transaction.atomic():
+            for scale in self.scales:
+                self.seed(seeded + scale)
+                cache.clear()
+                verified_tokens.clear()
+                if budget is None:
+                    with CaptureQueriesContext(connection) as queries:
+                        request(scale)
+                    budget = len(queries)
+                    continue
+
+                with self.subTest(scale=scale):
+                    with self.assertNumQueries(budget):
+                        request(scale)
+            transaction.set_rollback(True)
+        self.loans = seeded
+
+    def authenticate(self, user):
+        """Bearer token like a real client, so every request loads its own
+        user and reads the roles from the token."""
+        token = self.tokens[user.pk]
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
+
+    def get(self, user, name, *args, query=""):
+        self.authenticate(user)
+        response = self.client.get(f"{reverse(name, args=args)}{query}")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        if response.streaming:
+            b"".join(response.streaming_content)
+        return response
+
+    def test_application_list(self):
+        for user in (self.borrower, self.superuser):
+            with self.subTest(user=user.username):
+                self.assertQueryBudget(
+                    lambda scale: self.get(
+                        user,
+                        "list_create_applications",
+                        query="?page_size=1000",
+                    )
+                )
+
+    def test_application_detail(self):
+        self.assertQueryBudget(
+            lambda scale: self.get(
+                self.borrower,
+                "read_update_application",
+                Application.objects.filter(user=self.borrower).last().pk,
+            )
+        )
+
+    def test_application_create(self):
+        def request(scale):
+            self.authenticate(self.borrower)
+            response = self.client.post(
+                reverse("list_create_applications"),
+                {"amount": 1000, "duration_months": 12},
+            )
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        self.assertQueryBudget(request)
+
+    def test_application_batch_create(self):
+        def request(scale):
+            self.authenticate(self.superuser)
+            response = self.client.post(
+                reverse("batch_create_applications"),
+                [
+                    {
+                        "user": user.pk,
+                        "amount": 1000,
+                        "duration_months": 12,
+                    }
+                    for user in (self.borrower, self.provider) * scale
+                ],
+                format="json",
+            )
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        self.assertQueryBudget(request)
+
+    def test_payment_list(self):
+        for user in (self.borrower, self.superuser):
+            for query in (
+                "?page_size=1000",
+                "?status=scheduled",
+                "?history=1",
+            ):
+                with self.subTest(user=user.username, query=query):
+                    self.assertQueryBudget(
+                        lambda scale: self.get(
+                            user, "list_payments", query=query
+                        )
+                    )
+
+    def test_payment_detail(self):
+        self.assertQueryBudget(
+            lambda scale: self.get(
+                self.borrower,
+                "update_payment",
+                Payment.objects.filter(
+                    transaction__user=self.borrower
+                ).last().pk,
+            )
+        )
+
+    def test_summary(self):
+        for user in (self.borrower, self.provider, self.superuser):
+            with self.subTest(user=user.username):
+                self.assertQueryBudget(
+                    lambda scale: self.get(user, "account_summary")
+                )
+
+    def test_payment_update(self):
+        def request(scale):
+            payment = Payment.objects.filter(
+                transaction__user=self.borrower
+            ).last()
+            self.authenticate(self.borrower)
+            response = self.client.patch(
+                reverse("update_payment", args=[payment.pk]),
+                {"status": "paid"},
+            )
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        self.assertQueryBudget(request)
+
+    def test_payment_batch_update(self):
+        def request(scale):
+            self.authenticate(self.superuser)
+            response = self.client.patch(
+                reverse("batch_update_payments"),
+                [
+                    {"id": pk, "status": "paid"}
+                    for pk in Payment.objects.values_list("pk", flat=True)
+                ],
+                format="json",
+            )
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        self.assertQueryBudget(request)
+
+    def test_exports(self):
+        for name in ("export_payments", "export_cashflows"):
+            for fmt in ("csv", "ndjson"):
+                with self.subTest(name=name, format=fmt):
+                    self.assertQueryBudget(
+                        lambda scale: self.get(
+                            self.borrower, name, query=f"?format={fmt}"
+                        )
+                    )
+
+    def test_async_views(self):
+        token = self.client.post(
+            reverse("token_obtain_pair"),
+            {"username": "borrower", "password": "testpass"},
+        ).data["access"]
+
+        def get(name, *args):
+            def request(scale):
+                response = async_to_sync(self.async_client.get)(
+                    reverse(name, args=args),
+                    headers={"Authorization": f"Bearer {token}"},
+                )
+                self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+            return request
+
+        self.seed(1)
+        application = Application.objects.filter(user=self.borrower).first()
+        payment = Payment.objects.filter(
+            transaction__user=self.borrower
+        ).first()
+        for request in (
+            get("async_list_create_applications"),
+            get("async_read_application", application.pk),
+            get("async_list_payments"),
+            get("async_update_payment", payment.pk),
+        ):
+            self.assertQueryBudget(request)
+
+    def test_admin_changelists(self):
+        self.client.force_login(self.superuser)
+        for model in (Application, Transactions, Payment, CashFlow):
+            name = f"admin:core_{model._meta.model_name}_changelist"
+            with self.subTest(model=model.__name__):
+                self.assertQueryBudget(
+                    lambda scale: self.assertEqual(
+                        self.client.get(reverse(name)).status_code,
+                        status.HTTP_200_OK,
+                    )
+                )
@@ -1,10 +1,62 @@
+import json
+import os
+import re
+import shutil
+import tempfile
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest.mock import patch
+from urllib.parse import urlencode
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
 from django.contrib.auth.models import Group
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.contrib.admin import site
+from django.test import (
+    RequestFactory,
+    SimpleTestCase,
+    TestCase,
+    override_settings,
+)
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils import timezone
 from rest_framework import status
+from rest_framework.renderers import JSONRenderer
 from rest_framework.test import APITestCase
+from rest_framework_simplejwt.tokens import AccessToken
 
-from .models import Application, Payment, User, Transactions
+from . import jobs
+from .admin import EstimatedCountPaginator, PaymentAdmin
+from .authentication import verified_tokens
+from .cache import stats
+from .serializer import (
+    ApplicationSerializer,
+    PaymentSerializer,
+    application_rows,
+    payment_rows,
+)
+from .amortization import ANNUITY, amortize, from_cents
+from .models import (
+    Application,
+    ArchivedCashFlow,
+    ArchivedPayment,
+    CashBalance,
+    CashCheckpoint,
+    CashFlow,
+    Job,
+    Payment,
+    Transactions,
+    User,
+)
 
+@override_settings(CORE_JOBS_EAGER=True)
 class BaseTestCase(APITestCase):
     @classmethod
     def setUpTestData(cls):
@@ -44,15 +96,15 @@ class ApplicationsViewTests(BaseTestCase):
         self.client.force_authenticate(user=self.borrower)
         response = self.client.get(reverse('list_create_applications'))
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(response.data), 1)
-        self.assertEqual(response.data[0]['user'], self.borrower.id)
+        self.assertEqual(len(response.data['results']), 1)
+        self.assertEqual(response.data['results'][0]['user'], self.borrower.id)
 
     def test_get_applications_superuser(self):
         Application.objects.create(user=self.borrower, amount=1000, duration_months=12, application_type='loan')
         self.client.force_authenticate(user=self.superuser)
         response = self.client.get(reverse('list_create_applications'))
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(response.data), 1)
+        self.assertEqual(len(response.data['results']), 1)
 
     def test_post_loan_application_borrower(self):
         self.client.force_authenticate(user=self.borrower)
@@ -85,6 +137,210 @@ class ApplicationsViewTests(BaseTestCase):
         self.assertIn('amount', response.data)
 
 
+class RoleTests(BaseTestCase):
+    def login(self, user):
+        return self.client.post(
+            reverse("token_obtain_pair"),
+            {"username": user.username, "password": "testpass"},
+        ).data["access"]
+
+    def test_tokens_carry_the_roles(self):
+        token = AccessToken(self.login(self.provider))
+        self.assertEqual(token["roles"], ["Provider"])
+
+    def test_role_checks_need_no_query(self):
+        self.client.credentials(
+            HTTP_AUTHORIZATION=f"Bearer {self.login(self.provider)}"
+        )
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(
+                reverse("list_create_applications"),
+                {"amount": 1000, "duration_months": 12},
+            )
+        self.assertEqual(response.data["application_type"], "deposit")
+        # The groups come with the account check, nothing else reads them.
+        (query,) = [query for query in queries if "auth_group" in query["sql"]]
+        self.assertIn('FROM "core_user"', query["sql"])
+
+    def test_tokens_without_roles_load_the_groups(self):
+        self.client.credentials(
+            HTTP_AUTHORIZATION=f"Bearer {AccessToken.for_user(self.provider)}"
+        )
+        response = self.client.post(
+            reverse("list_create_applications"),
+            {"amount": 1000, "duration_months": 12},
+        )
+        self.assertEqual(response.data["application_type"], "deposit")
+
+    def test_roles_are_loaded_once_and_follow_group_changes(self):
+        user = User.objects.get(pk=self.borrower.pk)
+        with self.assertNumQueries(1):
+            self.assertTrue(user.is_borrower)
+            self.assertFalse(user.is_provider)
+            self.assertFalse(user.is_bank_personnel)
+
+        user.groups.add(Group.objects.get(name="Provider"))
+        self.assertTrue(user.is_provider)
+
+
+class TokenCacheTests(BaseTestCase):
+    def setUp(self):
+        verified_tokens.clear()
+        self.tokens = self.client.post(
+            reverse("token_obtain_pair"),
+            {"username": "borrower", "password": "testpass"},
+        ).data
+        self.client.credentials(
+            HTTP_AUTHORIZATION=f"Bearer {self.tokens['access']}"
+        )
+
+    def user_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse("list_create_applications"))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [q for q in queries if 'FROM "core_user"' in q["sql"]]
+
+    def test_verified_tokens_skip_the_user_table(self):
+        self.assertEqual(len(self.user_queries()), 1)
+        self.assertEqual(self.user_queries(), [])
+
+    def test_user_changes_drop_their_tokens(self):
+        self.user_queries()
+        self.borrower.is_active = False
+        self.borrower.save()
+
+        response = self.client.get(reverse("list_create_applications"))
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_group_changes_apply_to_the_next_request(self):
+        provider = Group.objects.get(name="Provider")
+
+        def apply():
+            response = self.client.post(
+                reverse("list_create_applications"),
+                {"amount": 1000, "duration_months": 12},
+            )
+            return response.data.get("application_type", response.status_code)
+
+        self.assertEqual(apply(), "loan")
+        self.borrower.groups.remove(Group.objects.get(name="Borrower"))
+        self.assertEqual(apply(), status.HTTP_400_BAD_REQUEST)
+
+        # From the group's side, the token still says "Borrower".
+        provider.user_set.add(self.borrower)
+        self.assertEqual(apply(), "deposit")
+        provider.user_set.remove(self.borrower)
+        self.assertEqual(apply(), status.HTTP_400_BAD_REQUEST)
+
+        provider.user_set.add(self.borrower)
+        self.assertEqual(apply(), "deposit")
+        provider.user_set.clear()
+        self.assertEqual(apply(), status.HTTP_400_BAD_REQUEST)
+
+    @override_settings(CORE_AUTH_CACHE_SIZE=1)
+    def test_cache_is_bounded(self):
+        self.user_queries()
+        self.client.credentials(
+            HTTP_AUTHORIZATION=f"Bearer {AccessToken.for_user(self.provider)}"
+        )
+        self.user_queries()
+
+        self.client.credentials(
+            HTTP_AUTHORIZATION=f"Bearer {self.tokens['access']}"
+        )
+        self.assertEqual(len(self.user_queries()), 1)
+
+    @override_settings(CORE_AUTH_CACHE_TIMEOUT=0)
+    def test_entries_expire(self):
+        self.user_queries()
+        self.assertEqual(len(self.user_queries()), 1)
+
+    def test_refresh_reads_the_current_roles(self):
+        self.borrower.groups.add(Group.objects.get(name="Provider"))
+        response = self.client.post(
+            reverse("token_refresh"), {"refresh": self.tokens["refresh"]}
+        )
+        self.assertEqual(
+            AccessToken(response.data["access"])["roles"],
+            ["Borrower", "Provider"],
+        )
+
+        self.borrower.is_active = False
+        self.borrower.save()
+        response = self.client.post(
+            reverse("token_refresh"), {"refresh": self.tokens["refresh"]}
+        )
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class ApplicationsBatchViewTests(BaseTestCase):
+    url = reverse('batch_create_applications')
+
+    def test_borrower_batch_is_created_for_themselves(self):
+        self.client.force_authenticate(user=self.borrower)
+        data = [
+            {'amount': 1000, 'duration_months': 12, 'user': self.provider.id},
+            {'amount': 2000, 'duration_months': 24},
+        ]
+        response = self.client.post(self.url, data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual([row['user'] for row in response.data], [self.borrower.id] * 2)
+        self.assertEqual([row['application_type'] for row in response.data], ['loan'] * 2)
+        self.assertEqual(
+            sorted(Application.objects.values_list('id', flat=True)),
+            sorted(row['id'] for row in response.data),
+        )
+
+    def test_superuser_submits_for_many_users(self):
+        self.client.force_authenticate(user=self.superuser)
+        data = [
+            {'amount': 1000, 'duration_months': 12, 'user': self.borrower.id},
+            {'amount': 500, 'duration_months': 6, 'user': self.provider.id},
+        ]
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(self.url, data * 50, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Application.objects.filter(user=self.provider, application_type='deposit').count(), 50)
+        self.assertEqual(Application.objects.filter(user=self.borrower, application_type='loan').count(), 50)
+        self.assertLess(len(queries), 10)
+
+    def test_invalid_item_rejects_the_whole_batch(self):
+        self.client.force_authenticate(user=self.superuser)
+        data = [
+            {'amount': 1000, 'duration_months': 12, 'user': self.borrower.id},
+            {'duration_months': 12, 'user': 0},
+        ]
+        response = self.client.post(self.url, data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data[0], {})
+        self.assertEqual(set(response.data[1]), {'amount', 'user'})
+        self.assertFalse(Application.objects.exists())
+
+    def test_body_must_be_a_list(self):
+        self.client.force_authenticate(user=self.borrower)
+        response = self.client.post(self.url, {'amount': 1}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_only_borrowers_and_providers_can_apply(self):
+        nobody = User.objects.create_user(username='nobody', password='testpass')
+        self.client.force_authenticate(user=self.superuser)
+        data = [
+            {'amount': 1000, 'duration_months': 12, 'user': self.borrower.id},
+            {'amount': 1000, 'duration_months': 12, 'user': self.superuser.id},
+            {'amount': 1000, 'duration_months': 12, 'user': nobody.id},
+        ]
+        response = self.client.post(self.url, data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual([set(errors) for errors in response.data], [set(), {'user'}, {'user'}])
+
+        self.client.force_authenticate(user=nobody)
+        response = self.client.post(
+            reverse('list_create_applications'), {'amount': 1000, 'duration_months': 12}
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(Application.objects.exists())
+
+
 class SingleApplicationViewTests(BaseTestCase):
     def setUp(self):
         self.application = Application.objects.create(
@@ -108,6 +364,126 @@ class SingleApplicationViewTests(BaseTestCase):
         self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
 
 
+class ReadThroughCacheTests(BaseTestCase):
+    def setUp(self):
+        cache.clear()
+        stats.reset()
+        self.application = Application.objects.create(
+            user=self.borrower, amount=1000, duration_months=1, interest_rate=5, application_type='loan'
+        )
+        self.url = reverse('read_update_application', args=[self.application.id])
+
+    def test_repeated_reads_skip_the_database(self):
+        self.client.force_authenticate(user=self.borrower)
+        self.client.get(self.url)
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url)
+        self.assertEqual(response.data['amount'], '1000.00')
+        self.assertEqual(stats.snapshot()['application'], {'hits': 1, 'misses': 1})
+
+    def test_saving_invalidates_the_entry(self):
+        self.client.force_authenticate(user=self.borrower)
+        self.client.get(self.url)
+        self.application.amount = 2000
+        self.application.save()
+        self.assertEqual(self.client.get(self.url).data['amount'], '2000.00')
+
+    def test_cached_entry_still_checks_ownership(self):
+        self.client.force_authenticate(user=self.borrower)
+        self.client.get(self.url)
+        self.client.force_authenticate(user=self.provider)
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_single_payment_read_and_patch(self):
+        CashFlow.objects.create(transaction_type="deposit_received", amount=5000)
+        self.application.status = 'approved'
+        self.application.save()
+        payment = Payment.objects.get(transaction__application=self.application)
+        url = reverse('update_payment', args=[payment.id])
+
+        self.client.force_authenticate(user=self.borrower)
+        self.assertEqual(self.client.get(url).data['status'], 'scheduled')
+        self.client.patch(url, {'status': 'paid'}, format='json')
+        self.assertEqual(self.client.get(url).data['status'], 'paid')
+
+        self.client.force_authenticate(user=self.provider)
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_missing_row_is_not_found(self):
+        self.client.force_authenticate(user=self.borrower)
+        response = self.client.get(reverse('read_update_application', args=[0]))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_stats_endpoint_is_admin_only(self):
+        self.client.force_authenticate(user=self.borrower)
+        self.assertEqual(self.client.get(reverse('cache_stats')).status_code, status.HTTP_403_FORBIDDEN)
+        self.client.force_authenticate(user=self.superuser)
+        self.client.get(self.url)
+        response = self.client.get(reverse('cache_stats'))
+        self.assertEqual(response.data, {'application': {'hits': 0, 'misses': 1}})
+
+
+class ConditionalGetTests(BaseTestCase):
+    def setUp(self):
+        cache.clear()
+        CashFlow.objects.create(transaction_type="deposit_received", amount=5000)
+        self.application = Application.objects.create(
+            user=self.borrower, amount=1000, duration_months=3, interest_rate=5, application_type='loan'
+        )
+        self.application.status = 'approved'
+        self.application.save()
+        self.client.force_authenticate(user=self.borrower)
+
+    def test_unchanged_list_is_not_modified(self):
+        url = f"{reverse('list_payments')}?status=scheduled"
+        etag = self.client.get(url)['ETag']
+
+        with self.assertNumQueries(0):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response['ETag'], etag)
+
+        other = self.client.get(f"{reverse('list_payments')}?status=paid")
+        self.assertNotEqual(other['ETag'], etag)
+
+    def test_changes_by_the_owner_refresh_the_etag(self):
+        url = reverse('list_create_applications')
+        etag = self.client.get(url)['ETag']
+
+        payment = Payment.objects.filter(transaction__application=self.application).first()
+        payment.status = 'paid'
+        payment.save()
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_versions_expire(self):
+        # A change made by another process with its own cache never bumps
+        # this one's version, it has to run out.
+        url = reverse('list_create_applications')
+        etag = self.client.get(url)['ETag']
+        later = time.time() + settings.CORE_VERSION_TIMEOUT + 1
+        with patch('time.time', return_value=later):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_other_users_changes_keep_the_etag(self):
+        url = reverse('read_update_application', args=[self.application.id])
+        etag = self.client.get(url)['ETag']
+
+        Application.objects.create(
+            user=self.provider, amount=10, duration_months=1, application_type='deposit'
+        )
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        self.client.force_authenticate(user=self.superuser)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+
 class PaymentsViewTests(BaseTestCase):
     def setUp(self):
         super().setUp()
@@ -140,26 +516,220 @@ class PaymentsViewTests(BaseTestCase):
         self.client.force_authenticate(user=self.borrower)
         response = self.client.get(reverse('list_payments'))
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(response.data), 1)
-        self.assertEqual(response.data[0]['payment_type'], 'loan')
+        self.assertEqual(len(response.data['results']), 1)
+        self.assertEqual(response.data['results'][0]['payment_type'], 'loan')
 
     def test_get_payments_superuser(self):
         self.client.force_authenticate(user=self.superuser)
         response = self.client.get(reverse('list_payments'))
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(response.data), 2)  
+        self.assertEqual(len(response.data['results']), 2)
 
     def test_filter_payments(self):
         self.client.force_authenticate(user=self.superuser)
         
         response = self.client.get(f"{reverse('list_payments')}?payment_type=loan")
-        self.assertEqual(len(response.data), 1)
-        self.assertEqual(response.data[0]['payment_type'], 'loan')
+        self.assertEqual(len(response.data['results']), 1)
+        self.assertEqual(response.data['results'][0]['payment_type'], 'loan')
         
         
         response = self.client.get(f"{reverse('list_payments')}?payment_type=deposit")
-        self.assertEqual(len(response.data), 1)
-        self.assertEqual(response.data[0]['payment_type'], 'deposit')
+        self.assertEqual(len(response.data['results']), 1)
+        self.assertEqual(response.data['results'][0]['payment_type'], 'deposit')
+
+class KeysetPaginationTests(BaseTestCase):
+    def walk(self, url, key):
+        pages = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            pages.append([row[key] for row in response.data['results']])
+            url = response.data['next']
+        return pages, response.data['previous']
+
+    def test_applications_pages_are_disjoint_and_newest_first(self):
+        for amount in range(1, 8):
+            Application.objects.create(
+                user=self.borrower, amount=amount, duration_months=1, application_type='loan'
+            )
+        self.client.force_authenticate(user=self.borrower)
+
+        pages, previous = self.walk(
+            f"{reverse('list_create_applications')}?page_size=3", 'amount'
+        )
+        self.assertEqual(
+            pages,
+            [['7.00', '6.00', '5.00'], ['4.00', '3.00', '2.00'], ['1.00']],
+        )
+
+        response = self.client.get(previous)
+        self.assertEqual(
+            [row['amount'] for row in response.data['results']],
+            ['4.00', '3.00', '2.00'],
+        )
+
+    def test_payments_pages_follow_filters(self):
+        CashFlow.objects.create(transaction_type="deposit_received", amount=10000)
+        application = Application.objects.create(
+            user=self.borrower, amount=1000, duration_months=10, interest_rate=5, application_type='loan'
+        )
+        application.status = 'approved'
+        application.save()
+        Payment.objects.filter(
+            id__in=Payment.objects.order_by('due_date')[:2].values('id')
+        ).update(status='paid')
+        self.client.force_authenticate(user=self.borrower)
+
+        pages, _ = self.walk(
+            f"{reverse('list_payments')}?status=scheduled&page_size=3", 'id'
+        )
+        ids = [payment_id for page in pages for payment_id in page]
+        self.assertEqual(
+            ids,
+            list(Payment.objects.filter(status='scheduled').order_by('due_date', 'id').values_list('id', flat=True)),
+        )
+        self.assertEqual([len(page) for page in pages], [3, 3, 2])
+
+    def test_invalid_cursor(self):
+        self.client.force_authenticate(user=self.borrower)
+        response = self.client.get(f"{reverse('list_payments')}?cursor=garbage")
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class ValuesSerializerTests(BaseTestCase):
+    def setUp(self):
+        CashFlow.objects.create(transaction_type="deposit_received", amount=10000)
+        Application.objects.create(
+            user=self.borrower, amount=Decimal('1000.5'), duration_months=12, application_type='loan'
+        )
+        approved = Application.objects.create(
+            user=self.provider, amount=500, duration_months=3, interest_rate=Decimal('7.25'), application_type='deposit'
+        )
+        approved.status = 'approved'
+        approved.save()
+        Payment.objects.filter(pk=Payment.objects.first().pk).update(status='paid', paid_date=date.today())
+
+    def test_output_is_byte_identical(self):
+        for rows, serializer_class, model in (
+            (application_rows, ApplicationSerializer, Application),
+            (payment_rows, PaymentSerializer, Payment),
+        ):
+            queryset = model.objects.order_by('id')
+            expected = JSONRenderer().render(serializer_class(queryset, many=True).data)
+            actual = JSONRenderer().render(rows.to_representation(rows.values_list(queryset)))
+            self.assertEqual(actual, expected)
+
+    def test_list_views_match_the_serializers(self):
+        self.client.force_authenticate(user=self.superuser)
+        response = self.client.get(reverse('list_create_applications'))
+        self.assertEqual(
+            response.data['results'],
+            ApplicationSerializer(Application.objects.order_by('-created_at', '-id'), many=True).data,
+        )
+        response = self.client.get(reverse('list_payments'))
+        self.assertEqual(
+            response.data['results'],
+            PaymentSerializer(Payment.objects.order_by('due_date', 'id'), many=True).data,
+        )
+
+
+class ExportTests(BaseTestCase):
+    def setUp(self):
+        for user, application_type, amount in (
+            (self.borrower, 'loan', 1000),
+            (self.provider, 'deposit', 500),
+        ):
+            application = Application.objects.create(
+                user=user,
+                amount=amount,
+                duration_months=1,
+                interest_rate=15,
+                application_type=application_type,
+            )
+            application.status = 'approved'
+            application.save()
+
+    def read(self, response):
+        self.assertTrue(response.streaming)
+        return b"".join(response.streaming_content).decode()
+
+    def test_payments_csv_is_scoped_to_the_user(self):
+        self.client.force_authenticate(user=self.borrower)
+        response = self.client.get(f"{reverse('export_payments')}?format=csv")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+
+        lines = self.read(response).splitlines()
+        self.assertEqual(
+            lines[0],
+            'id,transaction_id,payment_type,amount,due_date,status,paid_date,updated_at',
+        )
+        self.assertEqual(len(lines), 2)
+        self.assertIn(',loan,1150.00,', lines[1])
+
+    def test_cashflows_ndjson_for_superuser(self):
+        self.client.force_authenticate(user=self.superuser)
+        response = self.client.get(
+            reverse('export_cashflows'), HTTP_ACCEPT='application/x-ndjson'
+        )
+        rows = [json.loads(line) for line in self.read(response).splitlines()]
+        self.assertEqual(
+            sorted(row['transaction_type'] for row in rows),
+            ['deposit_received', 'loan_issued'],
+        )
+        self.assertEqual(rows[0]['amount'], '1000.00')
+
+    def test_since_filters_rows(self):
+        self.client.force_authenticate(user=self.superuser)
+        tomorrow = date.today() + timedelta(days=1)
+        response = self.client.get(
+            f"{reverse('export_cashflows')}?format=ndjson&since={tomorrow}"
+        )
+        self.assertEqual(self.read(response), '')
+
+        response = self.client.get(f"{reverse('export_payments')}?since=soon")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def pull(self, name, since):
+        self.client.force_authenticate(user=self.superuser)
+        url = f"{reverse(name)}?{urlencode({'format': 'ndjson', 'since': since})}"
+        return [json.loads(line) for line in self.read(self.client.get(url)).splitlines()]
+
+    def test_since_picks_up_payments_paid_through_the_api(self):
+        payments = Payment.objects.order_by('id')
+        payments.update(updated_at=timezone.now() - timedelta(days=1))
+        self.client.force_authenticate(user=self.superuser)
+        self.client.patch(reverse('update_payment', args=[payments[0].pk]), {'status': 'paid'}, format='json')
+        self.client.patch(reverse('batch_update_payments'), [{'id': payments[1].pk, 'status': 'paid'}], format='json')
+
+        rows = self.pull('export_payments', date.today())
+        self.assertEqual([row['id'] for row in rows], [payments[0].pk, payments[1].pk])
+        self.assertEqual({row['paid_date'] for row in rows}, {date.today().isoformat()})
+
+    def test_since_picks_up_status_changes_only(self):
+        payments = Payment.objects.order_by('id')
+        cursor = timezone.now()
+        payments.update(updated_at=cursor - timedelta(days=1))
+        payments.filter(pk=payments[1].pk).update(due_date=date.today() + timedelta(days=90))
+        # Still due in the future, it must not be sent again.
+        self.assertEqual(self.pull('export_payments', cursor.isoformat()), [])
+
+        overdue = payments[0]
+        call_command('overdue', as_of=overdue.due_date + timedelta(days=1), stdout=StringIO())
+        rows = self.pull('export_payments', cursor.isoformat())
+        self.assertEqual([(row['id'], row['status']) for row in rows], [(overdue.pk, 'overdue')])
+
+    def test_since_picks_up_backdated_cash_flows(self):
+        cursor = timezone.now()
+        CashFlow.objects.update(created_at=cursor - timedelta(days=1))
+        backdated = CashFlow.objects.create(
+            transaction_type='loan_issued',
+            amount=10,
+            date=date.today() - timedelta(days=10),
+        )
+        rows = self.pull('export_cashflows', cursor.isoformat())
+        self.assertEqual([row['id'] for row in rows], [backdated.pk])
+
 
 class SinglePaymentTests(BaseTestCase):
     def setUp(self):
@@ -194,6 +764,54 @@ class SinglePaymentTests(BaseTestCase):
             transaction__application=self.loan_application
         )
 
+    def test_batch_update_reports_each_payment(self):
+        other = Payment.objects.get(transaction__application=self.deposit_app)
+        self.client.force_authenticate(user=self.borrower)
+        data = [
+            {'id': self.payment.id, 'status': 'paid'},
+            {'id': other.id, 'status': 'paid'},
+            {'id': 0, 'status': 'paid'},
+            {'id': self.payment.id + other.id, 'status': 'late'},
+            {'status': 'paid'},
+        ]
+        # Lookup, then UPDATE and counter recount in a savepoint.
+        with self.assertNumQueries(5):
+            response = self.client.patch(reverse('batch_update_payments'), data, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data[0], {'id': self.payment.id, 'status': 'paid'})
+        self.assertEqual([set(row) for row in response.data[1:]], [{'id', 'error'}] * 4)
+        self.payment.refresh_from_db()
+        other.refresh_from_db()
+        self.assertEqual(self.payment.status, 'paid')
+        self.assertEqual(other.status, 'scheduled')
+
+    def test_batch_update_rejects_repeated_ids(self):
+        self.client.force_authenticate(user=self.borrower)
+        data = [
+            {'id': self.payment.id, 'status': 'paid'},
+            {'id': self.payment.id, 'status': 'failed'},
+            {'id': [self.payment.id], 'status': 'paid'},
+        ]
+        response = self.client.patch(reverse('batch_update_payments'), data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [row.get('error') for row in response.data],
+            ["'id' appears more than once"] * 2 + ["'id' isn't valid"],
+        )
+        self.payment.refresh_from_db()
+        self.assertEqual(self.payment.status, 'scheduled')
+
+    def test_batch_update_superuser(self):
+        self.client.force_authenticate(user=self.superuser)
+        data = [
+            {'id': payment_id, 'status': 'failed'}
+            for payment_id in Payment.objects.values_list('id', flat=True)
+        ]
+        response = self.client.patch(reverse('batch_update_payments'), data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(Payment.objects.filter(status='failed').count(), 2)
+
     def test_update_payment_status_owner(self):
         self.client.force_authenticate(user=self.borrower)
         data = {'status': 'paid'}
@@ -247,4 +865,1008 @@ class SinglePaymentTests(BaseTestCase):
             data,
             format='json'
         )
-        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
\ No newline at end of file
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class AdminTests(BaseTestCase):
+    def setUp(self):
+        CashFlow.objects.create(transaction_type="deposit_received", amount=10**6)
+        for user, kind in ((self.borrower, "loan"), (self.provider, "deposit")):
+            application = Application.objects.create(
+                user=user, amount=1000, duration_months=6, interest_rate=5, application_type=kind
+            )
+            application.status = "approved"
+            application.save()
+
+    def request(self, user):
+        request = RequestFactory().get("/")
+        request.user = user
+        return request
+
+    def test_payments_are_scoped_to_the_transaction_owner(self):
+        payments = PaymentAdmin(Payment, site).get_queryset(self.request(self.borrower))
+        self.assertEqual(payments.count(), 6)
+        self.assertFalse(payments.exclude(transaction__user=self.borrower).exists())
+
+        payments = PaymentAdmin(Payment, site).get_queryset(self.request(self.superuser))
+        self.assertEqual(payments.count(), 12)
+
+    def test_large_tables_use_the_estimate(self):
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
+
+        with patch.object(EstimatedCountPaginator, "threshold", 10):
+            with CaptureQueriesContext(connection) as queries:
+                count = EstimatedCountPaginator(Payment.objects.order_by("pk"), 100).count
+            self.assertEqual(count, 12)
+            self.assertFalse([q for q in queries if "COUNT(" in q["sql"]])
+
+            # Filtered lists are counted.
+            filtered = Payment.objects.filter(payment_type="loan").order_by("pk")
+            self.assertEqual(EstimatedCountPaginator(filtered, 100).count, 6)
+
+        # Small tables are counted too, the estimate is not worth its error.
+        self.assertEqual(EstimatedCountPaginator(Payment.objects.order_by("pk"), 100).count, 12)
+
+    def test_changelists_skip_facets_and_full_counts(self):
+        self.client.force_login(self.superuser)
+        for model in (Application, Transactions, Payment, CashFlow):
+            with self.subTest(model=model.__name__):
+                with CaptureQueriesContext(connection) as queries:
+                    response = self.client.get(
+                        reverse(f"admin:core_{model._meta.model_name}_changelist"),
+                        {"_facets": "1"},
+                    )
+                self.assertEqual(response.status_code, status.HTTP_200_OK)
+                counts = [q for q in queries if "COUNT(" in q["sql"]]
+                self.assertLessEqual(len(counts), 1)
+
+    def test_applicant_is_picked_by_autocomplete(self):
+        self.client.force_login(self.superuser)
+        response = self.client.get(reverse("admin:core_application_add"))
+        self.assertContains(response, "admin-autocomplete")
+
+        response = self.client.get(
+            reverse("admin:autocomplete"),
+            {
+                "app_label": "core",
+                "model_name": "application",
+                "field_name": "user",
+                "term": "borr",
+            },
+        )
+        self.assertEqual(
+            [row["text"] for row in response.json()["results"]], ["borrower"]
+        )
+
+
+class ApprovalScheduleTests(BaseTestCase):
+    def approve(self, months):
+        application = Application.objects.create(
+            user=self.borrower,
+            amount=1200,
+            duration_months=months,
+            interest_rate=10,
+            application_type='loan',
+        )
+        application.status = 'approved'
+        with CaptureQueriesContext(connection) as queries:
+            application.save()
+        return application, len(queries)
+
+    def test_schedule_is_created_in_bulk(self):
+        CashFlow.objects.create(transaction_type="deposit_received", amount=10000)
+        short, short_queries = self.approve(12)
+        long, long_queries = self.approve(360)
+
+        self.assertEqual(Payment.objects.filter(transaction__application=short).count(), 12)
+        self.assertEqual(Payment.objects.filter(transaction__application=long).count(), 360)
+        # Only the INSERT batches grow, never one query per month.
+        self.assertLess(long_queries, short_queries + 5)
+
+
+@override_settings(CORE_JOBS_EAGER=False)
+class JobQueueTests(BaseTestCase):
+    def setUp(self):
+        CashFlow.objects.create(transaction_type="deposit_received", amount=10000)
+        self.application = Application.objects.create(
+            user=self.borrower, amount=1200, duration_months=6, interest_rate=10, application_type='loan'
+        )
+        self.application.status = 'approved'
+        self.application.save()
+
+    def test_approval_queues_the_schedule(self):
+        self.assertTrue(Transactions.objects.filter(application=self.application).exists())
+        self.assertFalse(Payment.objects.exists())
+        self.assertEqual(self.application.schedule_status, 'pending')
+
+        self.client.force_authenticate(user=self.borrower)
+        url = reverse('read_update_application', args=[self.application.pk])
+        self.assertEqual(self.client.get(url).data['schedule_status'], 'pending')
+
+        call_command('worker', once=True, stdout=StringIO())
+        self.assertEqual(Payment.objects.count(), 6)
+        self.assertEqual(Job.objects.get().status, 'done')
+        self.assertEqual(self.client.get(url).data['schedule_status'], 'ready')
+
+    def test_saving_again_does_not_queue_twice(self):
+        self.application.save()
+        self.assertEqual(Job.objects.count(), 1)
+
+    def test_expired_claim_is_retried_without_duplicates(self):
+        (claimed,) = jobs.claim(10)
+        self.assertEqual(jobs.claim(10), [])
+
+        # The first worker wrote the schedule, then died before finishing.
+        jobs.handlers[claimed.name](**claimed.payload)
+        Job.objects.update(locked_until=timezone.now() - timedelta(seconds=1))
+
+        self.assertEqual(jobs.run_pending(), (1, 0))
+        self.assertEqual(Payment.objects.count(), 6)
+        self.assertEqual(Job.objects.get().attempts, 2)
+
+    def test_failures_back_off_then_give_up(self):
+        calls = []
+
+        @jobs.job('flaky')
+        def flaky():
+            calls.append(1)
+            raise RuntimeError('boom')
+
+        self.addCleanup(jobs.handlers.pop, 'flaky')
+        flaky_job = jobs.enqueue('flaky')
+        Job.objects.filter(name='generate_payment_schedule').delete()
+        self.assertEqual(jobs.run_pending(), (0, 1))
+        flaky_job.refresh_from_db()
+        self.assertEqual(flaky_job.status, 'queued')
+        self.assertIn('boom', flaky_job.last_error)
+        self.assertGreater(flaky_job.run_after, timezone.now())
+        self.assertEqual(jobs.run_pending(), (0, 0))
+
+        Job.objects.update(run_after=timezone.now(), attempts=4)
+        self.assertEqual(jobs.run_pending(), (0, 1))
+        flaky_job.refresh_from_db()
+        self.assertEqual(flaky_job.status, 'failed')
+        self.assertEqual(len(calls), 2)
+
+    def test_schedule_reports_a_job_that_gave_up(self):
+        self.client.force_authenticate(user=self.borrower)
+        url = reverse('read_update_application', args=[self.application.pk])
+        self.assertEqual(self.client.get(url).data['schedule_status'], 'pending')
+
+        Job.objects.update(attempts=4)
+        with patch('core.signals.amortize', side_effect=ValueError('bad rate')):
+            self.assertEqual(jobs.run_pending(), (0, 1))
+
+        self.assertEqual(Job.objects.get().status, 'failed')
+        self.assertIn('bad rate', Job.objects.get().last_error)
+        self.assertFalse(Payment.objects.exists())
+        self.assertEqual(self.client.get(url).data['schedule_status'], 'failed')
+
+
+class TransactionCountersTests(BaseTestCase):
+    def setUp(self):
+        CashFlow.objects.create(transaction_type="deposit_received", amount=10000)
+        application = Application.objects.create(
+            user=self.borrower, amount=1200, duration_months=3, interest_rate=10, application_type="loan"
+        )
+        application.status = "approved"
+        application.save()
+        self.transaction = Transactions.objects.get(application=application)
+        self.payments = list(self.transaction.payment_set.order_by("due_date"))
+        self.client.force_authenticate(user=self.borrower)
+
+    def counters(self):
+        self.transaction.refresh_from_db()
+        return {
+            name: getattr(self.transaction, name)
+            for name in (
+                "paid_amount",
+                "remaining_amount",
+                "paid_count",
+                "failed_count",
+                "scheduled_count",
+                "next_due_date",
+                "is_active",
+            )
+        }
+
+    def patch(self, payment, new_status):
+        response = self.client.patch(
+            reverse("update_payment", args=[payment.pk]), {"status": new_status}, format="json"
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_schedule_starts_the_counters(self):
+        self.assertEqual(
+            self.counters(),
+            {
+                "paid_amount": 0,
+                "remaining_amount": Decimal("1320.00"),
+                "paid_count": 0,
+                "failed_count": 0,
+                "scheduled_count": 3,
+                "next_due_date": self.payments[0].due_date,
+                "is_active": True,
+            },
+        )
+
+    def test_loan_is_closed_once_repaid(self):
+        self.patch(self.payments[0], "paid")
+        self.patch(self.payments[1], "failed")
+        counters = self.counters()
+        self.assertEqual(counters["paid_amount"], Decimal("440.00"))
+        self.assertEqual(counters["remaining_amount"], Decimal("880.00"))
+        self.assertEqual((counters["paid_count"], counters["failed_count"]), (1, 1))
+        self.assertEqual(counters["next_due_date"], self.payments[2].due_date)
+
+        response = self.client.patch(
+            reverse("batch_update_payments"),
+            [{"id": payment.pk, "status": "paid"} for payment in self.payments[1:]],
+            format="json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        counters = self.counters()
+        self.assertEqual(counters["remaining_amount"], 0)
+        self.assertIsNone(counters["next_due_date"])
+        self.assertFalse(counters["is_active"])
+
+        # Reopened by a payment that bounced after all.
+        payment = self.payments[2]
+        payment.status = "failed"
+        payment.save()
+        self.assertTrue(self.counters()["is_active"])
+
+    def test_verify_counters_finds_and_fixes_drift(self):
+        call_command("verify_counters", check=True, stdout=StringIO())
+        Transactions.objects.update(paid_count=7, is_active=False)
+
+        with self.assertRaises(CommandError):
+            call_command("verify_counters", check=True, stdout=StringIO(), stderr=StringIO())
+
+        out = StringIO()
+        call_command("verify_counters", stdout=out, stderr=StringIO())
+        self.assertIn("Recounted 1 transactions", out.getvalue())
+        self.assertEqual(self.counters()["paid_count"], 0)
+        call_command("verify_counters", check=True, stdout=StringIO())
+
+
+class SummaryTests(BaseTestCase):
+    def setUp(self):
+        cache.clear()
+        stats.reset()
+        CashFlow.objects.create(transaction_type="deposit_received", amount=10000)
+        for user, kind in ((self.borrower, "loan"), (self.provider, "deposit")):
+            application = Application.objects.create(
+                user=user, amount=1200, duration_months=3, interest_rate=10, application_type=kind
+            )
+            application.status = "approved"
+            application.save()
+        self.payments = list(
+            Payment.objects.filter(transaction__user=self.borrower).order_by("due_date")
+        )
+        self.url = reverse("account_summary")
+
+    def summary(self, user):
+        self.client.force_authenticate(user=user)
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data
+
+    def test_borrower_summary(self):
+        self.payments[0].status = "paid"
+        self.payments[0].save()
+        self.payments[1].status = "overdue"
+        self.payments[1].save()
+
+        summary = self.summary(self.borrower)
+        self.assertEqual(
+            {name: value for name, value in summary.items() if name != "next_payment"},
+            {
+                "active_transactions": 1,
+                "outstanding_balance": "880.00",
+                "overdue_count": 1,
+                "total_deposited": "0.00",
+                "total_earned": "0.00",
+            },
+        )
+        self.assertEqual(summary["next_payment"], PaymentSerializer(self.payments[1]).data)
+
+    def test_provider_earnings(self):
+        deposit = Payment.objects.filter(transaction__user=self.provider).order_by("due_date").first()
+        deposit.status = "paid"
+        deposit.save()
+
+        summary = self.summary(self.provider)
+        self.assertEqual(summary["active_transactions"], 1)
+        self.assertEqual(summary["outstanding_balance"], "0.00")
+        self.assertEqual(summary["total_deposited"], "1200.00")
+        # A third of the 120.00 interest came with the first of three payments.
+        self.assertEqual(summary["total_earned"], "40.00")
+
+    def test_superuser_sees_everything(self):
+        summary = self.summary(self.superuser)
+        self.assertEqual(summary["active_transactions"], 2)
+        self.assertEqual(summary["total_deposited"], "1200.00")
+
+    def test_no_transactions(self):
+        Transactions.objects.all().delete()
+        summary = self.summary(self.borrower)
+        self.assertEqual(summary["active_transactions"], 0)
+        self.assertEqual(summary["outstanding_balance"], "0.00")
+        self.assertIsNone(summary["next_payment"])
+
+    def test_cached_until_the_users_rows_change(self):
+        first = self.summary(self.borrower)
+        self.client.force_authenticate(user=self.borrower)
+        with self.assertNumQueries(0):
+            self.client.get(self.url)
+        self.assertEqual(stats.snapshot()["summary"], {"hits": 1, "misses": 1})
+
+        response = self.client.patch(
+            reverse("update_payment", args=[self.payments[0].pk]), {"status": "paid"}, format="json"
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        summary = self.summary(self.borrower)
+        self.assertEqual(first["outstanding_balance"], "1320.00")
+        self.assertEqual(summary["outstanding_balance"], "880.00")
+        self.assertEqual(summary["next_payment"]["id"], self.payments[1].pk)
+
+
+class OverdueSweepTests(BaseTestCase):
+    def setUp(self):
+        CashFlow.objects.create(transaction_type="deposit_received", amount=10000)
+        self.application = Application.objects.create(
+            user=self.borrower, amount=1200, duration_months=6, interest_rate=10, application_type='loan'
+        )
+        self.application.status = 'approved'
+        self.application.save()
+        self.transaction = Transactions.objects.get(application=self.application)
+        self.payments = list(Payment.objects.filter(transaction=self.transaction).order_by('due_date'))
+        self.as_of = self.payments[3].due_date
+
+    def sweep(self, **options):
+        call_command('overdue', as_of=self.as_of, chunk_size=2, stdout=StringIO(), **options)
+        self.transaction.refresh_from_db()
+
+    def test_marks_past_due_payments_and_counts_them(self):
+        self.payments[0].status = 'paid'
+        self.payments[0].save()
+
+        self.sweep()
+        self.assertEqual(
+            list(Payment.objects.filter(transaction=self.transaction).order_by('due_date').values_list('status', flat=True)),
+            ['paid', 'overdue', 'overdue', 'scheduled', 'scheduled', 'scheduled'],
+        )
+        self.assertEqual(self.transaction.overdue_count, 2)
+        self.assertEqual(self.transaction.overdue_since, self.payments[1].due_date)
+
+    def test_rerun_is_a_no_op_and_catches_settled_payments(self):
+        self.sweep()
+        with CaptureQueriesContext(connection) as queries:
+            self.sweep()
+        self.assertFalse(any('UPDATE "core_payment"' in query['sql'] for query in queries))
+        self.assertEqual(self.transaction.overdue_count, 3)
+
+        Payment.objects.filter(pk=self.payments[0].pk).update(status='paid')
+        self.sweep()
+        self.assertEqual(self.transaction.overdue_count, 2)
+        self.assertEqual(self.transaction.overdue_since, self.payments[1].due_date)
+
+    def test_overdue_payments_are_listed_and_refreshed(self):
+        self.client.force_authenticate(user=self.borrower)
+        url = reverse('update_payment', args=[self.payments[0].pk])
+        self.assertEqual(self.client.get(url).data['status'], 'scheduled')
+
+        self.sweep()
+        self.assertEqual(self.client.get(url).data['status'], 'overdue')
+        response = self.client.get(f"{reverse('list_payments')}?status=overdue")
+        self.assertEqual(len(response.data['results']), 3)
+
+
+class ReconciliationTests(BaseTestCase):
+    def setUp(self):
+        CashFlow.objects.create(transaction_type="deposit_received", amount=10000)
+        self.application = Application.objects.create(
+            user=self.borrower, amount=1200, duration_months=3, interest_rate=10, application_type='loan'
+        )
+        self.application.status = 'approved'
+        self.application.save()
+        self.transaction = Transactions.objects.get(application=self.application)
+        self.payments = list(Payment.objects.filter(transaction=self.transaction).order_by('due_date'))
+        self.trx = self.transaction.pk
+
+    def line(self, payment, days_late=0, amount=None):
+        booked = payment.due_date + timedelta(days=days_late)
+        return f"{self.trx},{amount or payment.amount},{booked}"
+
+    def test_command_applies_matches_and_reports_the_rest(self):
+        first, second, third = self.payments
+        statement = self.tmp_file('statement.csv', '\n'.join([
+            'transaction,amount,date,reference',
+            self.line(first, days_late=3) + ',ref-1',
+            self.line(first, days_late=3) + ',ref-1-again',
+            self.line(second, amount='1.00') + ',wrong-amount',
+            self.line(third, days_late=40) + ',too-late',
+            'abc,10,2025-01-01,garbage',
+            f"{self.trx + 100},{first.amount},{first.due_date},unknown",
+        ]))
+        report = self.tmp_file('report.csv', '')
+        out = StringIO()
+        call_command('reconcile', statement, report=report, chunk_size=2, stdout=out)
+
+        first.refresh_from_db()
+        self.assertEqual(first.status, 'paid')
+        self.assertEqual(first.paid_date, first.due_date + timedelta(days=3))
+        self.assertEqual(Payment.objects.filter(status='paid').count(), 1)
+        self.assertEqual(
+            CashFlow.objects.get(transaction_type='loan_payment').amount, first.amount
+        )
+        call_command('cash', check=True, stdout=StringIO())
+
+        with open(report) as lines:
+            self.assertEqual(
+                [row.split(',')[:2] for row in lines.read().splitlines()],
+                [['line', 'reason'], ['3', 'no open payment matches'], ['4', 'no open payment matches'],
+                 ['5', 'no open payment matches'], ['6', 'malformed line'], ['7', 'no open payment matches']],
+            )
+        self.assertIn('6 lines, 1 payments', out.getvalue())
+
+    def test_overdue_payments_match_and_recount(self):
+        first = self.payments[0]
+        call_command('overdue', as_of=self.payments[1].due_date, stdout=StringIO())
+        statement = self.tmp_file('statement.csv', '\n'.join([
+            'transaction,amount,date', self.line(first, days_late=10),
+        ]))
+        call_command('reconcile', statement, report=self.tmp_file('report.csv', ''), stdout=StringIO())
+
+        self.transaction.refresh_from_db()
+        self.assertEqual(self.transaction.overdue_count, 0)
+        self.assertEqual(self.transaction.paid_count, 1)
+        self.assertEqual(self.transaction.paid_amount, first.amount)
+        self.assertEqual(Payment.objects.get(pk=first.pk).status, 'paid')
+        call_command('verify_counters', check=True, stdout=StringIO())
+
+    def test_command_reports_unreadable_files(self):
+        statement = self.tmp_file('statement.csv', 'transaction,amount,date\n')
+        missing = os.path.join(os.path.dirname(statement), 'missing', 'x.csv')
+        with self.assertRaisesMessage(CommandError, 'No such file or directory'):
+            call_command('reconcile', missing, stdout=StringIO())
+        with self.assertRaisesMessage(CommandError, 'No such file or directory'):
+            call_command('reconcile', statement, report=missing, stdout=StringIO())
+
+    def test_api_upload_fixed_width(self):
+        first, second, _ = self.payments
+        record = lambda payment: f"{self.trx:<12}{payment.due_date}{payment.amount:>15}REF"
+        upload = SimpleUploadedFile(
+            'statement.txt', f"{record(first)}\n{record(second)}\n{'x' * 40}\n".encode()
+        )
+        url = reverse('reconcile_statement')
+
+        self.client.force_authenticate(user=self.borrower)
+        self.assertEqual(self.client.post(url, {'statement': upload}).status_code, status.HTTP_403_FORBIDDEN)
+
+        self.client.force_authenticate(user=self.superuser)
+        upload.seek(0)
+        response = self.client.post(url, {'statement': upload})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['matched'], 2)
+        self.assertEqual(response.data['matched_amount'], first.amount + second.amount)
+        self.assertEqual(response.data['unmatched'], [{'line': 3, 'reason': 'malformed line', 'content': 'x' * 40}])
+
+    def tmp_file(self, name, content):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, name)
+        with open(path, 'w') as output:
+            output.write(content)
+        return path
+
+
+class ArchiveTests(BaseTestCase):
+    def setUp(self):
+        cache.clear()
+        CashFlow.objects.create(transaction_type="deposit_received", amount=10000)
+        self.transactions = []
+        for _ in range(2):
+            application = Application.objects.create(
+                user=self.borrower, amount=1200, duration_months=3, interest_rate=10, application_type="loan"
+            )
+            application.status = "approved"
+            application.save()
+            transaction = Transactions.objects.get(application=application)
+            for payment in transaction.payment_set.all():
+                payment.status = "paid"
+                payment.save()
+                CashFlow.objects.create(
+                    transaction_type="loan_payment", amount=payment.amount, transaction=transaction
+                )
+            self.transactions.append(transaction)
+        Transactions.objects.update(end_date=date.today() - timedelta(days=400))
+
+        # Still open, stays in the hot tables.
+        self.open = Application.objects.create(
+            user=self.borrower, amount=600, duration_months=2, interest_rate=10, application_type="loan"
+        )
+        self.open.status = "approved"
+        self.open.save()
+        self.archived_ids = list(
+            Payment.objects.filter(transaction__in=self.transactions).order_by("id").values_list("id", flat=True)
+        )
+        self.cash = CashFlow.get_cash()
+
+    def archive(self, **options):
+        out = StringIO()
+        call_command("archive", stdout=out, **options)
+        return out.getvalue()
+
+    def test_moves_rows_of_closed_transactions(self):
+        self.assertIn("Archived 6 payments and 8 cash flows of 2 transactions", self.archive())
+
+        self.assertEqual(list(ArchivedPayment.objects.order_by("id").values_list("id", flat=True)), self.archived_ids)
+        self.assertFalse(Payment.objects.filter(transaction__in=self.transactions).exists())
+        self.assertFalse(CashFlow.objects.filter(transaction__in=self.transactions).exists())
+        self.assertEqual(ArchivedCashFlow.objects.count(), 8)
+        self.assertEqual(Payment.objects.filter(transaction__application=self.open).count(), 2)
+        self.assertEqual(Transactions.objects.filter(archived_at__isnull=False).count(), 2)
+
+        # Counters, cash position and checkpoints still account for them.
+        self.assertEqual(Transactions.objects.get(pk=self.transactions[0].pk).paid_count, 3)
+        self.assertEqual(CashFlow.get_cash(), self.cash)
+        self.assertEqual(CashFlow.aggregate_cash(), self.cash)
+        call_command("cash", check=True, stdout=StringIO())
+        call_command("verify_counters", check=True, stdout=StringIO())
+        self.assertIn("Archived 0 payments", self.archive())
+
+    def test_horizon(self):
+        self.assertIn("of 0 transactions", self.archive(days=500))
+        self.assertIn("of 2 transactions", self.archive(days=300))
+
+    def test_interrupted_run_resumes(self):
+        create = ArchivedCashFlow.objects.bulk_create
+        calls = []
+
+        def fail_second_chunk(*args, **kwargs):
+            calls.append(1)
+            if len(calls) == 2:
+                raise RuntimeError("killed")
+            return create(*args, **kwargs)
+
+        with patch.object(ArchivedCashFlow.objects, "bulk_create", fail_second_chunk):
+            with self.assertRaises(RuntimeError):
+                self.archive(chunk_size=1)
+        self.assertEqual(ArchivedPayment.objects.count(), 3)
+        self.assertEqual(Payment.objects.filter(transaction__in=self.transactions).count(), 3)
+
+        self.assertIn("Archived 3 payments and 4 cash flows of 1 transactions", self.archive(chunk_size=1))
+        self.assertEqual(ArchivedPayment.objects.count(), 6)
+        call_command("cash", check=True, stdout=StringIO())
+
+    def test_reads_include_archived_rows_on_request(self):
+        self.archive()
+        self.client.force_authenticate(user=self.borrower)
+
+        url = f"{reverse('list_payments')}?page_size=4"
+        response = self.client.get(url)
+        self.assertEqual(len(response.data["results"]), 2)
+        self.assertIsNone(response.data["next"])
+
+        pages = []
+        response = self.client.get(f"{url}&history=1")
+        while True:
+            pages.append([payment["id"] for payment in response.data["results"]])
+            if response.data["next"] is None:
+                break
+            response = self.client.get(response.data["next"])
+        response = self.client.get(response.data["previous"])
+        self.assertEqual([payment["id"] for payment in response.data["results"]], pages[-2])
+        ids = sum(pages, [])
+        payments = list(ArchivedPayment.objects.values_list("due_date", "id")) + list(
+            Payment.objects.values_list("due_date", "id")
+        )
+        self.assertEqual(ids, [pk for _, pk in sorted(payments)])
+
+        archived = self.archived_ids[0]
+        detail = reverse("update_payment", args=[archived])
+        self.assertEqual(self.client.get(detail).status_code, status.HTTP_404_NOT_FOUND)
+        response = self.client.get(f"{detail}?history=1")
+        self.assertEqual(response.data["status"], "paid")
+        self.client.force_authenticate(user=self.provider)
+        self.assertEqual(self.client.get(f"{detail}?history=1").status_code, status.HTTP_403_FORBIDDEN)
+
+        self.client.force_authenticate(user=self.borrower)
+        export = reverse("export_payments")
+        response = self.client.get(f"{export}?format=ndjson&history=1")
+        rows = [json.loads(line) for line in b"".join(response.streaming_content).splitlines()]
+        self.assertEqual([row["id"] for row in rows], sorted(pk for _, pk in payments))
+        response = self.client.get(f"{export}?format=ndjson")
+        self.assertEqual(len(b"".join(response.streaming_content).splitlines()), 2)
+
+        summary = self.client.get(reverse("account_summary")).data
+        self.assertEqual(summary["active_transactions"], 1)
+        self.assertEqual(summary["outstanding_balance"], "660.00")
+
+
+class AmortizationTests(SimpleTestCase):
+    def test_simple_interest_puts_remainder_on_last_installment(self):
+        schedule = amortize(1000, 10, 12, date(2025, 1, 1))
+        amounts = [amount for _, _, amount in schedule.installments(0)]
+        self.assertEqual(amounts[:11], [Decimal('91.67')] * 11)
+        self.assertEqual(amounts[-1], Decimal('91.63'))
+        self.assertEqual(sum(amounts), Decimal('1100.00'))
+
+    def test_annuity_amortizes_the_balance_to_zero(self):
+        schedule = amortize(100000, 12, 360, date(2025, 1, 1), mode=ANNUITY)
+        self.assertEqual(from_cents(schedule.installment[0]), Decimal('1028.61'))
+        self.assertEqual(schedule.total[0], schedule.amount.sum())
+
+    def test_due_dates_follow_the_calendar(self):
+        schedule = amortize(300, 0, 3, date(2024, 1, 31))
+        self.assertEqual(
+            [due_date for _, due_date, _ in schedule.installments(0)],
+            [date(2024, 2, 29), date(2024, 3, 31), date(2024, 4, 30)],
+        )
+
+    def test_many_loans_in_one_call(self):
+        schedule = amortize(
+            [Decimal('1000.55'), 500, 900],
+            [15, 0, 10],
+            [1, 2, 3],
+            date(2025, 3, 5),
+        )
+        self.assertEqual(len(schedule), 3)
+        self.assertEqual(len(schedule.amount), 6)
+        self.assertEqual(
+            [from_cents(total) for total in schedule.total],
+            [Decimal('1150.63'), Decimal('500.00'), Decimal('990.00')],
+        )
+        self.assertEqual(schedule.end_date(2), date(2025, 6, 5))
+
+    def test_rejects_missing_or_invalid_amounts(self):
+        for principal, rate in (
+            (1000, None),
+            (1000, float('nan')),
+            (1000, float('inf')),
+            (1000, -1),
+            (None, 10),
+            (float('nan'), 10),
+            (Decimal('Infinity'), 10),
+            (-1000, 10),
+            ([1000, 500], [10, None]),
+        ):
+            with self.subTest(principal=principal, rate=rate):
+                with self.assertRaises(ValueError):
+                    amortize(principal, rate, 12, date(2025, 1, 1))
+
+
+class CashBalanceTests(TestCase):
+    def test_balance_follows_every_cash_flow(self):
+        CashFlow.objects.create(transaction_type="deposit_received", amount=1000)
+        CashFlow.objects.create(transaction_type="loan_issued", amount=300)
+        CashFlow.objects.create(transaction_type="loan_payment", amount=50)
+        flow = CashFlow.objects.create(
+            transaction_type="deposit_payment", amount=20
+        )
+        self.assertEqual(CashFlow.get_cash(), 730)
+
+        flow.amount = 120
+        flow.save()
+        self.assertEqual(CashFlow.get_cash(), 630)
+
+        flow.delete()
+        self.assertEqual(CashFlow.get_cash(), 750)
+        self.assertEqual(CashFlow.get_cash(), CashFlow.aggregate_cash())
+
+    def test_admin_bulk_delete_keeps_the_balance(self):
+        CashFlow.objects.create(transaction_type="deposit_received", amount=1000)
+        flow = CashFlow.objects.create(transaction_type="loan_issued", amount=300)
+        CashCheckpoint.rebuild()
+
+        self.client.force_login(User.objects.create_superuser(username="admin", password="testpass"))
+        response = self.client.post(
+            reverse("admin:core_cashflow_changelist"),
+            {"action": "delete_selected", "_selected_action": [flow.pk], "post": "yes"},
+        )
+        self.assertEqual(response.status_code, 302)
+        self.assertFalse(CashFlow.objects.filter(pk=flow.pk).exists())
+        self.assertEqual(CashFlow.get_cash(), 1000)
+        self.assertEqual(CashFlow.get_cash(), CashFlow.aggregate_cash())
+        call_command("cash", check=True, stdout=StringIO())
+
+    def test_get_cash_is_a_single_query(self):
+        CashFlow.objects.create(transaction_type="deposit_received", amount=10)
+        with self.assertNumQueries(1):
+            CashFlow.get_cash()
+
+    def test_command_detects_and_repairs_drift(self):
+        CashFlow.objects.create(transaction_type="deposit_received", amount=500)
+        CashBalance.objects.update(amount=1)
+
+        with self.assertRaises(CommandError):
+            call_command("cash", check=True, stdout=StringIO(), stderr=StringIO())
+
+        call_command("cash", stdout=StringIO(), stderr=StringIO())
+        self.assertEqual(CashFlow.get_cash(), 500)
+        call_command("cash", check=True, stdout=StringIO())
+
+
+class CashCheckpointTests(TestCase):
+    def setUp(self):
+        self.today = date.today()
+        history = [
+            (10, "deposit_received", 1000),
+            (7, "loan_issued", 400),
+            (7, "deposit_received", 200),
+            (3, "loan_payment", 100),
+        ]
+        for days_ago, transaction_type, amount in history:
+            flow = CashFlow.objects.create(
+                transaction_type=transaction_type, amount=amount
+            )
+            CashFlow.objects.filter(pk=flow.pk).update(
+                date=self.today - timedelta(days=days_ago)
+            )
+        CashCheckpoint.rebuild()
+
+    def test_cash_as_of_past_dates(self):
+        self.assertEqual(CashFlow.get_cash(self.today - timedelta(days=11)), 0)
+        self.assertEqual(CashFlow.get_cash(self.today - timedelta(days=8)), 1000)
+        self.assertEqual(CashFlow.get_cash(self.today - timedelta(days=7)), 800)
+        self.assertEqual(CashFlow.get_cash(self.today - timedelta(days=1)), 900)
+
+    def test_new_flows_move_todays_checkpoint(self):
+        CashFlow.objects.create(transaction_type="loan_issued", amount=150)
+        self.assertEqual(CashFlow.get_cash(self.today), 750)
+        self.assertEqual(CashFlow.get_cash(self.today - timedelta(days=1)), 900)
+        self.assertEqual(
+            CashCheckpoint.objects.get(date=self.today).balance, 750
+        )
+
+    def test_racing_first_writers_of_a_day_both_count(self):
+        tomorrow = self.today + timedelta(days=1)
+        CashCheckpoint.apply(tomorrow, 50)
+        # The other writer checked before this one's row committed, its
+        # insert of the day loses.
+        with patch('django.db.models.query.QuerySet.exists', return_value=False):
+            CashCheckpoint.apply(tomorrow, 25)
+        self.assertEqual(CashCheckpoint.objects.get(date=tomorrow).balance, 975)
+
+    def test_as_of_reads_checkpoint_plus_delta(self):
+        with self.assertNumQueries(2):
+            CashFlow.get_cash(self.today - timedelta(days=5))
+
+    def test_batch_apply_matches_the_ledger(self):
+        batch = [
+            CashFlow(transaction_type="loan_payment", amount=5, date=self.today - timedelta(days=days_ago))
+            for days_ago in (12, 7, 5, 5, 0)
+        ]
+        CashFlow.objects.bulk_create(batch)
+        deltas = {}
+        for flow in batch:
+            deltas[flow.date] = deltas.get(flow.date, 0) + flow.signed_amount
+        with self.assertNumQueries(len(deltas) + 4):
+            CashCheckpoint.apply_many(deltas)
+
+        self.assertEqual(
+            list(CashCheckpoint.objects.order_by('date').values_list('date', 'balance')),
+            [(checkpoint.date, checkpoint.balance) for checkpoint in CashCheckpoint.from_ledger()],
+        )
+
+    def test_command_rebuilds_missing_checkpoints(self):
+        CashCheckpoint.objects.all().delete()
+        with self.assertRaises(CommandError):
+            call_command("cash", check=True, stdout=StringIO(), stderr=StringIO())
+
+        call_command("cash", stdout=StringIO(), stderr=StringIO())
+        self.assertEqual(CashCheckpoint.objects.count(), 3)
+
+
+class DataCommandTests(TestCase):
+    def generate(self, **options):
+        out = StringIO()
+        call_command(
+            "data", months=12, seed=3, chunk_size=40, stdout=out, stderr=StringIO(), **options
+        )
+        return out.getvalue()
+
+    def test_generates_consistent_history(self):
+        output = self.generate(users=30, applications=100)
+
+        self.assertIn("rows/s", output)
+        self.assertEqual(User.objects.count(), 37)
+        self.assertEqual(Application.objects.count(), 100)
+        approved = Application.objects.filter(status="approved")
+        self.assertEqual(Transactions.objects.count(), approved.count())
+        self.assertEqual(
+            Payment.objects.count(),
+            sum(approved.values_list("duration_months", flat=True)),
+        )
+        self.assertFalse(
+            Payment.objects.filter(status="scheduled", due_date__lt=date.today()).exists()
+        )
+        self.assertFalse(
+            Payment.objects.filter(status="paid", due_date__gte=date.today()).exists()
+        )
+
+        # Backdated history that never overdraws the bank.
+        self.assertLess(CashFlow.objects.order_by("date").first().date, date.today())
+        self.assertEqual(CashFlow.get_cash(), CashFlow.aggregate_cash())
+        self.assertFalse(CashCheckpoint.objects.filter(balance__lt=0).exists())
+        call_command("cash", check=True, stdout=StringIO())
+        call_command("verify_counters", check=True, stdout=StringIO())
+
+    def test_bank_personnel_can_pick_applicants(self):
+        self.generate()
+        staff = User.objects.create_user(username="clerk", password="testpass", is_staff=True)
+        staff.groups.add(Group.objects.get(name="Bank Personnel"))
+        self.client.force_login(staff)
+
+        response = self.client.get(
+            reverse("admin:autocomplete"),
+            {"app_label": "core", "model_name": "application", "field_name": "user", "term": "borrower"},
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            sorted(result["text"] for result in response.json()["results"]),
+            ["borrower_1", "borrower_2", "borrower_3"],
+        )
+
+    def test_seed_makes_runs_repeatable(self):
+        self.generate(users=10, applications=30)
+        first = list(Application.objects.values_list("amount", "status", "duration_months"))
+        Application.objects.all().delete()
+        User.objects.filter(username__startswith="user_").delete()
+
+        self.generate(users=10, applications=30)
+        self.assertEqual(
+            list(Application.objects.values_list("amount", "status", "duration_months")),
+            first,
+        )
+
+
+class AsyncViewsTests(BaseTestCase):
+    def setUp(self):
+        CashFlow.objects.create(transaction_type="deposit_received", amount=5000)
+        self.application = Application.objects.create(
+            user=self.borrower, amount=1000, duration_months=2, interest_rate=5, application_type='loan'
+        )
+        self.application.status = 'approved'
+        self.application.save()
+        self.payment = Payment.objects.filter(transaction__application=self.application).first()
+
+    def auth(self, user):
+        return {'headers': {'Authorization': f'Bearer {AccessToken.for_user(user)}'}}
+
+    async def test_requires_a_token(self):
+        response = await self.async_client.get(reverse('async_list_payments'))
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+        response = await self.async_client.get(
+            reverse('async_list_payments'), headers={'Authorization': 'Bearer nope'}
+        )
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def sync_get(self, name):
+        self.client.force_authenticate(user=self.borrower)
+        return json.loads(self.client.get(reverse(name)).content)
+
+    async def test_lists_match_the_sync_views(self):
+        for name in ('list_create_applications', 'list_payments'):
+            expected = await sync_to_async(self.sync_get)(name)
+            response = await self.async_client.get(
+                reverse(f'async_{name}'), **self.auth(self.borrower)
+            )
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(response.json(), expected)
+
+    async def test_payment_filters(self):
+        response = await self.async_client.get(
+            f"{reverse('async_list_payments')}?status=paid", **self.auth(self.borrower)
+        )
+        self.assertEqual(response.json()['results'], [])
+
+        response = await self.async_client.get(
+            f"{reverse('async_list_payments')}?status=late", **self.auth(self.borrower)
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    async def test_detail_permissions(self):
+        url = reverse('async_read_application', args=[self.application.id])
+        response = await self.async_client.get(url, **self.auth(self.provider))
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+        response = await self.async_client.get(url, **self.auth(self.superuser))
+        self.assertEqual(response.json()['amount'], '1000.00')
+
+    async def test_create_application(self):
+        response = await self.async_client.post(
+            reverse('async_list_create_applications'),
+            {'amount': 300, 'duration_months': 3},
+            **self.auth(self.provider),
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.json()['application_type'], 'deposit')
+
+    async def test_patch_payment(self):
+        url = reverse('async_update_payment', args=[self.payment.id])
+        response = await self.async_client.patch(
+            url, {'status': 'paid'}, content_type='application/json', **self.auth(self.provider)
+        )
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+        response = await self.async_client.patch(
+            url, {'status': 'late'}, content_type='application/json', **self.auth(self.borrower)
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        response = await self.async_client.patch(
+            url, {'status': 'paid'}, content_type='application/json', **self.auth(self.borrower)
+        )
+        self.assertEqual(response.json()['status'], 'paid')
+        await self.payment.arefresh_from_db()
+        self.assertEqual(self.payment.status, 'paid')
+        transaction = await Transactions.objects.aget(application=self.application)
+        self.assertEqual(transaction.paid_count, 1)
+
+    async def test_patch_payment_is_atomic_with_the_counters(self):
+        url = reverse('async_update_payment', args=[self.payment.id])
+        with patch.object(Transactions, 'refresh_counters', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                await self.async_client.patch(
+                    url, {'status': 'paid'}, content_type='application/json', **self.auth(self.borrower)
+                )
+        await self.payment.arefresh_from_db()
+        self.assertEqual(self.payment.status, 'scheduled')
+
+
+class QueryPlanTests(TestCase):
+    """Each hot query shape must be answered from an index, never by
+    reading the whole table."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='planner')
+
+    def hot_querysets(self):
+        today = date.today()
+        return {
+            'payments by user, status and type': Payment.objects.filter(
+                transaction__user=self.user, status='scheduled', payment_type='loan'
+            ),
+            'payments page': Payment.objects.order_by('due_date', 'id')[:100],
+            'overdue payments': Payment.objects.filter(
+                status='scheduled', due_date__lt=today
+            ),
+            'applications by user and status': Application.objects.filter(
+                user=self.user, status='pending'
+            ).order_by('created_at'),
+            'applications page of a user': Application.objects.filter(
+                user=self.user
+            ).order_by('-created_at', '-id')[:100],
+            'applications page': Application.objects.order_by('-created_at', '-id')[:100],
+            'cash flows by type and date': CashFlow.objects.filter(
+                transaction_type='loan_issued', date__gte=today
+            ),
+            'cash flows after a checkpoint': CashFlow.objects.filter(
+                date__gt=today - timedelta(days=30), date__lte=today
+            ),
+        }
+
+    def full_scans(self, queryset):
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute('SET enable_seqscan = off')
+            plan = queryset.explain()
+            return re.findall(r'Seq Scan on (\w+)', plan)
+
+        plan = queryset.explain()
+        return [
+            line.split('SCAN ')[1].split()[0]
+            for line in plan.splitlines()
+            if 'SCAN ' in line and 'INDEX' not in line
+        ]
+
+    def test_hot_queries_use_indexes(self):
+        for name, queryset in self.hot_querysets().items():
+            with self.subTest(name):
+                self.assertEqual(self.full_scans(queryset), [])
@@ -4,11 +4,24 @@ from rest_framework_simplejwt.views import (
     TokenRefreshView,
 )
 
+from .async_views import (
+    AsyncApplicationsView,
+    AsyncPaymentsView,
+    AsyncSingleApplicationView,
+    AsyncSinglePayment,
+)
 from .views import (
     ApplicationsView,
+    ApplicationsBatchView,
     SingleApplicationView,
     PaymentsView,
     SinglePayment,
+    PaymentsBatchView,
+    PaymentsExportView,
+    CashFlowsExportView,
+    CacheStatsView,
+    ReconciliationView,
+    SummaryView,
 )
 
 urlpatterns = [
@@ -17,7 +30,18 @@ urlpatterns = [
     ),
     path("refresh/", TokenRefreshView.as_view(), name="token_refresh"),
     path("applications/", ApplicationsView.as_view(), name="list_create_applications"),
+    path("applications/batch/", ApplicationsBatchView.as_view(), name="batch_create_applications"),
     path("applications/<int:id>/", SingleApplicationView.as_view(), name="read_update_application"),
     path("payments/", PaymentsView.as_view(), name='list_payments'),
+    path("payments/batch/", PaymentsBatchView.as_view(), name="batch_update_payments"),
     path("payments/<int:id>/", SinglePayment.as_view(),  name='update_payment'),
+    path("summary/", SummaryView.as_view(), name="account_summary"),
+    path("cache/stats/", CacheStatsView.as_view(), name="cache_stats"),
+    path("reconcile/", ReconciliationView.as_view(), name="reconcile_statement"),
+    path("export/payments/", PaymentsExportView.as_view(), name="export_payments"),
+    path("export/cashflows/", CashFlowsExportView.as_view(), name="export_cashflows"),
+    path("async/applications/", AsyncApplicationsView.as_view(), name="async_list_create_applications"),
+    path("async/applications/<int:id>/", AsyncSingleApplicationView.as_view(), name="async_read_application"),
+    path("async/payments/", AsyncPaymentsView.as_view(), name="async_list_payments"),
+    path("async/payments/<int:id>/", AsyncSinglePayment.as_view(), name="async_update_payment"),
 ]
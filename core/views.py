@@ -1,30 +1,78 @@
+import heapq
+from collections import Counter
+from datetime import datetime
+from io import TextIOWrapper
+from operator import itemgetter
 from typing import override
-from rest_framework.exceptions import PermissionDenied 
+
+from django.db.transaction import atomic
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from rest_framework.exceptions import (
+    NotFound,
+    PermissionDenied,
+    ValidationError,
+)
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
 from rest_framework import generics, status
-from rest_framework.permissions import IsAuthenticated
 from rest_framework.views import APIView, Response
 from django_filters.rest_framework import DjangoFilterBackend
 
-from .models import Application, Payment
-from .serializer import ApplicationSerializer, PaymentSerializer
+from .cache import (
+    bump_versions,
+    cached_application,
+    cached_archived_payment,
+    cached_payment,
+    cached_summary,
+    conditional_get,
+    invalidate,
+    stats,
+)
+from .models import (
+    Application,
+    ArchivedCashFlow,
+    ArchivedPayment,
+    CashFlow,
+    Payment,
+    Transactions,
+    User,
+)
+from .pagination import ApplicationPagination, PaymentPagination
+from .reconciliation import CSV, FIXED, FORMATS, PARSERS, StatementImport
+from .renderers import CSVRenderer, NDJSONRenderer
+from .serializer import (
+    ApplicationSerializer,
+    PaymentSerializer,
+    application_rows,
+    applicants,
+    payment_rows,
+)
 
 # Create your views here.
 
 
+def include_history(request):
+    """Whether the request asked for archived rows too, with
+    ``?history=1``."""
+    return request.query_params.get("history", "").lower() in ("1", "true")
+
+
 class ApplicationsView(APIView):
 
     permission_classes = (IsAuthenticated,)
 
+    @conditional_get
     def get(self, request):
-        user = self.request.user
-
-        if user.is_superuser:
-            data = Application.objects.all()
-        else:
-            data = Application.objects.filter(user=user)
+        paginator = ApplicationPagination()
+        data = application_rows.values_list(
+            Application.objects.for_user(self.request.user),
+            *paginator.fields,
+        )
 
-        serializer = ApplicationSerializer(data, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        page = paginator.paginate_queryset(data, request, view=self)
+        return paginator.get_paginated_response(
+            application_rows.to_representation(page)
+        )
 
     def post(self, request):
         user = self.request.user
@@ -40,11 +88,22 @@ class ApplicationsView(APIView):
                     "duration_months"
                 ),
                 "application_type": (
-                    "deposit"
-                    if user.groups.filter(name="Provider").exists()
-                    else "loan"
+                    "deposit" if user.is_provider else "loan"
                 ),
-            }
+            },
+            # Applying for themselves, the token's roles tell whether they
+            # may; superusers name a user that is looked up.
+            context=(
+                {}
+                if user.is_superuser
+                else {
+                    "users": (
+                        {user.id: User(pk=user.id)}
+                        if user.is_borrower or user.is_provider
+                        else {}
+                    )
+                }
+            ),
         )
 
         if not serializer.is_valid():
@@ -56,43 +115,154 @@ class ApplicationsView(APIView):
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
 
+class ApplicationsBatchView(APIView):
+    """Creates many applications in one request and one INSERT.
+
+    The body is a list of ``{"amount", "duration_months"}`` objects, with a
+    ``"user"`` on each one when a superuser submits on behalf of others.
+    Either every item is created (201 with one result per item) or none
+    is (400 with one error object per item, empty for valid ones).
+    """
+
+    permission_classes = (IsAuthenticated,)
+    max_batch_size = 500
+
+    def post(self, request):
+        user = request.user
+        items = request.data
+        if not isinstance(items, list):
+            return Response(
+                {"non_field_errors": ["Expected a list of applications."]},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        owners = [
+            (item.get("user") if user.is_superuser else user.id)
+            if isinstance(item, dict)
+            else None
+            for item in items
+        ]
+        owner_ids = {
+            int(owner) for owner in owners if str(owner).isdigit()
+        }
+        # Only applicants, the others fail validation as unknown users.
+        users = applicants().prefetch_related("groups").in_bulk(owner_ids)
+        providers = {pk for pk, owner in users.items() if owner.is_provider}
+
+        data = [
+            {
+                "user": owner,
+                "amount": item.get("amount"),
+                "duration_months": item.get("duration_months"),
+                "application_type": (
+                    "deposit"
+                    if str(owner).isdigit() and int(owner) in providers
+                    else "loan"
+                ),
+            }
+            if isinstance(item, dict)
+            else item
+            for owner, item in zip(owners, items)
+        ]
+        serializer = ApplicationSerializer(
+            data=data,
+            many=True,
+            max_length=self.max_batch_size,
+            context={"users": users},
+        )
+        if not serializer.is_valid():
+            return Response(
+                serializer.errors, status=status.HTTP_400_BAD_REQUEST
+            )
+
+        with atomic():
+            serializer.save()
+        bump_versions(*owner_ids)
+
+        return Response(
+            [
+                {"id": application.pk, **row}
+                for application, row in zip(
+                    serializer.instance, serializer.data
+                )
+            ],
+            status=status.HTTP_201_CREATED,
+        )
+
+
 class SingleApplicationView(APIView):
 
+    @conditional_get
     def get(self, request, id):
         user=request.user
-        data = generics.get_object_or_404(
-            Application, 
-            id=id, 
-        )
-        serializer = ApplicationSerializer(data)
-        
-        if not (user.is_superuser or user == data.user):
+        entry = cached_application(id)
+        if entry is None:
+            raise NotFound()
+
+        if not (user.is_superuser or user.id == entry["owner"]):
             raise PermissionDenied()
 
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        return Response(entry["data"], status=status.HTTP_200_OK)
 
 class PaymentsView(generics.ListAPIView):
     filter_backends = [DjangoFilterBackend]
     filterset_fields = ['payment_type', 'status']
     serializer_class = PaymentSerializer
+    pagination_class = PaymentPagination
     
     @override
     def get_queryset(self):
-        user = self.request.user 
-        data = Payment.objects.all()
-        
-        if user.is_superuser:
-            return data
+        return Payment.objects.for_user(self.request.user)
+
+    @override
+    @conditional_get
+    def get(self, request, *args, **kwargs):
+        return super().get(request, *args, **kwargs)
+
+    @override
+    def list(self, request, *args, **kwargs):
+        querysets = [self.get_queryset()]
+        if include_history(request):
+            querysets.append(ArchivedPayment.objects.for_user(request.user))
+
+        page = self.paginator.paginate_querysets(
+            [
+                payment_rows.values_list(
+                    self.filter_queryset(queryset), *self.paginator.fields
+                )
+                for queryset in querysets
+            ],
+            request,
+        )
+        return self.get_paginated_response(
+            payment_rows.to_representation(page)
+        )
+
 
-        return data.filter(transaction__user=user)
-        
 class SinglePayment(APIView):
 
+    @conditional_get
+    def get(self, request, id) -> Response:
+        user = request.user
+        entry = cached_payment(id)
+        if entry is None and include_history(request):
+            entry = cached_archived_payment(id)
+        if entry is None:
+            raise NotFound()
+
+        if not (user.is_superuser or user.id == entry["owner"]):
+            raise PermissionDenied()
+
+        return Response(data=entry["data"], status=status.HTTP_200_OK)
+
     def patch(self, request, id) -> Response:
         user = request.user
-        payment = Payment.objects.get(pk=id)
+        payment = generics.get_object_or_404(
+            Payment.objects.select_related("transaction"), pk=id
+        )
 
-        if not (user.is_superuser or payment.transaction.user == user) :
+        owner = payment.transaction.user_id if payment.transaction else None
+        if not (user.is_superuser or owner == user.id):
             raise PermissionDenied()
         
         patch_status = request.data.get("status", None)
@@ -111,9 +281,285 @@ class SinglePayment(APIView):
                 data= serializer.errors,
                 status=status.HTTP_400_BAD_REQUEST
             )
-            
-        serializer.save()
+
+        # The transaction's counters are recounted by a post_save receiver.
+        with atomic():
+            serializer.save(**Payment.status_change(patch_status))
         return Response(
             data=serializer.data,
             status=status.HTTP_200_OK
         )
+
+
+class PaymentsBatchView(APIView):
+    """Sets the status of many payments at once.
+
+    The body is a list of ``{"id", "status"}`` objects with the same rules
+    as ``SinglePayment.patch``, and each id may appear once. Ownership is
+    checked with one query and the updates run as one UPDATE per status.
+    The response has one outcome per item, in request order.
+    """
+
+    permission_classes = (IsAuthenticated,)
+    max_batch_size = 1000
+
+    def patch(self, request) -> Response:
+        user = request.user
+        items = request.data
+        if not isinstance(items, list) or len(items) > self.max_batch_size:
+            return Response(
+                data={
+                    "error": "Expected a list of at most "
+                    f"{self.max_batch_size} payments"
+                },
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        ids = Counter(
+            item.get("id")
+            for item in items
+            if isinstance(item, dict) and type(item.get("id")) is int
+        )
+        results = []
+        requested = {}
+        for item in items:
+            payment_id = item.get("id") if isinstance(item, dict) else None
+            patch_status = (
+                item.get("status") if isinstance(item, dict) else None
+            )
+            if type(payment_id) is not int:
+                results.append(
+                    {"id": payment_id, "error": "'id' isn't valid"}
+                )
+            elif ids[payment_id] > 1:
+                # Which of the statuses should win is anyone's guess.
+                results.append(
+                    {"id": payment_id, "error": "'id' appears more than once"}
+                )
+            elif not patch_status in ('paid', 'failed'):
+                results.append(
+                    {"id": payment_id, "error": "'status' isn't valid"}
+                )
+            else:
+                requested[payment_id] = patch_status
+                results.append({"id": payment_id})
+
+        rows = Payment.objects.filter(pk__in=requested).values_list(
+            "id", "transaction", "transaction__user"
+        )
+        transactions, owners = {}, {}
+        for payment_id, transaction_id, owner in rows:
+            transactions[payment_id] = transaction_id
+            owners[payment_id] = owner
+        updates = {}
+        for result in results:
+            payment_id = result["id"]
+            if "error" in result:
+                continue
+            if payment_id not in owners:
+                result["error"] = NotFound.default_detail
+            elif not (user.is_superuser or owners[payment_id] == user.id):
+                result["error"] = PermissionDenied.default_detail
+            else:
+                result["status"] = requested[payment_id]
+                updates.setdefault(requested[payment_id], set()).add(
+                    payment_id
+                )
+
+        updated = set().union(*updates.values())
+        with atomic():
+            for patch_status, payment_ids in updates.items():
+                Payment.objects.filter(pk__in=payment_ids).update(
+                    **Payment.status_change(patch_status)
+                )
+            # update() skips the receiver that keeps them in step.
+            Transactions.refresh_counters(
+                {transactions[payment_id] for payment_id in updated}
+            )
+
+        invalidate("payment", *updated)
+        bump_versions(*{owners[payment_id] for payment_id in updated})
+
+        return Response(data=results, status=status.HTTP_200_OK)
+
+
+class SummaryView(APIView):
+    """The user's account at a glance, in one request."""
+
+    permission_classes = (IsAuthenticated,)
+
+    @conditional_get
+    def get(self, request):
+        return Response(
+            cached_summary(request.user), status=status.HTTP_200_OK
+        )
+
+
+class CacheStatsView(APIView):
+    """Hit/miss counters of the read-through cache in this process."""
+
+    permission_classes = (IsAdminUser,)
+
+    def get(self, request):
+        return Response(stats.snapshot(), status=status.HTTP_200_OK)
+
+
+class ReconciliationView(APIView):
+    """Applies an uploaded bank statement (multipart field ``statement``),
+    see core/reconciliation.py. Django spools large uploads to disk and the
+    file is read line by line, so memory stays flat. The response holds
+    the totals and the first ``max_report_lines`` unmatched lines."""
+
+    permission_classes = (IsAdminUser,)
+    max_report_lines = 1000
+
+    def post(self, request):
+        statement = request.FILES.get("statement")
+        if statement is None:
+            return Response(
+                {"statement": ["No statement file was submitted."]},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        statement_format = request.data.get("format") or (
+            CSV if statement.name.lower().endswith(".csv") else FIXED
+        )
+        if statement_format not in FORMATS:
+            return Response(
+                {"format": [f"Expected one of {', '.join(FORMATS)}."]},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        try:
+            window_days = int(request.data.get("window_days", 15))
+        except ValueError:
+            return Response(
+                {"window_days": ["A valid integer is required."]},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        importer = StatementImport(window_days=window_days)
+        lines = PARSERS[statement_format](
+            TextIOWrapper(statement.file, encoding="utf-8", newline="")
+        )
+        unmatched = []
+        count = 0
+        try:
+            for number, reason, raw in importer.run(lines):
+                count += 1
+                if len(unmatched) < self.max_report_lines:
+                    unmatched.append(
+                        {"line": number, "reason": reason, "content": raw}
+                    )
+        except (UnicodeDecodeError, ValueError) as error:
+            # Chunks before the bad one are already committed.
+            return Response(
+                {
+                    "statement": [str(error)],
+                    "lines": importer.lines,
+                    "matched": importer.matched,
+                },
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        return Response(
+            {
+                "lines": importer.lines,
+                "matched": importer.matched,
+                "matched_amount": importer.total,
+                "unmatched_count": count,
+                "unmatched": unmatched,
+            },
+            status=status.HTTP_200_OK,
+        )
+
+
+class ExportView(APIView):
+    """Streams every row the user can see as CSV or NDJSON, picked with
+    ``?format=`` or the Accept header. Rows are read with a server-side
+    iterator, so memory stays flat however many there are. With
+    ``?history=1`` the archived rows are merged in by id."""
+
+    permission_classes = (IsAuthenticated,)
+    renderer_classes = (CSVRenderer, NDJSONRenderer)
+    chunk_size = 2000
+    model = None
+    archive_model = None
+    # The first field is the id the rows are ordered by.
+    fields = ()
+    # When a row was last written, for ?since=. Exported last so clients
+    # can take the next cursor from the rows they got.
+    since_field = None
+
+    def get_queryset(self, model):
+        return model.objects.for_user(self.request.user)
+
+    def get(self, request):
+        since = request.query_params.get("since")
+        if since:
+            try:
+                since = datetime.fromisoformat(since)
+            except ValueError:
+                raise ValidationError(
+                    {"since": "Expected an ISO 8601 date or datetime."}
+                )
+            if timezone.is_naive(since):
+                since = timezone.make_aware(since)
+
+        models = [self.model]
+        if include_history(request):
+            models.append(self.archive_model)
+
+        streams = []
+        for model in models:
+            queryset = self.get_queryset(model)
+            if since:
+                queryset = queryset.filter(
+                    **{f"{self.since_field}__gte": since}
+                )
+            streams.append(
+                queryset.order_by("id")
+                .values_list(*self.fields)
+                .iterator(chunk_size=self.chunk_size)
+            )
+        rows = heapq.merge(*streams, key=itemgetter(0))
+        renderer = request.accepted_renderer
+        response = StreamingHttpResponse(
+            renderer.stream(self.fields, rows),
+            content_type=f"{renderer.media_type}; charset={renderer.charset}",
+        )
+        response["Content-Disposition"] = (
+            f'attachment; filename="{self.model._meta.model_name}s.'
+            f'{renderer.format}"'
+        )
+        return response
+
+
+class PaymentsExportView(ExportView):
+    model = Payment
+    archive_model = ArchivedPayment
+    fields = (
+        "id",
+        "transaction_id",
+        "payment_type",
+        "amount",
+        "due_date",
+        "status",
+        "paid_date",
+        "updated_at",
+    )
+    since_field = "updated_at"
+
+
+class CashFlowsExportView(ExportView):
+    model = CashFlow
+    archive_model = ArchivedCashFlow
+    fields = (
+        "id",
+        "transaction_id",
+        "transaction_type",
+        "amount",
+        "date",
+        "created_at",
+    )
+    # Cash flows are never edited, only added, possibly backdated.
+    since_field = "created_at"